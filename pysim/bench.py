@@ -0,0 +1,696 @@
+"""
+Micro-benchmarks for the simulator hot spots.
+
+Each benchmark returns a list of rows (tuples) which can be printed with
+`tabulate`. From the command line the benchmarks are available via
+`sim bench <name>`.
+"""
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import pysim.channel as chan
+import pysim.epcstd as std
+import pysim.models as models
+from pysim.objects import (Antenna, Generator, Medium, Model, Reader,
+                           Statistics, Tag, TagRegistry, make_tag_memory)
+from pysim.population import TagPopulation
+from pysim.random_buffer import RandomBuffer
+import pysim.simulator as sim
+
+
+def _calls_per_sec(fn, num_calls):
+    t_start = time.perf_counter()
+    for _ in range(num_calls):
+        fn()
+    elapsed = time.perf_counter() - t_start
+    return num_calls / elapsed
+
+
+def bench_pathloss(num_calls=20_000):
+    """
+    Report calls/sec of the path loss for a single reader-tag pair, as it is
+    computed by `Medium` for each tag, by each entry point of `channel`.
+    """
+    kwargs = dict(
+        time=0.5, wavelen=0.3486, polarization=0.5, permittivity=15.0,
+        conductivity=0.03, log=True,
+        tx_pos=np.asarray([5.0, 0.0, 5.0]),
+        tx_dir_theta=np.asarray([0.0, 0.0, -1.0]),
+        tx_dir_phi=np.asarray([1.0, 0.0, 0.0]),
+        tx_velocity=np.asarray([0.0, 0.0, 0.0]),
+        rx_pos=np.asarray([5.0, -3.0, 0.0]),
+        rx_dir_theta=np.asarray([0.0, 0.0, 1.0]),
+        rx_dir_phi=np.asarray([1.0, 0.0, 0.0]),
+        rx_velocity=np.asarray([0.0, 2.78, 0.0]))
+    functions = (
+        ("two_ray_pathloss", lambda: chan.two_ray_pathloss(
+            ground_reflection=chan.reflection, tx_rp=chan.rp_dipole,
+            rx_rp=chan.rp_dipole, **kwargs)),
+        ("two_ray_pathloss_scalar", lambda: chan.two_ray_pathloss_scalar(
+            ground_reflection=chan.reflection_scalar,
+            tx_rp=chan.rp_dipole_scalar, rx_rp=chan.rp_dipole_scalar,
+            **kwargs)),
+        ("two_ray_pathloss_array", lambda: chan.two_ray_pathloss_array(
+            ground_reflection=chan.reflection_array,
+            tx_rp=chan.rp_dipole_array, rx_rp=chan.rp_dipole_array,
+            **kwargs)),
+    )
+    return [(name, f"{_calls_per_sec(fn, num_calls):.0f}")
+            for name, fn in functions]
+
+
+def bench_pathloss_table(num_tags=2_000, num_calls=200):
+    """
+    Compare tags/sec of the `Medium` forward path loss computed directly
+    (before) and interpolated from the generator trajectory table (after),
+    with the largest difference between them.
+    """
+    kernel = sim.Kernel()
+    kernel.logger.level = sim.Logger.Level.WARNING
+    reader = Reader(kernel)
+    antenna = Antenna()
+    antenna.pos = np.asarray([5.0, 0.0, 5.0])
+    antenna.direction_theta = np.asarray([0.0, 0.0, -1.0])
+    reader.attach_antenna(antenna)
+    reader.turn_on()
+
+    generator = Generator()
+    generator.pos0 = np.asarray([5.0, -10.0, 0.0])
+    generator.tag_antenna_direction = np.asarray([0.0, 0.0, 1.0])
+
+    model = Model(seed=1)
+    tags = [generator.create_tag(model) for _ in range(num_tags)]
+    ages = model.rng.uniform(0, generator.lifetime, num_tags)
+    tag_pos = (generator.pos0 + ages[:, np.newaxis] * generator.velocity *
+               generator.normalized_direction)
+    time = 0.5
+
+    medium = Medium()
+    direct, interpolated = [], []
+    for use_tables, results in ((False, direct), (True, interpolated)):
+        medium.use_pathloss_tables = use_tables
+        results.append(medium.get_forward_path_loss_array(
+            reader, tags, time, tag_pos))
+        results.append(_calls_per_sec(
+            lambda: medium.get_forward_path_loss_array(
+                reader, tags, time, tag_pos), num_calls) * num_tags)
+    error = np.max(np.abs(direct[0] - interpolated[0]))
+    return [
+        ("direct", f"{direct[1]:.0f}", "1.00", "-"),
+        ("table", f"{interpolated[1]:.0f}",
+         f"{interpolated[1] / direct[1]:.2f}", f"{error:.2e}"),
+    ]
+
+
+def bench_power_modes(seed=1):
+    """
+    Cross-check 'polling' and 'events' power update modes: run the model
+    with default `Settings` in both modes (with the same random seed) and
+    compare the results and the elapsed time.
+    """
+    rows = []
+    for mode in ('polling', 'events'):
+        t_start = time.perf_counter()
+        ret = models.simulate_tags(
+            models.Settings(power_update_mode=mode, seed=seed))
+        elapsed = time.perf_counter() - t_start
+        rows.append((mode, f"{ret['rounds_per_tag']:.1f}",
+                     ret['inventory_prob'], ret['read_tid_prob'],
+                     f"{elapsed:.2f}"))
+    return rows
+
+
+def bench_idle_fast_forward(seed=1, num_tags=5, interval=5.0):
+    """
+    Compare model runs with and without idle slots fast-forward for rare
+    tag arrivals (one tag in `interval` seconds) in 'events' power update
+    mode: number of events served and elapsed time. Results should be the
+    same, up to rounding of the model time.
+    """
+    rows = []
+    for idle_fast_forward in (False, True):
+        settings = models.Settings(
+            power_update_mode='events', idle_fast_forward=idle_fast_forward,
+            num_tags=num_tags, generation_interval=(lambda: interval, ),
+            seed=seed)
+        queue = sim.EventQueue()
+        t_start = time.perf_counter()
+        ret = models.simulate_tags(settings, event_queue=queue)
+        elapsed = time.perf_counter() - t_start
+        rows.append((idle_fast_forward, f"{ret['rounds_per_tag']:.1f}",
+                     ret['inventory_prob'], ret['read_tid_prob'],
+                     queue.stats['num_popped'], f"{elapsed:.2f}"))
+    return rows
+
+
+def bench_reader_states(num_transitions=200_000, q=4):
+    """
+    Report reader state transitions/sec for idle slots (QUERY and QREP
+    timeouts, without and with a slot listener) and for slots with replies
+    (QREP -> ACK -> REQRN -> READ -> QREP driven by tag replies).
+    """
+    def make_reader():
+        kernel = sim.Kernel()
+        kernel.logger.level = sim.Logger.Level.WARNING
+        reader = Reader(kernel)
+        reader.q = q
+        reader.read_tid_bank = True
+        reader.read_tid_words_num = 4
+        reader.turn_on()
+        return reader
+
+    preamble = std.create_tag_preamble(std.TagEncoding.FM0)
+    replies = (std.TagFrame(preamble, std.QueryReply(0x1234)),
+               std.TagFrame(preamble, std.AckReply(b"\xAA" * 12)),
+               std.TagFrame(preamble, std.ReqRnReply(0x5678)),
+               std.TagFrame(preamble, std.ReadReply(b"\xAA" * 8)))
+
+    def timeouts(reader, num_slots):
+        for _ in range(num_slots):
+            reader.timeout()
+        return num_slots
+
+    def replied_slots(reader, num_slots):
+        for _ in range(num_slots):
+            for frame in replies:
+                reader.receive(frame)
+        return num_slots * len(replies)
+
+    def noop(round_index, slot_index):
+        pass
+
+    rows = []
+    for name, fn, num_slots, listener in (
+            ("idle slots", timeouts, num_transitions, False),
+            ("idle slots, slot listener", timeouts, num_transitions, True),
+            ("slots with replies", replied_slots, num_transitions // 4,
+             False)):
+        reader = make_reader()
+        if listener:
+            reader.slot_finish_listeners.add(noop)
+        t_start = time.perf_counter()
+        num_done = fn(reader, num_slots)
+        elapsed = time.perf_counter() - t_start
+        rows.append((name, num_done, f"{num_done / elapsed:.0f}"))
+    return rows
+
+
+def bench_round_at_once(seed=1, q=4):
+    """
+    Compare model runs with slot-by-slot and round-at-once slots resolution
+    in 'events' power update mode. Results should be the same, up to
+    rounding of the model time.
+    """
+    rows = []
+    for round_at_once in (False, True):
+        settings = models.Settings(
+            power_update_mode='events', round_at_once=round_at_once, q=q,
+            seed=seed)
+        t_start = time.perf_counter()
+        ret = models.simulate_tags(settings)
+        elapsed = time.perf_counter() - t_start
+        rows.append(("round-at-once" if round_at_once else "slot-by-slot",
+                     f"{ret['rounds_per_tag']:.1f}", ret['inventory_prob'],
+                     ret['read_tid_prob'], f"{elapsed:.2f}"))
+    return rows
+
+
+def bench_tag_registry(num_tags=2_000, num_calls=2_000):
+    """
+    Compare commands/sec of delivering Ack to all tags in the model (before)
+    and only to the tags selected by `TagRegistry.receivers()` (after),
+    when all tags are powered off.
+    """
+    model = Model()
+    generator = Generator()
+    generator.pos0 = np.asarray([5.0, -10.0, 0.0])
+    generator.tag_antenna_direction = np.asarray([0.0, 0.0, 1.0])
+    for _ in range(num_tags):
+        model.tags.append(generator.create_tag(model))
+    tags_list = list(model.tags)
+    frame = std.ReaderFrame(
+        std.ReaderPreamble(6.25e-6, 18.75e-6, 31.25e-6), std.Ack(0x1234))
+
+    def scan_all():
+        [tag.receive(frame) for tag in tags_list]
+
+    def use_registry():
+        [tag.receive(frame) for tag in model.tags.receivers(frame.command)]
+
+    before = _calls_per_sec(scan_all, num_calls)
+    after = _calls_per_sec(use_registry, num_calls)
+    return [
+        ("all tags", f"{before:.0f}", "1.00"),
+        ("TagRegistry.receivers()", f"{after:.0f}", f"{after / before:.2f}"),
+    ]
+
+
+def bench_tag_population(num_tags=2_000, q=6, num_rounds=5, seed=1):
+    """
+    Compare commands/sec of inventory rounds (Query and QueryRep's) over a
+    dense population of powered tags stored as `Tag` objects in
+    `TagRegistry` (before) and in `TagPopulation` arrays (after). Both
+    backends should produce the same replies with the same random seed.
+    """
+    kernel = sim.Kernel()
+    kernel.logger.level = sim.Logger.Level.WARNING
+    generator = Generator()
+    generator.pos0 = np.asarray([5.0, -10.0, 0.0])
+    generator.tag_antenna_direction = np.asarray([0.0, 0.0, 1.0])
+    preamble = std.ReaderPreamble(6.25e-6, 18.75e-6, 31.25e-6)
+    query = std.ReaderFrame(preamble, std.Query(q=q))
+    query_rep = std.ReaderFrame(preamble, std.QueryRep())
+    num_commands = num_rounds * pow(2, q)
+
+    results = []
+    for population in (False, True):
+        model = Model(seed=seed)
+        tags = (TagPopulation(random=model.random) if population else
+                TagRegistry())
+        model.tags = tags
+        index = {}   # tag IDs differ between the runs, so indices are used
+        for i in range(num_tags):
+            tag = generator.create_tag(model)
+            tag.kernel = kernel
+            tag.set_power(0.0, 0.0)
+            tags.append(tag)
+            index[tag] = i
+        replies = []
+        t_start = time.perf_counter()
+        for _ in range(num_rounds):
+            replies.append(tags.deliver(query))
+            for _ in range(pow(2, q) - 1):
+                replies.append(tags.deliver(query_rep))
+        elapsed = time.perf_counter() - t_start
+        replies = [[(index[tag], frame.reply.rn) for tag, frame in slot]
+                   for slot in replies]
+        results.append((type(tags).__name__, num_commands / elapsed, replies))
+
+    (before_name, before, before_replies), (after_name, after, replies) = \
+        results
+    return [
+        (before_name, f"{before:.0f}", "1.00", "-"),
+        (after_name, f"{after:.0f}", f"{after / before:.2f}",
+         replies == before_replies),
+    ]
+
+
+def _dict_based_size(obj):
+    # Size of the same object if it kept its attributes in __dict__
+    # instead of __slots__:
+    class Plain:
+        pass
+    plain = Plain()
+    for cls in type(obj).__mro__:
+        for name in getattr(cls, '__slots__', ()):
+            setattr(plain, name, getattr(obj, name, None))
+    return sys.getsizeof(plain) + sys.getsizeof(plain.__dict__)
+
+
+def bench_memory(num_tags=200, num_power_records=100):
+    """
+    Report bytes per simulated tag kept in `Statistics.tags_history` (the
+    tag with its antenna, tag record, read record and power records) with
+    `__slots__` objects (after) and estimated for the same objects keeping
+    attributes in per-instance `__dict__` (before).
+    """
+    kernel = sim.Kernel()
+    kernel.logger.level = sim.Logger.Level.WARNING
+    reader = Reader(kernel)
+    antenna = Antenna()
+    antenna.pos = np.asarray([5.0, 0.0, 5.0])
+    antenna.direction_theta = np.asarray([0.0, 0.0, -1.0])
+    reader.attach_antenna(antenna)
+    reader.turn_on()
+    generator = Generator()
+    generator.pos0 = np.asarray([5.0, -10.0, 0.0])
+    generator.tag_antenna_direction = np.asarray([0.0, 0.0, 1.0])
+    model = Model()
+    medium = Medium()
+
+    tracemalloc.start()
+    statistics = Statistics()
+    for _ in range(num_tags):
+        tag = generator.create_tag(model)
+        tag.kernel = kernel
+        tag.set_power(0.0, 0.0)
+        record = statistics.create_tag_record(tag)
+        for i in range(num_power_records):
+            record.write_power_record(i * 1e-3, reader, medium)
+        read_record = record.new_tag_read_record(reader, 0)
+        read_record.tag_pos = np.array(tag.pos, copy=True)
+        record.close_tag_read_record()
+        statistics.close_tag_record(tag)
+    after = tracemalloc.get_traced_memory()[0] / num_tags
+    tracemalloc.stop()
+
+    record = statistics.tags_history[0]
+    objects = ([record, record.tag, record.tag.antenna] +
+               record.inventory_history + record.power_mapping)
+    overhead = sum(_dict_based_size(obj) - sys.getsizeof(obj)
+                   for obj in objects)
+    before = after + overhead
+    return [
+        ("__dict__", f"{before:.0f}", "1.00"),
+        ("__slots__", f"{after:.0f}", f"{before / after:.2f}"),
+    ]
+
+
+def bench_event_queue(num_cycles=20_000, num_cancelled=3, horizon=1.0):
+    """
+    Compare `EventQueue` without and with tombstones compaction on a
+    workload similar to reader power cycles: each cycle schedules an event
+    in the near future and a few events far ahead, which are cancelled
+    (like timeouts and antenna switches cancelled when the reader turns
+    off), and pops the near event.
+    """
+    rows = []
+    for compaction_fraction in (None, 0.5):
+        queue = sim.EventQueue(compaction_fraction)
+        t = 0.0
+        t_start = time.perf_counter()
+        for _ in range(num_cycles):
+            queue.push(t + 1e-3, 'event')
+            for i in range(num_cancelled):
+                queue.cancel(queue.push(t + horizon * (i + 1), 'cancelled'))
+            t = queue.pop()[0]
+        elapsed = time.perf_counter() - t_start
+        stats = queue.stats
+        rows.append((compaction_fraction or "off",
+                     f"{num_cycles / elapsed:.0f}",
+                     stats['peak_size'], stats['num_cancelled'],
+                     stats['num_compactions']))
+    return rows
+
+
+class _RecordingQueue(sim.EventQueue):
+    """
+    EventQueue which records the operations applied to it: ('push', t),
+    ('pop', ) and ('cancel', index of the push). Periodic events rearming is
+    recorded as a push.
+    """
+    def __init__(self):
+        super().__init__()
+        self.operations = []
+        self._push_index = {}   # id(handle) -> index of the push
+        self._num_pushes = 0
+
+    def push(self, t, item):
+        handle = super().push(t, item)
+        self._push_index[id(handle)] = self._num_pushes
+        self._num_pushes += 1
+        self.operations.append(('push', t))
+        return handle
+
+    def rearm(self, handle, t, item):
+        super().rearm(handle, t, item)
+        self._push_index[id(handle)] = self._num_pushes
+        self._num_pushes += 1
+        self.operations.append(('push', t))
+        return handle
+
+    def pop(self):
+        self.operations.append(('pop', ))
+        return super().pop()
+
+    def cancel(self, handle):
+        if handle is not None and handle.active:
+            self.operations.append(('cancel', self._push_index[id(handle)]))
+        super().cancel(handle)
+
+
+def bench_event_queues(seed=1, num_tags=3):
+    """
+    Replay the sequence of event queue operations recorded in a
+    `simulate_tags()` run against each queue implementation from
+    `sim.EVENT_QUEUES`, and compare operations/sec. All queues should pop
+    events in the same order.
+    """
+    recorder = _RecordingQueue()
+    models.simulate_tags(models.Settings(num_tags=num_tags, seed=seed),
+                         event_queue=recorder)
+    operations = recorder.operations
+
+    rows = []
+    for name in sim.EVENT_QUEUES:
+        queue = sim.create_event_queue(name)
+        handles, popped = [], []
+        t_start = time.perf_counter()
+        for operation in operations:
+            if operation[0] == 'push':
+                handles.append(queue.push(operation[1], operation))
+            elif operation[0] == 'pop':
+                popped.append(queue.pop()[1])
+            else:
+                queue.cancel(handles[operation[1]])
+        elapsed = time.perf_counter() - t_start
+        rows.append((name, len(operations), popped, elapsed))
+
+    reference = rows[0]
+    return [(name, num_ops, f"{num_ops / elapsed:.0f}",
+             f"{reference[3] / elapsed:.2f}", popped == reference[2])
+            for name, num_ops, popped, elapsed in rows]
+
+
+def bench_kernel_dispatch(num_events=200_000, seed=1):
+    """
+    Report events/sec served by `Kernel.run()` for a chain of trivial
+    handlers (scheduled with and without keyword arguments, and in
+    profiling mode), and for the standard scenario (`simulate_tags()` with
+    default settings).
+    """
+    def ping(kernel, n, **kwargs):
+        if n > 0:
+            kernel.schedule(1e-6, ping, n - 1, **kwargs)
+
+    rows = []
+    for name, kwargs, profile in (("ping", {}, False),
+                                  ("ping with kwargs", {'x': 1}, False),
+                                  ("ping, profiled", {}, True)):
+        kernel = sim.Kernel()
+        kernel.profile = profile
+        t_start = time.perf_counter()
+        kernel.run(ping, num_events - 1, **kwargs)
+        elapsed = time.perf_counter() - t_start
+        rows.append((name, kernel.num_events_served,
+                     f"{kernel.num_events_served / elapsed:.0f}"))
+
+    queue = sim.EventQueue()
+    t_start = time.perf_counter()
+    models.simulate_tags(models.Settings(seed=seed), event_queue=queue)
+    elapsed = time.perf_counter() - t_start
+    num_served = queue.stats['num_popped']
+    rows.append(("simulate_tags", num_served, f"{num_served / elapsed:.0f}"))
+    return rows
+
+
+def bench_clock(num_events=200_000, dt=1.25e-6):
+    """
+    Compare float seconds and integer picosecond ticks kernel clocks: a
+    chain of `num_events` handlers scheduled with delay `dt` runs along
+    with an event scheduled once at `num_events * dt`. Report events/sec,
+    the chain end time error and whether the chain end and the single
+    event, simultaneous in theory, got the same time.
+    """
+    def mark(kernel, end_times):
+        end_times.append(kernel.time)
+
+    def ping(kernel, n, end_times):
+        if n > 0:
+            kernel.schedule(dt, ping, n - 1, end_times)
+        else:
+            mark(kernel, end_times)
+
+    def start(kernel, end_times):
+        kernel.schedule(num_events * dt, mark, end_times)
+        ping(kernel, num_events, end_times)
+
+    rows = []
+    for name, ticks_per_second in (("float", None), ("ticks", 10**12)):
+        kernel = sim.Kernel(ticks_per_second=ticks_per_second)
+        end_times = []
+        t_start = time.perf_counter()
+        kernel.run(start, end_times)
+        elapsed = time.perf_counter() - t_start
+        rows.append((name, f"{kernel.num_events_served / elapsed:.0f}",
+                     f"{kernel.time - num_events * dt:.3e}",
+                     kernel.next_event_time is None and
+                     end_times[0] == end_times[1]))
+    return rows
+
+
+def bench_periodic(num_events=200_000, num_tags=10, seed=1, num_repeats=3):
+    """
+    Compare events/sec of a timer handler which schedules itself again on
+    each call (before) and the same handler called by
+    `kernel.schedule_periodic()` (after), best of `num_repeats` runs, and
+    report the model run with `num_tags` tags and the reader always on,
+    where `update_positions()` is called periodically.
+    """
+    def rescheduling_tick(kernel, interval):
+        kernel.schedule(interval, rescheduling_tick, interval)
+
+    def periodic_tick(kernel, interval):
+        pass
+
+    rows = []
+    for name, start in (
+            ("self-rescheduling", lambda kernel: rescheduling_tick(kernel, 1e-3)),
+            ("schedule_periodic", lambda kernel: kernel.schedule_periodic(
+                1e-3, periodic_tick, 1e-3))):
+        best = 0
+        for _ in range(num_repeats):
+            kernel = sim.Kernel()
+            kernel.max_simulation_time = num_events * 1e-3
+            t_start = time.perf_counter()
+            kernel.run(start)
+            elapsed = time.perf_counter() - t_start
+            best = max(best, kernel.num_events_served / elapsed)
+        rows.append((name, kernel.num_events_served, f"{best:.0f}"))
+
+    queue = sim.EventQueue()
+    settings = models.Settings(reader_switch_power=False, num_tags=num_tags,
+                               seed=seed)
+    t_start = time.perf_counter()
+    models.simulate_tags(settings, event_queue=queue)
+    elapsed = time.perf_counter() - t_start
+    num_served = queue.stats['num_popped']
+    rows.append(("simulate_tags, ALWAYS_ON", num_served,
+                 f"{num_served / elapsed:.0f}"))
+    return rows
+
+
+def _bytes_per_call(fn, num_calls):
+    # Memory kept by the results of `num_calls` calls of `fn`
+    tracemalloc.start()
+    results = [fn() for _ in range(num_calls)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del results
+    return size / num_calls
+
+
+def bench_frames(num_calls=20_000):
+    """
+    Report calls/sec and memory kept per result of the frame operations
+    done for every command: duration of each reader frame
+    (`ReaderFrame.duration`), the reader state timeout
+    (`ReaderTimingProfile`), reader frames taken from `ReaderFramePool`,
+    tag reply frames, EPC parsing and TID reads (`Tag.process_read()` with
+    the memory string written to the log).
+    """
+    sync = std.ReaderSync(12.5e-6, 31.25e-6)
+    preamble = std.ReaderPreamble(12.5e-6, 31.25e-6, 93.75e-6)
+    frames = (
+        std.ReaderFrame(preamble, std.Query(q=4)),
+        std.ReaderFrame(sync, std.QueryRep()),
+        std.ReaderFrame(sync, std.Ack(0x1234)),
+        std.ReaderFrame(sync, std.ReqRN(0x1234, 0x5678)),
+        std.ReaderFrame(sync, std.Read(std.MemoryBank.TID, 0, 64, 0x1234,
+                                       0x5678)),
+    )
+    operations = [(f"{frame.command.code} duration",
+                   lambda frame=frame: frame.duration) for frame in frames]
+
+    reader = Reader()
+    reader.read_tid_words_num = 64
+    reader.last_rn = 0x1234
+    for name in ("QUERY", "QREP", "ACK", "REQRN", "READ"):
+        state = getattr(Reader.State, name)
+        operations.append((f"{name} timeout",
+                           lambda state=state: state.get_timeout(reader)))
+
+    epc = "AB" * 12
+    operations += [
+        ("Query frame", lambda: reader.frames.queries[reader.target]),
+        ("QueryRep frame", lambda: reader.frames.query_rep),
+        ("Ack frame", lambda: reader.frames.ack(0x1234)),
+        ("RN16 reply frame", lambda: std.TagFrame(
+            std.create_tag_preamble(std.TagEncoding.M2, False),
+            std.QueryReply(0x1234))),
+        ("EPC bytes", lambda: std.parse_hex(epc)),
+    ]
+
+    for word_count in (4, 64):
+        tag = Tag(word_count)
+        tag.tid = make_tag_memory('AAAA', word_count * 16, 1)
+        tag._state = Tag.State.SECURED
+        tag._rn = 0x1234
+        tag._preamble = std.create_tag_preamble(std.TagEncoding.M2, False)
+        read = std.ReaderFrame(sync, std.Read(
+            std.MemoryBank.TID, 0, word_count, 0x1234, 0x5678))
+        operations.append((
+            f"TID read, {word_count} words",
+            lambda tag=tag, read=read:
+                tag.process_read(read).reply.get_memory_string()))
+
+    rows = []
+    for name, fn in operations:
+        rows.append((name, f"{_calls_per_sec(fn, num_calls):.0f}",
+                     f"{_bytes_per_call(fn, num_calls):.0f}"))
+    return rows
+
+
+def bench_random_draws(num_calls=200_000, seed=1):
+    """
+    Compare draws/sec of the numbers drawn by tags and reader one at a
+    time: direct `np.random.Generator` calls (before) and `RandomBuffer`
+    (after).
+    """
+    rng = np.random.default_rng(seed)
+    random = RandomBuffer(np.random.default_rng(seed))
+    draws = (
+        ("slot counter (Q=4)", lambda: rng.integers(0, 16),
+         lambda: random.randbits(4)),
+        ("RN16", lambda: rng.integers(0, 0x10000),
+         lambda: random.randbits(16)),
+        ("uniform", lambda: rng.uniform(0.0, 1.0), random.uniform),
+    )
+    rows = []
+    for name, before_fn, after_fn in draws:
+        before = _calls_per_sec(before_fn, num_calls)
+        after = _calls_per_sec(after_fn, num_calls)
+        rows.append((name, f"{before:.0f}", f"{after:.0f}",
+                     f"{after / before:.2f}"))
+    return rows
+
+
+BENCHMARKS = {
+    'clock': (bench_clock, ("clock", "events/sec", "end time error, sec",
+                            "simultaneous")),
+    'frames': (bench_frames, ("operation", "calls/sec", "bytes/result")),
+    'kernel_dispatch': (bench_kernel_dispatch,
+                        ("scenario", "events", "events/sec")),
+    'memory': (bench_memory, ("objects", "bytes/tag", "reduction")),
+    'pathloss': (bench_pathloss, ("function", "calls/sec")),
+    'pathloss_table': (bench_pathloss_table,
+                       ("path loss", "tags/sec", "speedup", "max error, dB")),
+    'random_draws': (bench_random_draws,
+                     ("draw", "before, draws/sec", "after, draws/sec",
+                      "speedup")),
+    'periodic': (bench_periodic, ("timer", "events", "events/sec")),
+    'power_modes': (bench_power_modes,
+                    ("mode", "rounds_per_tag", "inventory_prob",
+                     "read_tid_prob", "elapsed, sec")),
+    'event_queue': (bench_event_queue,
+                    ("compaction", "cycles/sec", "peak size", "cancelled",
+                     "compactions")),
+    'event_queues': (bench_event_queues,
+                     ("queue", "operations", "operations/sec", "speedup",
+                      "same order")),
+    'idle_fast_forward': (bench_idle_fast_forward,
+                          ("fast-forward", "rounds_per_tag", "inventory_prob",
+                           "read_tid_prob", "events", "elapsed, sec")),
+    'reader_states': (bench_reader_states,
+                      ("scenario", "transitions", "transitions/sec")),
+    'round_at_once': (bench_round_at_once,
+                      ("engine", "rounds_per_tag", "inventory_prob",
+                       "read_tid_prob", "elapsed, sec")),
+    'tag_registry': (bench_tag_registry,
+                     ("delivery", "commands/sec", "speedup")),
+    'tag_population': (bench_tag_population,
+                       ("tags", "commands/sec", "speedup", "same replies")),
+}
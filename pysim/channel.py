@@ -1,3 +1,6 @@
+import cmath
+import math
+
 import numpy as np
 from numpy import linalg as la
 import scipy
@@ -23,6 +26,23 @@ def to_power(value, log=True, dbm=False):
     return to_log(power, dbm=dbm) if log else power
 
 
+def to_log_array(value, dbm=False, tol=1e-15):
+    value = np.asarray(value, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ret = 10 * np.log10(value) + 30 * int(dbm)
+    return np.where(value >= tol, ret, -np.inf)
+
+
+def to_power_array(value, log=True, dbm=False):
+    power = np.abs(value) ** 2
+    return to_log_array(power, dbm=dbm) if log else power
+
+
+def _dot(a, b):
+    # Row-wise dot product of (..., 3) arrays with broadcasting
+    return np.sum(a * b, axis=-1)
+
+
 #
 # Radiation Pattern
 #
@@ -55,8 +75,32 @@ def rp_isotropic(**kwargs):
 #     return np.abs(np.cos(np.pi / 2 * a_sin) / a_cos) if a_cos > tol else 0.
 
 def rp_dipole(*, azimuth, tol=1e-9, **kwargs):
-    a_sin = to_sin(azimuth)
-    return np.abs(np.cos(np.pi / 2 * a_sin) / azimuth) if azimuth > tol else 0.
+    if np.ndim(azimuth) == 0:
+        return rp_dipole_scalar(azimuth=float(azimuth), tol=tol)
+    return rp_dipole_array(azimuth=azimuth, tol=tol)
+
+
+def rp_dipole_array(*, azimuth, tol=1e-9, **kwargs):
+    """
+    Array version of `rp_dipole()`: `azimuth` may be an array of cosines.
+    Directions with azimuth cosine below `tol` get zero gain.
+    """
+    azimuth = np.asarray(azimuth, dtype=float)
+    a_sin = np.sqrt(np.maximum(1 - azimuth ** 2, 0.))
+    visible = azimuth > tol
+    safe_azimuth = np.where(visible, azimuth, 1.)
+    return np.where(
+        visible, np.abs(np.cos(np.pi / 2 * a_sin) / safe_azimuth), 0.)
+
+
+def rp_dipole_scalar(*, azimuth, tol=1e-9, **kwargs):
+    """
+    Scalar version of `rp_dipole()` for Python floats, uses `math` only.
+    """
+    if azimuth <= tol:
+        return 0.
+    a_sin = math.sqrt(max(1 - azimuth * azimuth, 0.))
+    return abs(math.cos(math.pi / 2 * a_sin) / azimuth)
 
 # def rp_dipole(*, azimuth, **kwargs):
 #     """
@@ -104,22 +148,58 @@ def reflection_constant(**kwargs):
     return -1.0 + 0.j
 
 def reflection(*, cosine, polarization, permittivity, conductivity, wavelen, **kwargs):
+    if np.ndim(cosine) == 0 and np.ndim(polarization) == 0:
+        return reflection_scalar(
+            cosine=float(cosine), polarization=polarization,
+            permittivity=permittivity, conductivity=conductivity,
+            wavelen=wavelen)
+    return reflection_array(
+        cosine=cosine, polarization=polarization, permittivity=permittivity,
+        conductivity=conductivity, wavelen=wavelen)
+
+
+def reflection_array(*, cosine, polarization, permittivity, conductivity,
+                     wavelen, **kwargs):
+    """
+    Array version of `reflection()`. Both `cosine` and `polarization` may be
+    arrays, they are broadcast against each other.
+    """
+    cosine = np.asarray(cosine, dtype=float)
+    polarization = np.asarray(polarization, dtype=float)
+    sine = np.sqrt(np.maximum(1 - cosine ** 2, 0.))
+
+    # Both components are computed and the unused one is masked out
+    # (instead of skipping it as the scalar code did for pure polarizations).
+    c_parallel = __c_parallel(cosine, permittivity, conductivity, wavelen)
+    r_parallel = np.where(
+        polarization != 0, (sine - c_parallel) / (sine + c_parallel), 0.j)
+
+    c_perpendicular = __c_perpendicular(
+        cosine, permittivity, conductivity, wavelen)
+    r_perpendicular = np.where(
+        polarization != 1,
+        (sine - c_perpendicular) / (sine + c_perpendicular), 0.j)
+
+    return polarization * r_parallel + (1 - polarization) * r_perpendicular
 
-    sine = (1 - cosine ** 2) ** .5
 
+def reflection_scalar(*, cosine, polarization, permittivity, conductivity,
+                      wavelen, **kwargs):
+    """
+    Scalar version of `reflection()` for Python floats, uses `cmath` only.
+    """
+    sine = math.sqrt(max(1 - cosine * cosine, 0.))
+    eta = permittivity - 60j * wavelen * conductivity
     if polarization != 0:
-        c_parallel = __c_parallel(cosine, permittivity, conductivity, wavelen)
+        c_parallel = cmath.sqrt(eta - cosine * cosine)
         r_parallel = (sine - c_parallel) / (sine + c_parallel)
     else:
         r_parallel = 0.j
-
-
     if polarization != 1:
-        c_perpendicular = __c_perpendicular(cosine, permittivity, conductivity, wavelen)
+        c_perpendicular = cmath.sqrt(eta - cosine * cosine) / eta
         r_perpendicular = (sine - c_perpendicular) / (sine + c_perpendicular)
     else:
         r_perpendicular = 0.j
-
     return polarization * r_parallel + (1 - polarization) * r_perpendicular
 
 # def reflection(*, grazing_angle, polarization, permittivity, conductivity, wavelen, **kwargs):
@@ -184,69 +264,192 @@ def two_ray_pathloss(*, time, ground_reflection, wavelen,
     :param rx_pos: a current position of the receiver
     :param rx_rp: a radiation pattern of the receiver
     :return: free space path loss in linear scale
+
+    A single TX-RX pair (3-vectors and scalar time) is computed by
+    `two_ray_pathloss_scalar()`, broadcast arrays - by
+    `two_ray_pathloss_array()`.
     """
-    # LoS - Line-of-Sight, NLoS - Non-Line-of-Sight
+    if np.ndim(time) == 0 and all(
+            np.shape(vector) == (3,) for vector in (
+                tx_pos, tx_dir_theta, tx_velocity,
+                rx_pos, rx_dir_theta, rx_velocity)):
+        return two_ray_pathloss_scalar(
+            time=time, ground_reflection=ground_reflection, wavelen=wavelen,
+            tx_pos=tx_pos, tx_dir_theta=tx_dir_theta, tx_dir_phi=tx_dir_phi,
+            tx_velocity=tx_velocity, tx_rp=tx_rp, rx_pos=rx_pos,
+            rx_dir_theta=rx_dir_theta, rx_dir_phi=rx_dir_phi,
+            rx_velocity=rx_velocity, rx_rp=rx_rp, log=log, crutch=crutch,
+            **kwargs)
+    return two_ray_pathloss_array(
+        time=time, ground_reflection=ground_reflection, wavelen=wavelen,
+        tx_pos=tx_pos, tx_dir_theta=tx_dir_theta, tx_dir_phi=tx_dir_phi,
+        tx_velocity=tx_velocity, tx_rp=tx_rp, rx_pos=rx_pos,
+        rx_dir_theta=rx_dir_theta, rx_dir_phi=rx_dir_phi,
+        rx_velocity=rx_velocity, rx_rp=rx_rp, log=log, crutch=crutch,
+        **kwargs)[()]
+
+
+def two_ray_pathloss_array(*, time, ground_reflection, wavelen,
+                           tx_pos, tx_dir_theta, tx_velocity, tx_rp,
+                           rx_pos, rx_dir_theta, rx_velocity, rx_rp,
+                           tx_dir_phi=None, rx_dir_phi=None, log=False,
+                           crutch=False, **kwargs):
+    """
+    Array version of `two_ray_pathloss()`.
+
+    Positions, antenna directions and velocities are (..., 3) arrays and
+    `time` is an array of shape (...); all of them are broadcast against
+    each other, e.g. a single reader position (3,) against (N, 3) tag
+    positions, or a (T, 1) column of times against (N, 3) positions.
+    Radiation patterns and the reflection function must accept arrays
+    (see `rp_dipole_array()` and `reflection_array()`).
 
-    # Ray geometry computation
-    # print(f"tx-pos: {tx_pos}, rx-pos: {rx_pos}")
-    ground_normal = np.array([1, 0, 0])
-    rx_pos_refl = np.array([-rx_pos[0], rx_pos[1], rx_pos[2]])  # Reflect RX relatively the ground. Координаты метки "под землёй". Это "тень" метки, благодаря которой мы можем узнать координаты точки отражения (точка математически условна, так как находится под землёй)
-
-    d0_vector = rx_pos - tx_pos            # LoS ray vector
-    d1_vector = rx_pos_refl - tx_pos       # NLoS ray vector
-    d0 = la.norm(d0_vector)                # LoS ray length
-    d1 = la.norm(d1_vector)                # NLoS ray length
-    d0_vector_tx_n = d0_vector / d0        # LoS ray vector normalized
-    d0_vector_rx_n = -d0_vector_tx_n
-    d1_vector_tx_n = d1_vector / d1        # NLoS ray vector normalized
-    d1_vector_rx_n = np.array([-d1_vector_tx_n[0], -d1_vector_tx_n[1], d1_vector_tx_n[2]])
-
-    #Предполагается, что стена, от которой происходит отражение - это плоскость YOZ
-    x_rfp = 0
-    y_rfp = -tx_pos[0]*(rx_pos_refl[1]-tx_pos[1])/(rx_pos_refl[0]-tx_pos[0]) + tx_pos[1]
-    z_rfp = -tx_pos[0]*(rx_pos_refl[2]-tx_pos[2])/(rx_pos_refl[0]-tx_pos[0]) + tx_pos[2]
-    ref_point = np.array([x_rfp, y_rfp, z_rfp]) #Координаты точки, в которой происходит отражение от стены
-
-    reflected_vector = np.array([(rx_pos[0]-x_rfp),(rx_pos[1]-y_rfp),(rx_pos[2]-z_rfp)])
-    reflected_vector_n = reflected_vector/la.norm(reflected_vector)
+    :return: path loss array of the broadcast shape (without the last axis)
+    """
+    geometry = two_ray_geometry_array(
+        ground_reflection=ground_reflection, wavelen=wavelen,
+        tx_pos=tx_pos, tx_dir_theta=tx_dir_theta, tx_velocity=tx_velocity,
+        tx_rp=tx_rp, rx_pos=rx_pos, rx_dir_theta=rx_dir_theta,
+        rx_velocity=rx_velocity, rx_rp=rx_rp, **kwargs)
+    return two_ray_pathloss_from_geometry(
+        time=time, wavelen=wavelen, log=log, crutch=crutch, **geometry)
+
+
+def two_ray_geometry_array(*, ground_reflection, wavelen,
+                           tx_pos, tx_dir_theta, tx_velocity, tx_rp,
+                           rx_pos, rx_dir_theta, rx_velocity, rx_rp,
+                           tx_dir_phi=None, rx_dir_phi=None, **kwargs):
+    """
+    Time-independent part of `two_ray_pathloss_array()`: rays lengths,
+    radiation pattern gains, reflection coefficient and projections of the
+    relative velocity on the rays.
+
+    :return: dict with keys d0, d1, g0, g1, r1, velocity_pr_0, velocity_pr_1
+        (arguments of `two_ray_pathloss_from_geometry()`)
+    """
+    # LoS - Line-of-Sight, NLoS - Non-Line-of-Sight
+    tx_pos = np.asarray(tx_pos, dtype=float)
+    rx_pos = np.asarray(rx_pos, dtype=float)
+
+    # Ray geometry computation. The wall the ray is reflected from is the
+    # YOZ plane, so the NLoS ray goes to the RX position mirrored by X.
+    rx_pos_refl = rx_pos * np.array([-1., 1., 1.])
+    d0_vector = rx_pos - tx_pos                 # LoS ray vector
+    d1_vector = rx_pos_refl - tx_pos            # NLoS ray vector
+    d0 = np.sqrt(_dot(d0_vector, d0_vector))    # LoS ray length
+    d1 = np.sqrt(_dot(d1_vector, d1_vector))    # NLoS ray length
+    d0_vector_tx_n = d0_vector / d0[..., np.newaxis]
+    d1_vector_tx_n = d1_vector / d1[..., np.newaxis]
+    d1_vector_rx_n = d1_vector_tx_n * np.array([-1., -1., 1.])
 
     # Azimuth angle computation for computation of attenuation
     # caused by deflection from polar direction
-    tx_azimuth_0 = np.dot(d0_vector_tx_n, tx_dir_theta)
-    rx_azimuth_0 = np.dot(d0_vector_rx_n, rx_dir_theta)
-    tx_azimuth_1 = np.dot(d1_vector_tx_n, tx_dir_theta)
-    rx_azimuth_1 = -1*np.dot(d1_vector_rx_n, rx_dir_theta) #Версия Андрея
-    #rx_azimuth_1 = np.arccos(-1*np.dot(reflected_vector_n, rx_dir_theta))  # Моя версия
+    tx_azimuth_0 = _dot(d0_vector_tx_n, tx_dir_theta)
+    rx_azimuth_0 = -_dot(d0_vector_tx_n, rx_dir_theta)
+    tx_azimuth_1 = _dot(d1_vector_tx_n, tx_dir_theta)
+    rx_azimuth_1 = -_dot(d1_vector_rx_n, rx_dir_theta)
+
+    # A grazing angle of NLoS ray for computation of reflection coefficient.
+    # Ground normal is (1, 0, 0), so the dot product is the X component.
+    grazing_angle = -d1_vector_rx_n[..., 0]
+
+    relative_velocity = np.asarray(rx_velocity) - np.asarray(tx_velocity)
+
+    return {
+        'd0': d0,
+        'd1': d1,
+        'g0': (tx_rp(azimuth=tx_azimuth_0, wavelen=wavelen, **kwargs) *
+               rx_rp(azimuth=rx_azimuth_0, wavelen=wavelen, **kwargs)),
+        'g1': (tx_rp(azimuth=tx_azimuth_1, wavelen=wavelen, **kwargs) *
+               rx_rp(azimuth=rx_azimuth_1, wavelen=wavelen, **kwargs)),
+        'r1': ground_reflection(
+            cosine=grazing_angle, wavelen=wavelen, **kwargs),
+        'velocity_pr_0': _dot(d0_vector_tx_n, relative_velocity),
+        'velocity_pr_1': _dot(d1_vector_tx_n, relative_velocity),
+    }
+
+
+def two_ray_pathloss_from_geometry(*, time, wavelen, d0, d1, g0, g1, r1,
+                                   velocity_pr_0, velocity_pr_1, log=False,
+                                   crutch=False):
+    """
+    Combine LoS and NLoS rays computed by `two_ray_geometry_array()` into
+    the path loss at the given time (Doppler shift is applied here).
+    """
+    k = 2 * np.pi / wavelen
+    field = (g0 / d0 * np.exp(-1j * k * (d0 - time * velocity_pr_0)) +
+             r1 * g1 / d1 * np.exp(-1j * k * (d1 - time * velocity_pr_1)))
+    # Короче, тут костыль, потому что я не помню, почему где-то ответ
+    # возводится в квадрат, а где-то нет, поэтому я сделал два варианта return.
+    if crutch:
+        return (0.5 / k) ** 2 * np.absolute(field) ** 2
+    pathloss = .5 / k * field
+    return to_power_array(pathloss) if log else pathloss
 
-    # A grazing angle of NLoS ray for computation of reflection coefficient
-    grazing_angle = -1*np.dot(d1_vector_rx_n, ground_normal) #Версия Андрея
-    #grazing_angle = np.arccos(np.dot(reflected_vector_n, ground_normal)) #Моя версия
 
-    relative_velocity = rx_velocity - tx_velocity
-    velocity_pr_0 = np.dot(d0_vector_tx_n, relative_velocity)
-    velocity_pr_1 = np.dot(d1_vector_tx_n, relative_velocity)
+def two_ray_pathloss_scalar(*, time, ground_reflection, wavelen,
+                            tx_pos, tx_dir_theta, tx_velocity, tx_rp,
+                            rx_pos, rx_dir_theta, rx_velocity, rx_rp,
+                            tx_dir_phi=None, rx_dir_phi=None, log=False,
+                            crutch=False, **kwargs):
+    """
+    Scalar version of `two_ray_pathloss()` for a single TX-RX pair.
+
+    Vectors are unpacked into Python floats and the computation is done with
+    `math` and `cmath`, without creating temporary NumPy arrays, which is
+    much cheaper for 3-element vectors. Radiation patterns and reflection
+    function are called with floats, so their scalar versions should be used
+    (see `rp_dipole_scalar()` and `reflection_scalar()`).
+    """
+    tx_x, tx_y, tx_z = _as_floats(tx_pos)
+    rx_x, rx_y, rx_z = _as_floats(rx_pos)
+    tx_dx, tx_dy, tx_dz = _as_floats(tx_dir_theta)
+    rx_dx, rx_dy, rx_dz = _as_floats(rx_dir_theta)
+    tx_vx, tx_vy, tx_vz = _as_floats(tx_velocity)
+    rx_vx, rx_vy, rx_vz = _as_floats(rx_velocity)
+
+    # LoS ray: RX - TX, NLoS ray: RX mirrored by X (the wall) - TX
+    d0_x, d0_y, d0_z = rx_x - tx_x, rx_y - tx_y, rx_z - tx_z
+    d1_x, d1_y, d1_z = -rx_x - tx_x, d0_y, d0_z
+    d0 = math.sqrt(d0_x * d0_x + d0_y * d0_y + d0_z * d0_z)
+    d1 = math.sqrt(d1_x * d1_x + d1_y * d1_y + d1_z * d1_z)
+    n0_x, n0_y, n0_z = d0_x / d0, d0_y / d0, d0_z / d0
+    n1_x, n1_y, n1_z = d1_x / d1, d1_y / d1, d1_z / d1
+
+    tx_azimuth_0 = n0_x * tx_dx + n0_y * tx_dy + n0_z * tx_dz
+    rx_azimuth_0 = -(n0_x * rx_dx + n0_y * rx_dy + n0_z * rx_dz)
+    tx_azimuth_1 = n1_x * tx_dx + n1_y * tx_dy + n1_z * tx_dz
+    # NLoS ray direction at RX is (-n1_x, -n1_y, n1_z):
+    rx_azimuth_1 = n1_x * rx_dx + n1_y * rx_dy - n1_z * rx_dz
+    grazing_angle = n1_x
+
+    rel_vx, rel_vy, rel_vz = rx_vx - tx_vx, rx_vy - tx_vy, rx_vz - tx_vz
+    velocity_pr_0 = n0_x * rel_vx + n0_y * rel_vy + n0_z * rel_vz
+    velocity_pr_1 = n1_x * rel_vx + n1_y * rel_vy + n1_z * rel_vz
 
-    # Attenuation caused by radiation pattern
     g0 = (tx_rp(azimuth=tx_azimuth_0, wavelen=wavelen, **kwargs) *
           rx_rp(azimuth=rx_azimuth_0, wavelen=wavelen, **kwargs))
-
     g1 = (tx_rp(azimuth=tx_azimuth_1, wavelen=wavelen, **kwargs) *
           rx_rp(azimuth=rx_azimuth_1, wavelen=wavelen, **kwargs))
 
-    # Attenuation due to reflections (reflection coefficient) computation
     r1 = ground_reflection(cosine=grazing_angle, wavelen=wavelen, **kwargs)
 
-    k = 2 * np.pi / wavelen
-                                    
-    pathloss = .5/k * (g0 / d0 * np.exp(-1j * k * (d0 - time * velocity_pr_0)) +
-    r1 * g1 / d1 * np.exp(-1j * k * (d1 - time * velocity_pr_1)) )
-    # Короче, тут костыль, потому что я не помню, почему где-то ответ возводится в квадрат, а где-то нет,
-    # поэтому я сделал два варианта return.
+    k = 2 * math.pi / wavelen
+    field = (g0 / d0 * cmath.exp(-1j * k * (d0 - time * velocity_pr_0)) +
+             r1 * g1 / d1 * cmath.exp(-1j * k * (d1 - time * velocity_pr_1)))
     if crutch:
-        return (0.5/k)**2 * np.absolute(   g0/d0*np.exp(-1j*k*(d0 - time * velocity_pr_0)) +
-                r1*g1/d1*np.exp(-1j*k*(d1 - time * velocity_pr_1)))**2
-    else:
-        return to_power(pathloss) if log else pathloss
+        return (0.5 / k) ** 2 * abs(field) ** 2
+    pathloss = .5 / k * field
+    if not log:
+        return pathloss
+    power = abs(pathloss) ** 2
+    return 10 * math.log10(power) if power >= 1e-15 else -math.inf
+
+
+def _as_floats(vector):
+    if isinstance(vector, np.ndarray):
+        return vector.tolist()
+    return [float(x) for x in vector]
 
 
 # def two_ray_pathloss(*, time, ground_reflection, wavelen,
@@ -312,31 +515,45 @@ def snr(power, noise):
 
 def snr_full(*, snr, miller=1, symbol=1.25e-6, preamble=9.3e-6,
                      bandwidth=1.2e6, tol=1e-8, **kwargs):
+    return snr_full_array(
+        snr=snr, miller=miller, symbol=symbol, preamble=preamble,
+        bandwidth=bandwidth, tol=tol)[()]
 
-    if snr < tol:
-        return 0.5
 
-    # print(">>> miller={}, symbol={}, preamble={}, bandwidth={}".format(
-    #     miller, symbol, preamble, bandwidth
-    # ))
-    # print('++++++++++', snr, preamble, bandwidth, miller, symbol)
-    sync_angle = (snr * preamble * bandwidth) ** -0.5
-    return miller * snr * symbol * bandwidth * np.cos(sync_angle) ** 2
+def snr_full_array(*, snr, miller=1, symbol=1.25e-6, preamble=9.3e-6,
+                   bandwidth=1.2e6, tol=1e-8, **kwargs):
+    """
+    Array version of `snr_full()`, all arguments are broadcast.
+    """
+    snr = np.asarray(snr, dtype=float)
+    valid = snr >= tol
+    safe_snr = np.where(valid, snr, 1.)
+    sync_angle = (safe_snr * preamble * bandwidth) ** -0.5
+    return np.where(
+        valid, miller * snr * symbol * bandwidth * np.cos(sync_angle) ** 2,
+        0.5)
+
 
 def q_func(x):
     return 0.5 - 0.5 * scipy.special.erf(x / 2 ** 0.5)
 
 def ber(snr, distr='rayleigh', tol=1e-8):
-    if snr < tol:
-        return 0.5
+    return ber_array(snr, distr=distr, tol=tol)[()]
 
-    if distr == 'rayleigh':
 
-        t = (1 + 2 / snr) ** 0.5
-        return 0.5 - 1 / t + 2 / np.pi * np.arctan(t) / t
+def ber_array(snr, distr='rayleigh', tol=1e-8):
+    """
+    Array version of `ber()`: computes BER for each SNR value in `snr`.
+    """
+    snr = np.asarray(snr, dtype=float)
+    valid = snr >= tol
+    safe_snr = np.where(valid, snr, 1.)
 
+    if distr == 'rayleigh':
+        t = (1 + 2 / safe_snr) ** 0.5
+        value = 0.5 - 1 / t + 2 / np.pi * np.arctan(t) / t
     else:
+        t = q_func(safe_snr ** 0.5)
+        value = 2 * t * (1 - t)
 
-        t = q_func(snr ** 0.5)
-        return 2 * t * (1 - t)
-
+    return np.where(valid, value, 0.5)
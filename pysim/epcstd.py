@@ -1,6 +1,6 @@
 from enum import Enum
-import random
-import collections
+import collections.abc
+import functools
 import numpy as np
 
 
@@ -365,6 +365,44 @@ def encode_ebv(value, first_block=True):
                encode_ebv(value % 128, first_block=first_block)
 
 
+# Packed encoding: a bit string is represented with a pair (value, n_bits),
+# where value is an integer with the bits (the first bit is the most
+# significant one). It gives the same bits as the encode_xxx() functions.
+
+@functools.lru_cache(maxsize=None)
+def pack_code(code):
+    return int(code, 2), len(code)
+
+
+def pack_bool(value):
+    return (1 if value else 0), 1
+
+
+def pack_int(value, n_bits):
+    return value % (1 << n_bits), n_bits
+
+
+def pack_ebv(value, first_block=True):
+    prefix = 0 if first_block else 0x80
+    if value < 128:
+        return prefix | value, 8
+    else:
+        high, n_bits = pack_ebv(value >> 7, first_block=False)
+        return (high << 8) | prefix | (value % 128), n_bits + 8
+
+
+def pack_fields(*fields):
+    value, n_bits = 0, 0
+    for field_value, field_bits in fields:
+        value = (value << field_bits) | field_value
+        n_bits += field_bits
+    return value, n_bits
+
+
+def unpack_string(value, n_bits):
+    return format(value, '0{}b'.format(n_bits))
+
+
 #
 #######################################################################
 # Commands
@@ -379,13 +417,25 @@ class Command:
     def code(self):
         return self._code
 
-    def encode(self):
+    @property
+    def key(self):
+        """
+        Tuple of the command fields, which define its encoding.
+        """
+        raise NotImplementedError
+
+    def pack(self):
+        """
+        Get the encoded command as a pair (value, n_bits), see pack_fields().
+        """
         raise NotImplementedError
 
+    def encode(self):
+        return unpack_string(*self.pack())
+
     @property
     def bitlen(self):
-        s = self.encode()
-        return len(s)
+        return self.pack()[1]
 
 
 class Query(Command):
@@ -401,11 +451,18 @@ class Query(Command):
         self.q = q if q is not None else stdParams.Q
         self.crc = crc if crc is not None else stdParams.default_crc5
 
-    def encode(self):
-        return (self.code.code + self.dr.code + self.m.code +
-                encode_bool(self.trext) + self.sel.code + self.session.code +
-                self.target.code + encode_int(self.q, 4) +
-                encode_int(self.crc, 5))
+    @property
+    def key(self):
+        return (self.code, self.dr, self.m, self.trext, self.sel,
+                self.session, self.target, self.q, self.crc)
+
+    def pack(self):
+        return pack_fields(
+            pack_code(self.code.code), pack_code(self.dr.code),
+            pack_code(self.m.code), pack_bool(self.trext),
+            pack_code(self.sel.code), pack_code(self.session.code),
+            pack_code(self.target.code), pack_int(self.q, 4),
+            pack_int(self.crc, 5))
 
     def __str__(self):
         return "{o.code}{{DR({o.dr}),{o.m},TRext({trext}),{o.sel}," \
@@ -418,8 +475,13 @@ class QueryRep(Command):
         super().__init__(CommandCode.QUERY_REP)
         self.session = session if session is not None else stdParams.session
 
-    def encode(self):
-        return self.code.code + self.session.code
+    @property
+    def key(self):
+        return self.code, self.session
+
+    def pack(self):
+        return pack_fields(pack_code(self.code.code),
+                           pack_code(self.session.code))
 
     def __str__(self):
         return "{o.code}{{{o.session}}}".format(o=self)
@@ -430,8 +492,12 @@ class Ack(Command):
         super().__init__(CommandCode.ACK)
         self.rn = rn if rn is not None else stdParams.default_rn
 
-    def encode(self):
-        return self.code.code + encode_int(self.rn, 16)
+    @property
+    def key(self):
+        return self.code, self.rn
+
+    def pack(self):
+        return pack_fields(pack_code(self.code.code), pack_int(self.rn, 16))
 
     def __str__(self):
         return "{o.code}{{0x{o.rn:04X}}}".format(o=self)
@@ -443,8 +509,13 @@ class ReqRN(Command):
         self.rn = rn if rn is not None else stdParams.default_rn
         self.crc = crc if crc is not None else stdParams.default_crc16
 
-    def encode(self):
-        return self.code.code + encode_word(self.rn) + encode_word(self.crc)
+    @property
+    def key(self):
+        return self.code, self.rn, self.crc
+
+    def pack(self):
+        return pack_fields(pack_code(self.code.code), pack_int(self.rn, 16),
+                           pack_int(self.crc, 16))
 
     def __str__(self):
         return "{o.code}{{RN(0x{o.rn:04X}),CRC(0x{o.crc:04X})}}".format(o=self)
@@ -463,10 +534,16 @@ class Read(Command):
         self.rn = rn if rn is not None else stdParams.default_rn
         self.crc = crc if crc is not None else stdParams.default_crc16
 
-    def encode(self):
-        return (self.code.code + self.bank.code + encode_ebv(self.word_ptr) +
-                encode_byte(self.word_count) + encode_word(self.rn) +
-                encode_word(self.crc))
+    @property
+    def key(self):
+        return (self.code, self.bank, self.word_ptr, self.word_count, self.rn,
+                self.crc)
+
+    def pack(self):
+        return pack_fields(
+            pack_code(self.code.code), pack_code(self.bank.code),
+            pack_ebv(self.word_ptr), pack_int(self.word_count, 8),
+            pack_int(self.rn, 16), pack_int(self.crc, 16))
 
     def __str__(self):
         return "{o.code}{{{o.bank},WordPtr(0x{o.word_ptr:02X})," \
@@ -516,7 +593,7 @@ class QueryReply(Reply):
 def to_bytes(value):
     if isinstance(value, str):
         return list(bytearray.fromhex(value))
-    elif isinstance(value, collections.Iterable):
+    elif isinstance(value, collections.abc.Iterable):
         value = list(value)
         for b in value:
             if not isinstance(b, int) or not (0 <= b < 256):
@@ -526,10 +603,37 @@ def to_bytes(value):
         raise ValueError("value must be a hex string or bytes collections")
 
 
+@functools.lru_cache(maxsize=65536)
+def parse_hex(value):
+    """
+    Get the bytes of a hex string. The same EPC and memory strings are sent
+    in every reply, so the parsed strings are cached.
+    """
+    return bytes.fromhex(value)
+
+
+def to_hex(data, byte_separator=""):
+    """
+    Get a hex string (upper case) of the bytes collection `data`.
+    """
+    if byte_separator:
+        return byte_separator.join("{:02X}".format(b) for b in data)
+    return bytes(data).hex().upper()
+
+
+def _reply_bytes(value):
+    # Tag memory is kept in bytes (memoryview for Read replies), which are
+    # used as is, without copying. Hex strings and other collections are
+    # converted as before.
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return value
+    return parse_hex(value) if isinstance(value, str) else to_bytes(value)
+
+
 class AckReply(Reply):
     def __init__(self, epc="", pc=0x0000, crc=0x0000):
         super().__init__(ReplyType.ACK_REPLY)
-        self._data = to_bytes(epc)
+        self._data = _reply_bytes(epc)
         self.pc = pc
         self.crc = crc
 
@@ -542,7 +646,7 @@ class AckReply(Reply):
         return self._data
 
     def get_epc_string(self, byte_separator=""):
-        return byte_separator.join("{:02X}".format(b) for b in self._data)
+        return to_hex(self._data, byte_separator)
 
     def __str__(self):
         return "Reply{{PC(0x{o.pc:04X}),EPC({epc})," \
@@ -570,14 +674,14 @@ class ReadReply(Reply):
         self.rn = rn
         self.crc = crc
         self.header = header
-        self._data = to_bytes(data)
+        self._data = _reply_bytes(data)
 
     @property
     def memory(self):
         return self._data
 
     def get_memory_string(self, byte_separator=""):
-        return byte_separator.join("{:02X}".format(b) for b in self._data)
+        return to_hex(self._data, byte_separator)
 
     @property
     def bitlen(self):
@@ -594,14 +698,27 @@ class ReadReply(Reply):
 # Preambles and frames
 #######################################################################
 #
+# Preambles and frames are immutable, so the same objects can be shared by
+# all frames sent with the same reader or tag settings (see
+# create_tag_preamble() and objects.ReaderFramePool).
 class ReaderSync:
+    __slots__ = ('_tari', '_rtcal', '_delim')
     DELIM = 12.5e-6
 
     def __init__(self, tari, rtcal, delim=DELIM):
         super().__init__()
-        self.tari = tari
-        self.rtcal = rtcal
-        self.delim = delim
+        self._tari = tari
+        self._rtcal = rtcal
+        self._delim = delim
+
+    @property
+    def tari(self): return self._tari
+
+    @property
+    def rtcal(self): return self._rtcal
+
+    @property
+    def delim(self): return self._delim
 
     @property
     def data0(self): return self.tari
@@ -612,19 +729,30 @@ class ReaderSync:
     @property
     def duration(self): return self.delim + self.tari + self.rtcal
 
+    @property
+    def key(self): return self.tari, self.rtcal, self.delim
+
     def __str__(self):
         return "{{(Delim({}us),Tari({}us),RTcal({}us)}}".format(
             self.delim * 1e6, self.tari * 1e6, self.rtcal * 1e6)
 
 
 class ReaderPreamble(ReaderSync):
+    __slots__ = ('_trcal',)
+
     def __init__(self, tari, rtcal, trcal, delim=ReaderSync.DELIM):
         super().__init__(tari=tari, rtcal=rtcal, delim=delim)
-        self.trcal = trcal
+        self._trcal = trcal
+
+    @property
+    def trcal(self): return self._trcal
 
     @property
     def duration(self): return super().duration + self.trcal
 
+    @property
+    def key(self): return self.tari, self.rtcal, self.delim, self.trcal
+
     def __str__(self):
         return "{{Delim({}us),Tari({}us),RTcal({}us)," \
                "TRcal({}us)}}".format(self.delim * 1e6, self.tari * 1e6,
@@ -632,9 +760,15 @@ class ReaderPreamble(ReaderSync):
 
 
 class TagPreamble:
+    __slots__ = ('_extended',)
+
     def __init__(self, extended=False):
         super().__init__()
-        self.extended = extended
+        self._extended = extended
+
+    @property
+    def extended(self):
+        return self._extended
 
     @property
     def bitlen(self):
@@ -649,6 +783,8 @@ class TagPreamble:
 
 
 class FM0Preamble(TagPreamble):
+    __slots__ = ()
+
     def __init__(self, extended=False):
         super().__init__(extended)
 
@@ -667,6 +803,8 @@ class FM0Preamble(TagPreamble):
 
 
 class MillerPreamble(TagPreamble):
+    __slots__ = ('_encoding',)
+
     def __init__(self, m, extended=False):
         super().__init__(extended)
         self._encoding = MillerPreamble._get_and_validate_encoding(m)
@@ -675,10 +813,6 @@ class MillerPreamble(TagPreamble):
     def m(self):
         return self._encoding.symbols_per_bit
 
-    @m.setter
-    def m(self, value):
-        self._encoding = MillerPreamble._get_and_validate_encoding(value)
-
     @property
     def bitlen(self):
         return 22 if self.extended else 10
@@ -699,7 +833,12 @@ class MillerPreamble(TagPreamble):
             self.encoding, 1 if self.extended else 0)
 
 
+@functools.lru_cache(maxsize=None)
 def create_tag_preamble(encoding, extended=False):
+    """
+    Get the tag preamble for the given encoding and TRext flag. Preambles
+    are immutable, so the same object is returned for the same arguments.
+    """
     if encoding == TagEncoding.FM0:
         return FM0Preamble(extended)
     else:
@@ -707,21 +846,38 @@ def create_tag_preamble(encoding, extended=False):
 
 
 class ReaderFrame:
+    # Frame durations by (command key, preamble key). The cache is cleared
+    # when it grows larger than MAX_CACHED_DURATIONS (commands with RN16
+    # and CRC fields have many keys).
+    _durations = {}
+    MAX_CACHED_DURATIONS = 65536
+
+    __slots__ = ('_preamble', '_command')
+
     def __init__(self, preamble, command):
         super().__init__()
-        self.preamble = preamble
-        self.command = command
+        self._preamble = preamble
+        self._command = command
+
+    @property
+    def preamble(self):
+        return self._preamble
+
+    @property
+    def command(self):
+        return self._command
 
     @property
     def body_duration(self):
-        encoded_string = (self.command if isinstance(self.command, str)
-                          else self.command.encode())
-        n_bits = {'0': 0, '1': 0}
-        for b in encoded_string:
-            n_bits[b] += 1
+        if isinstance(self.command, str):
+            n_bits = len(self.command)
+            n_ones = self.command.count('1')
+        else:
+            value, n_bits = self.command.pack()
+            n_ones = bin(value).count('1')
         d0 = self.preamble.data0
         d1 = self.preamble.data1
-        return n_bits['0'] * d0 + n_bits['1'] * d1
+        return (n_bits - n_ones) * d0 + n_ones * d1
 
     @property
     def preamble_duration(self):
@@ -729,17 +885,39 @@ class ReaderFrame:
 
     @property
     def duration(self):
-        return self.body_duration + self.preamble.duration
+        command = self.command
+        key = (command if isinstance(command, str) else command.key,
+               type(self.preamble), self.preamble.key)
+        durations = ReaderFrame._durations
+        try:
+            return durations[key]
+        except KeyError:
+            pass
+        duration = self.body_duration + self.preamble.duration
+        if len(durations) >= ReaderFrame.MAX_CACHED_DURATIONS:
+            durations.clear()
+        durations[key] = duration
+        return duration
 
     def __str__(self):
         return "Frame{{{o.preamble}{o.command}}}".format(o=self)
 
 
 class TagFrame:
+    __slots__ = ('_preamble', '_reply')
+
     def __init__(self, preamble, reply):
         super().__init__()
-        self.preamble = preamble
-        self.reply = reply
+        self._preamble = preamble
+        self._reply = reply
+
+    @property
+    def preamble(self):
+        return self._preamble
+
+    @property
+    def reply(self):
+        return self._reply
 
     def get_body_duration(self, blf):
         m = self.preamble.encoding.symbols_per_bit
@@ -1070,8 +1248,11 @@ class SlotType(Enum):
 def slot_duration(slot_type, access_ops=None, tari=None, rtcal=None,
                   trcal=None, delim=None, dr=None, temp=None, m=None,
                   trext=None, sel=None, session=None, target=None, q=None,
-                  rn=None, epc=None, crc5=None, crc16=None, is_first=False):
-    rn = rn if rn is not None else random.randint(0x0000, 0xFFFF)
+                  rn=None, epc=None, crc5=None, crc16=None, is_first=False,
+                  rng=None):
+    # If RN16 is not given, it is drawn from rng (np.random.Generator)
+    rn = rn if rn is not None else int(
+        np.random.default_rng(rng).integers(0x0000, 0x10000))
 
     t4 = link_t4(rtcal)
     if is_first:
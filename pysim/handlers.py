@@ -1,7 +1,9 @@
 import numpy as np
 
-from pysim.objects import Transaction, Model, Tag
+from pysim.objects import Transaction, Model, Reader, Tag, TagRegistry
 import pysim.epcstd as std
+from pysim.simulator import Logger
+from pysim.trace import NO_VALUE
 
 
 def start_simulation(kernel):
@@ -11,11 +13,55 @@ def start_simulation(kernel):
     for generator in ctx.generators:
         kernel.schedule(generator.interval, generate_tag, generator)   # FIXME: uncomment!
         # kernel.schedule(0.001, generate_tag, generator)
-    kernel.schedule(ctx.update_interval, update_positions)
+    if ctx.power_update_mode == 'polling':
+        kernel.schedule_periodic(ctx.update_interval, update_positions)
+    elif ctx.power_update_mode != 'events':
+        raise ValueError("unsupported power update mode = '{}'".format(
+            ctx.power_update_mode))
     kernel.call(turn_reader_on, ctx.reader)
 
 
 def _update_power(time, reader, tags, transaction, medium, statistics):
+    if len(tags) > 1:
+        _update_power_batch(time, reader, tags, transaction, medium)
+    else:
+        _update_power_scalar(time, reader, tags, transaction, medium)
+
+    # Writing statistics
+    if statistics is not None and statistics.use_power_statistics:
+        for tag in tags:
+            statistics.get_tag_record(tag).write_power_record(
+                time, reader, medium)
+
+
+def _update_power_batch(time, reader, tags, transaction, medium):
+    # Same as _update_power_scalar(), but path losses for all tags are
+    # computed in a single vectorized pass over (N, 3) arrays.
+    tags = list(tags)
+    tag_pos = np.array([tag.pos for tag in tags], dtype=float)
+    tag_vel = np.array([tag.velocity * tag.normalized_direction
+                        for tag in tags], dtype=float)
+    dt = np.array([time - tag.last_pos_update for tag in tags], dtype=float)
+
+    powers = medium.estimate_tag_rx_power_array(
+        reader, tags, time, tag_pos, tag_vel)
+    new_pos = tag_pos + tag_vel * dt[:, np.newaxis]
+    for i, tag in enumerate(tags):
+        tag.set_power(time, powers[i] if powers is not None else None)
+        tag.pos = new_pos[i]
+        tag.last_pos_update = time
+
+    if transaction is not None:
+        tx_tags = list(transaction.tags)
+        if tx_tags:
+            rx_powers = medium.estimate_reader_rx_power_array(
+                reader, tx_tags, time)
+            for tag, power in zip(tx_tags, rx_powers):
+                transaction.reader_rx_power_map.update(
+                    tag, None if np.isnan(power) else power)
+
+
+def _update_power_scalar(time, reader, tags, transaction, medium):
     for tag in tags:
         power = medium.estimate_tag_rx_power(reader, tag, time)
         tag.set_power(time, power)
@@ -32,24 +78,63 @@ def _update_power(time, reader, tags, transaction, medium, statistics):
             power = medium.estimate_reader_rx_power(reader, tag, time)
             transaction.reader_rx_power_map.update(tag, power)
 
-    # Writing statistics
-    if statistics is not None and statistics.use_power_statistics:
-        for tag in tags:
-            statistics.get_tag_record(tag).write_power_record(
-                time, reader, medium)
+
+def _advance_positions(time, tags):
+    # In 'events' power update mode positions are not updated periodically,
+    # so they are moved to the current time before estimating powers.
+    for tag in tags:
+        tag.pos += tag.velocity * tag.normalized_direction * (
+            time - tag.last_pos_update)
+        tag.last_pos_update = time
+
+
+def _schedule_power_crossings(kernel, tags):
+    ctx = kernel.context
+    reader = ctx.reader
+    if reader.power is None or not tags:
+        return
+    # Crossings are predicted for the current antenna only, so they are
+    # predicted again when the antenna is switched
+    end_time = min(
+        reader.turn_off_time if reader.turn_off_time is not None else np.inf,
+        (reader.antenna_switch_time if reader.antenna_switch_time is not None
+         else np.inf))
+    end_times = [min(tag.death_time, end_time) for tag in tags]
+    crossings = ctx.medium.predict_tag_power_crossings(
+        reader, tags, kernel.time, end_times, ctx.update_interval)
+    for tag, times in zip(tags, crossings):
+        kernel.cancel(tag.power_event_id)
+        tag.power_crossings = times.tolist()
+        _schedule_next_power_crossing(kernel, tag)
+
+
+def _schedule_next_power_crossing(kernel, tag):
+    if tag.power_crossings:
+        dt = tag.power_crossings.pop(0) - kernel.time
+        tag.power_event_id = kernel.schedule(
+            max(dt, 0.0), update_tag_power, tag)
+    else:
+        tag.power_event_id = None
+
+
+def _cancel_power_crossings(kernel, tags):
+    for tag in tags:
+        kernel.cancel(tag.power_event_id)
+        tag.power_event_id = None
+        tag.power_crossings = ()
 
 
 def _build_transaction(kernel, reader, reader_frame):
     ctx = kernel.context
-    all_responses = ((tag, tag.receive(reader_frame)) for tag in ctx.tags)
-    tag_frames = [(tag, frame) for (tag, frame) in all_responses
-                  if frame is not None]
+    # Only tags which may process the command receive it, see TagRegistry
+    # (or TagPopulation, which processes the command for all tags at once)
+    tag_frames = ctx.tags.deliver(reader_frame)
 
     if ctx.tags:
         if isinstance(reader_frame.command, std.Query):
             stat = kernel.context.statistics
-            participating_tags = [tag for tag in ctx.tags if tag.state in
-                                  {Tag.State.ARBITRATE, Tag.State.REPLY}]
+            participating_tags = ctx.tags.with_states(
+                Tag.State.ARBITRATE, Tag.State.REPLY)
             for tag in participating_tags:
                 stat.get_tag_record(tag).num_rounds_attained += 1
                 # print("incrementing num_rounds for tag = {}".format(tag.tag_id))
@@ -66,12 +151,16 @@ def turn_reader_on(kernel, reader):
 
     # Managing antennas
     if reader.num_antennas > 1:
-        reader.antenna_switch_event_id = kernel.schedule(
+        reader.antenna_switch_event_id = kernel.schedule_periodic(
             reader.antenna_switch_interval, switch_reader_antenna, reader)
-    kernel.logger.debug("switched antenna #{}".format(reader.antenna_index))
+        reader.antenna_switch_time = (
+            kernel.time + reader.antenna_switch_interval)
+    kernel.logger.debug("switched antenna #%s", reader.antenna_index)
 
     # Updating tags and transaction power
     assert ctx.transaction is None
+    if ctx.power_update_mode == 'events':
+        _advance_positions(kernel.time, ctx.tags)
     _update_power(kernel.time, reader, ctx.tags, None, ctx.medium,
                   ctx.statistics)
 
@@ -82,17 +171,28 @@ def turn_reader_on(kernel, reader):
         transaction.duration, finish_transaction, transaction)
     if transaction.reply_start_time is not None:
         dt = transaction.reply_start_time - kernel.time
-        kernel.schedule(dt, update_power_at_response_start, transaction)
+        transaction.response_start_event_id = kernel.schedule(
+            dt, update_power_at_response_start, transaction)
 
     # Scheduling turning off
     power_mode = reader.power_control_mode
     turned_on_duration = power_mode.min_powered_on_interval(reader)
     kernel.schedule(turned_on_duration, turn_reader_off, reader)
+    reader.turn_off_time = (kernel.time + turned_on_duration
+                            if turned_on_duration is not None else None)
+
+    # Predicting when tags will be powered on and off
+    if ctx.power_update_mode == 'events':
+        _schedule_power_crossings(kernel, ctx.tags)
 
 
 def turn_reader_off(kernel, reader):
     ctx = kernel.context
     reader.turn_off()
+    reader.turn_off_time = None
+    if ctx.power_update_mode == 'events':
+        _cancel_power_crossings(kernel, ctx.tags)
+        _advance_positions(kernel.time, ctx.tags)
     _update_power(kernel.time, reader, ctx.tags, None, ctx.medium,
                   ctx.statistics)
 
@@ -104,6 +204,7 @@ def turn_reader_off(kernel, reader):
 
     # Clearing antenna switch event
     kernel.cancel(reader.antenna_switch_event_id)
+    reader.antenna_switch_time = None
 
     # Scheduling turning ON
     power_mode = reader.power_control_mode
@@ -122,6 +223,7 @@ def generate_tag(kernel, generator):
     tag = generator.create_tag(kernel.context)
     tag.kernel = kernel
     tag.last_pos_update = kernel.time
+    tag.death_time = kernel.time + generator.lifetime
     ctx.tags.append(tag)
 
     # Adding statistics record
@@ -135,14 +237,17 @@ def generate_tag(kernel, generator):
 
     _update_power(kernel.time, ctx.reader, [tag], None, ctx.medium,
                   ctx.statistics)
-    kernel.logger.info("(+) tag {} created for {}s: {}".format(
-        tag.tag_id, generator.lifetime, str(tag)))
+    if ctx.power_update_mode == 'events':
+        _schedule_power_crossings(kernel, [tag])
+    kernel.logger.info("(+) tag %s created for %ss: %s", tag.tag_id,
+                       generator.lifetime, tag)
 
 
 def remove_tag(kernel, tag):
     ctx = kernel.context
     ctx.tags.remove(tag)
-    kernel.logger.info("(x) tag {} died".format(tag.tag_id))
+    _cancel_power_crossings(kernel, [tag])
+    kernel.logger.info("(x) tag %s died", tag.tag_id)
     ctx.num_tags_simulated += 1
     if (ctx.max_tags_num is not None and
             ctx.num_tags_simulated >= ctx.max_tags_num):
@@ -152,26 +257,35 @@ def remove_tag(kernel, tag):
 
 
 def update_positions(kernel):
+    # Called periodically, see start_simulation()
     ctx = kernel.context
-
-    kernel.schedule(kernel.context.update_interval, update_positions)
     _update_power(kernel.time, ctx.reader, ctx.tags, ctx.transaction,
                   ctx.medium, ctx.statistics)
 
 
+def update_tag_power(kernel, tag):
+    # Called at the predicted sensitivity crossing in 'events' power update
+    # mode instead of periodic update_positions() calls.
+    ctx = kernel.context
+    _advance_positions(kernel.time, [tag])
+    _update_power(kernel.time, ctx.reader, [tag], None, ctx.medium,
+                  ctx.statistics)
+    _schedule_next_power_crossing(kernel, tag)
+
+
 def finish_transaction(kernel, transaction):
-    kernel.logger.trace("finished transaction: {}".format(str(transaction)))
+    kernel.logger.trace("finished transaction: %s", transaction)
     ctx = kernel.context
     reader = ctx.reader
     assert transaction is ctx.transaction
 
     tag, frame, snr, ber = transaction.received_tag_frame(
-        ctx.medium, kernel.time)
+        ctx.medium, kernel.time, ctx.channel_random)
     if frame is not None:
         if isinstance(frame.reply, std.AckReply):
             tag_read_record = (
                 ctx.statistics.get_tag_record(tag)
-                .new_tag_read_record(reader, reader.inventory_round.index))
+                .new_tag_read_record(reader, reader.round_index))
             tag_read_record.tag_pos = np.array(tag.pos, copy=True)
             tag_read_record.reader_antenna_pos = np.array(
                 reader.antenna.pos, copy=True)
@@ -189,44 +303,171 @@ def finish_transaction(kernel, transaction):
                     on_slot_end, reader=reader, tag=tag,
                     statistics=ctx.statistics)
 
-            kernel.logger.info(
-                "---> Received tag data: EPC={}, received power={} from tag {}"
-                "".format(
-                    "".join("{:02X}".format(b) for b in frame.reply.epc),
-                    transaction.reader_rx_power_map.get(tag), tag.tag_id))
+            if kernel.logger.is_enabled_for(Logger.Level.INFO):
+                kernel.logger.info(
+                    "---> Received tag data: EPC=%s, received power=%s from "
+                    "tag %s", frame.reply.get_epc_string(),
+                    transaction.reader_rx_power_map.get(tag), tag.tag_id)
 
         if isinstance(frame.reply, std.ReadReply):
             tag_read_record = ctx.statistics.get_tag_record(tag).tag_read_record
             tag_read_record.read_tid = True
 
-            kernel.logger.info(
-                "---> Received TID: memory={}, received power={} from tag {}"
-                "".format(
-                    "".join("{:02X}".format(b) for b in frame.reply.memory),
-                    transaction.reader_rx_power_map.get(tag), tag.tag_id))
+            if kernel.logger.is_enabled_for(Logger.Level.INFO):
+                kernel.logger.info(
+                    "---> Received TID: memory=%s, received power=%s from "
+                    "tag %s", frame.reply.get_memory_string(),
+                    transaction.reader_rx_power_map.get(tag), tag.tag_id)
 
         cmd_frame = ctx.reader.receive(frame)
     else:
+        if ctx.idle_fast_forward and _fast_forward_idle_slots(
+                kernel, transaction):
+            return
         cmd_frame = ctx.reader.timeout()
 
     # Processing new command (reader frame)
+    if ctx.round_at_once and _skip_round_slots(kernel, cmd_frame):
+        return
     ctx.transaction = _build_transaction(kernel, ctx.reader, cmd_frame)
     ctx.transaction.timeout_event_id = kernel.schedule(
-        transaction.duration, finish_transaction, ctx.transaction)
-    if transaction.reply_start_time is not None:
-        dt = transaction.reply_start_time - kernel.time
-        kernel.schedule(dt, update_power_at_response_start, transaction)
+        ctx.transaction.duration, finish_transaction, ctx.transaction)
+    if ctx.transaction.reply_start_time is not None:
+        dt = ctx.transaction.reply_start_time - kernel.time
+        ctx.transaction.response_start_event_id = kernel.schedule(
+            dt, update_power_at_response_start, ctx.transaction)
+
+
+def _fast_forward_idle_slots(kernel, transaction):
+    # If no tag is powered, all slots are empty until some other event
+    # (tag creation, power update or reader turning off) happens. These
+    # slots are skipped at once, and the transaction finish is moved to the
+    # start of the last slot before that event, so the slot containing the
+    # event is processed as usual.
+    ctx = kernel.context
+    if (transaction.replies or
+            ctx.tags.count(*TagRegistry.POWERED_STATES) > 0):
+        return False
+    next_event_time = kernel.next_event_time
+    if next_event_time is None:
+        return False
+    num_slots, duration = ctx.reader.skip_idle_slots(
+        next_event_time - kernel.time)
+    if num_slots == 0:
+        return False
+    kernel.logger.debug("skipped %d idle slots (%.6f sec.)", num_slots,
+                        duration)
+    transaction.timeout_event_id = kernel.schedule(
+        duration, finish_transaction, transaction)
+    return True
+
+
+def _skip_round_slots(kernel, cmd_frame):
+    # After the Query all tags slot counters are known, so the outcomes of
+    # the next QueryRep slots are given by the counters histogram: slot m
+    # (starting from the current one, m = 1) is empty, singleton or
+    # collision if 0, 1 or more tags have the counter equal to m. Slots
+    # before the first singleton (or till the round end) are skipped at once,
+    # but not beyond the next queued event (e.g. power update). The current
+    # transaction finish is moved to the end of the last skipped slot.
+    ctx = kernel.context
+    reader = ctx.reader
+    if not isinstance(cmd_frame.command, std.QueryRep):
+        return False
+    session = cmd_frame.command.session
+    num_slots_left = (round(pow(2, reader.q)) -
+                      reader.slot_index)
+    receivers = ctx.tags.receivers(cmd_frame.command)
+    arbitrating = [(tag, tag.slot_counter) for tag in receivers
+                   if tag.state is Tag.State.ARBITRATE and
+                   1 <= tag.slot_counter <= num_slots_left]
+    num_replies = np.bincount([counter for _, counter in arbitrating],
+                              minlength=num_slots_left + 1)[1:]
+    singletons = np.flatnonzero(num_replies == 1)
+    num_slots = int(singletons[0]) if len(singletons) > 0 else num_slots_left
+
+    # Slots durations are computed as Transaction does:
+    qrep_timeout = reader.state.get_timeout(reader)
+    collision_duration = Transaction.get_exchange_duration(
+        reader, cmd_frame.duration,
+        std.TagFrame(std.create_tag_preamble(reader.tag_encoding, reader.trext),
+                     std.QueryReply(0)).get_duration(
+            std.get_blf(reader.dr, reader.trcal)))
+    slot_end_times = kernel.time + np.cumsum(np.where(
+        num_replies[:num_slots] > 0, collision_duration, qrep_timeout))
+    next_event_time = kernel.next_event_time
+    if next_event_time is not None:
+        num_slots = int(np.searchsorted(slot_end_times, next_event_time))
+    if num_slots == 0 or not reader.skip_round_slots(num_slots - 1):
+        return False
+
+    # Tags replying in the skipped slots draw RN16 in the slots order:
+    replying = sorted(((counter, tag) for tag, counter in arbitrating
+                       if counter <= num_slots), key=lambda item: item[0])
+    rns = {tag: ctx.random.randbits(16) for _, tag in replying}
+    for tag in receivers:
+        tag.skip_query_reps(session, num_slots, rns.get(tag))
+    kernel.logger.debug("skipped %d slots with %d collided replies",
+                        num_slots, len(replying))
+
+    ctx.transaction = Transaction(ctx.medium, reader, cmd_frame, [],
+                                  kernel.time)
+    ctx.transaction.timeout_event_id = kernel.schedule(
+        slot_end_times[num_slots - 1] - kernel.time, finish_transaction,
+        ctx.transaction)
+    return True
 
 
 def switch_reader_antenna(kernel, reader):
+    # Called periodically while the reader is on, see turn_reader_on()
+    ctx = kernel.context
     antenna = reader.select_next_antenna()
-    kernel.logger.debug("switched antenna #{}".format(antenna.index))
-    reader.antenna_switch_event_id = kernel.schedule(
-        reader.antenna_switch_interval, switch_reader_antenna, reader)
+    reader.antenna_switch_time = kernel.time + reader.antenna_switch_interval
+    kernel.logger.debug("switched antenna #%s", antenna.index)
+
+    # Tags powers depend on the antenna, so in 'events' mode they are updated
+    # and the sensitivity crossings are predicted for the new antenna
+    if ctx.power_update_mode == 'events':
+        _advance_positions(kernel.time, ctx.tags)
+        _update_power(kernel.time, reader, ctx.tags, None, ctx.medium,
+                      ctx.statistics)
+        _schedule_power_crossings(kernel, ctx.tags)
 
 
 def update_power_at_response_start(kernel, transaction):
     ctx = kernel.context
-    _update_power(kernel.time, ctx.reader, ctx.tags, transaction, ctx.medium,
+    if ctx.power_update_mode == 'events':
+        # Powers of the other tags are not needed here, their states are
+        # updated at the predicted sensitivity crossings.
+        tags = list(transaction.tags)
+        _advance_positions(kernel.time, tags)
+    else:
+        tags = ctx.tags
+    _update_power(kernel.time, ctx.reader, tags, transaction, ctx.medium,
                   ctx.statistics)
     transaction.response_start_event_id = None
+
+
+_READER_STATE_CODES = {state: code for code, state in enumerate(Reader.State)}
+
+
+def trace_fields(kernel, f, args):
+    """
+    Get `(reader_state, tag_id, reply_type)` codes of the event for
+    `pysim.trace.TraceRecorder`. Reader state code is the index of the state
+    in `Reader.State`, reply type code is `std.ReplyType` value. Tag is taken
+    from the handler arguments: either the tag itself, or the replying tag
+    of the transaction (if there is exactly one reply, otherwise only reply
+    type of the first reply is recorded).
+    """
+    reader_state = _READER_STATE_CODES[kernel.context.reader.state]
+    tag_id = reply_type = NO_VALUE
+    for arg in args:
+        if isinstance(arg, Tag):
+            tag_id = arg.tag_id
+        elif isinstance(arg, Transaction) and arg.replies:
+            tag, frame = arg.replies[0]
+            reply_type = frame.reply.reply_type.value
+            if len(arg.replies) == 1:
+                tag_id = tag.tag_id
+    return reader_state, tag_id, reply_type
@@ -6,6 +6,8 @@ from tabulate import tabulate
 
 from pysim import simulator as sim
 from pysim import epcstd as std
+from pysim import bench
+from pysim.trace import TraceReader
 
 import pysim.models as models
 from pysim.models import KMPH_TO_MPS_MUL
@@ -78,6 +80,16 @@ def cli():
 @click.option(
     "-j", "--jobs", default=multiprocessing.cpu_count(), show_default=True,
     help="Number of parallel jobs to run when multiple arguments are given.")
+@click.option(
+    "--seed", type=int, default=None,
+    help="Random seed. Results are the same for the same seed and "
+         "parameters, and all points of a parallel computation use the same "
+         "random streams, so any point can be rerun alone. If not given, "
+         "random seed is used.")
+@click.option(
+    "--trace", "trace_file", default=None, type=click.Path(dir_okay=False),
+    help="Write binary events trace to this file (single simulation only), "
+         "see `trace` command.")
 @click.option(
     "-v", "--verbose", is_flag=True, default=False, show_default=True,
     help="Print additional data, e.g. detailed model configuration")
@@ -112,6 +124,8 @@ def start_single(verbose: bool = False, **kwargs):
             altitude=kwargs['altitude'],
             power=kwargs['power'],
             num_tags=kwargs['num_tags'],
+            seed=kwargs['seed'],
+            trace_file=kwargs['trace_file'],
             verbose=verbose,
         )
         t_end_ns = time_ns()
@@ -142,6 +156,7 @@ def start_single(verbose: bool = False, **kwargs):
             'altitude': kwargs['altitude'],
             'power': kwargs['power'],
             'num_tags': kwargs['num_tags'],
+            'seed': kwargs['seed'],
             'verbose': False,
         } for _ in enumerate(variadic_values)]
 
@@ -175,6 +190,41 @@ def start_single(verbose: bool = False, **kwargs):
         print(tabulate(results_table, headers=ret_cols, tablefmt='pretty'))
 
 
+# ----------------------------------------------------------------------------
+@cli.command("bench")
+@click.argument("names", nargs=-1,
+                type=click.Choice(sorted(bench.BENCHMARKS.keys())))
+def run_benchmarks(names):
+    """Run micro-benchmarks (all of them, if no names given)."""
+    for name in (names or sorted(bench.BENCHMARKS.keys())):
+        fn, headers = bench.BENCHMARKS[name]
+        summary = " ".join(fn.__doc__.strip().split("\n\n")[0].split())
+        print(f"\n# {name}: {summary}\n")
+        print(tabulate(fn(), headers=headers, tablefmt='pretty'))
+
+
+@cli.command("trace")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--t0", type=float, default=None, help="Window start, sec.")
+@click.option("--t1", type=float, default=None, help="Window end, sec.")
+@click.option("--tag", "tag_id", type=int, default=None, help="Tag id")
+@click.option("--handler", default=None, help="Handler name")
+@click.option(
+    "-n", "--limit", default=50, show_default=True,
+    help="Maximum number of records to print (0 - print all)")
+def inspect_trace(path, t0, t1, tag_id, handler, limit):
+    """Print events from a binary trace written by `start --trace`."""
+    reader = TraceReader(path)
+    records = reader.select(t0=t0, t1=t1, tag_id=tag_id, handler=handler)
+    print(f"{len(records)} of {len(reader)} records selected")
+    shown = records[:limit] if limit > 0 else records
+    rows = [(f"{record['time']:.9f}", name, record['reader_state'],
+             record['tag_id'], record['reply_type'])
+            for record, name in zip(shown, reader.handler_names(shown))]
+    print(tabulate(rows, headers=("time", "handler", "reader_state", "tag_id",
+                                  "reply_type"), tablefmt='pretty'))
+
+
 # ----------------------------------------------------------------------------
 def parse_tag_encoding(s):
     s = s.upper()
@@ -200,13 +250,15 @@ def estimate_rates(
         altitude=None,
         power=None,
         num_tags=DEFAULT_NUM_TAGS,
+        seed=None,
+        trace_file=None,
         verbose=False,
 ):
     print(f"[+] Estimating speed = {speed} kmph, Tari = {tari*1e6:.2f} us, "
           f"M = {encoding}, tid_size = {tid_word_size} words, "
           f"reader_offset = {reader_offset} m, tag_offset = {tag_offset} m, "
           f"altitude = {altitude} m, power = {power} dBm, "
-          f"num_tags = {num_tags}")
+          f"num_tags = {num_tags}, seed = {seed}")
 
     try:
         encoding = parse_tag_encoding(encoding)
@@ -223,6 +275,8 @@ def estimate_rates(
         altitude=altitude,
         power=power,
         num_tags=num_tags,
+        seed=seed,
+        trace_file=trace_file,
         verbose=verbose,
     )
     result['encoding'] = encoding.name
@@ -1,10 +1,12 @@
 from dataclasses import dataclass
-from typing import Callable
+from typing import Callable, Optional
 import numpy as np
 from tabulate import tabulate
 
 import pysim.handlers as handlers
 from pysim.objects import Reader, Model, Antenna, Generator, Medium
+from pysim.population import TagPopulation
+from pysim.trace import TraceRecorder
 import pysim.epcstd as std
 import pysim.simulator as sim
 
@@ -67,6 +69,56 @@ class Settings:
     # Как часто обновлять координаты (модельные часы):
     update_interval: float = 0.01
 
+    # Способ обновления мощностей меток ('polling', 'events'):
+    # - 'polling': координаты и мощности всех меток пересчитываются каждые
+    #   update_interval секунд;
+    # - 'events': при включении ридера и появлении метки заранее
+    #   рассчитываются моменты, когда мощность метки пересечет порог
+    #   чувствительности (с шагом сетки update_interval и уточнением
+    #   делением пополам), и мощность пересчитывается только в эти моменты
+    #   и в начале ответов меток.
+    power_update_mode: str = 'polling'
+
+    # Если True, то пока ни одна метка не запитана, пустые слоты ридера
+    # пропускаются сразу до следующего события (появления метки, изменения
+    # мощности или выключения ридера), а номера раундов, слотов и флаг
+    # Target рассчитываются без моделирования каждого слота. Особенно
+    # полезно вместе с power_update_mode = 'events'.
+    idle_fast_forward: bool = False
+
+    # Если True, то после команды Query исходы слотов раунда (пустой,
+    # одиночный ответ, коллизия) определяются по гистограмме счетчиков
+    # слотов меток, и пустые слоты и коллизии до ближайшего одиночного ответа
+    # пропускаются одним событием.
+    round_at_once: bool = False
+
+    # Способ хранения меток в модели:
+    # - 'objects': каждая метка - отдельный объект Tag;
+    # - 'population': состояния всех меток хранятся в массивах NumPy
+    #   (TagPopulation), и команды Query, QueryRep и Ack обрабатываются
+    #   сразу для всех меток. Результаты совпадают с 'objects'.
+    tag_backend: str = 'objects'
+
+    # Реализация очереди событий ядра (см. sim.EVENT_QUEUES):
+    # 'heap' (двоичная куча) или 'calendar' (календарная очередь).
+    # В модели в очереди около десяти событий, и 'heap' на ней быстрее.
+    event_queue: str = 'heap'
+
+    # Число тактов ядра в секунде. Если задано (например, 10**12 - такт в
+    # пикосекунду), время в ядре хранится целым числом тактов, и ошибки
+    # округления не накапливаются. Если None, время хранится в секундах
+    # числом с плавающей точкой.
+    ticks_per_second: Optional[int] = None
+
+    # Начальное значение (seed) генераторов случайных чисел модели. При
+    # одинаковом seed и одинаковых настройках результаты совпадают побитно.
+    # Если None, используется случайное начальное значение.
+    seed: Optional[int] = None
+
+    # Путь к файлу двоичной трассы событий (см. pysim.trace). Если None,
+    # трасса не записывается.
+    trace_file: Optional[str] = None
+
     # --- Энергетические параметры ---
     reader_power: float = 31.5  # мощность трансмиттера считывателя, дБм
     reader_antenna_gain: float = 6.0  # усиление антенны считывателя, дБ
@@ -94,6 +146,13 @@ class Settings:
     ground_reflection_type: str = 'reflection'
     use_doppler: bool = True  # учитывать ли эффект Доплера
 
+    # Если True, то геометрия канала (длины лучей, усиления антенн,
+    # коэффициент отражения) заранее рассчитывается в таблицу вдоль
+    # траектории генератора, а потери для меток интерполируются по их
+    # возрасту. Шаг таблицы задается в метрах пути метки.
+    use_pathloss_tables: bool = False
+    pathloss_table_step: float = 1e-3
+
     # --- Управление питанием считывателя ---
     reader_switch_power: bool = True  # должен ли ридер периодически отключаться
     reader_power_on_duration: float = 2.0  # сколько считыватель включен, сек.
@@ -205,15 +264,26 @@ def simulate_tags(settings=None, verbose=False, **kwargs):
     - sim_time_limit: float
     - real_time_limit: float
     - log_level: sim.Logger.Level
+    - event_queue: str or event queue object (see sim.EVENT_QUEUES)
+    - trace_file: str, path to write binary events trace to (see pysim.trace)
+    - seed: int, seed of the model random streams (see Model)
     """
     if settings is None:
         settings = Settings()
 
     # 0) Building the model
 
-    model = Model()
+    model = Model(seed=kwargs.get('seed', settings.seed))
     model.max_tags_num = kwargs.get('num_tags', settings.num_tags)
     model.update_interval = settings.update_interval
+    model.power_update_mode = settings.power_update_mode
+    model.idle_fast_forward = settings.idle_fast_forward
+    model.round_at_once = settings.round_at_once
+    if settings.tag_backend == 'population':
+        model.tags = TagPopulation(random=model.random)
+    elif settings.tag_backend != 'objects':
+        raise ValueError("unsupported tag backend = '{}'".format(
+            settings.tag_backend))
     model.statistics.use_power_statistics = settings.collect_power_statistics
 
     # 1) Building the reader
@@ -272,6 +342,8 @@ def simulate_tags(settings=None, verbose=False, **kwargs):
     medium.conductivity = settings.conductivity
     medium.polarization_loss = settings.polarization_loss
     medium.use_doppler = settings.use_doppler
+    medium.use_pathloss_tables = settings.use_pathloss_tables
+    medium.pathloss_table_step = settings.pathloss_table_step
 
     # 4) Generator settings
     generator = Generator()
@@ -301,18 +373,35 @@ def simulate_tags(settings=None, verbose=False, **kwargs):
         *settings.generation_interval[1:])
 
     # 5) Launching simulation
-    kernel = sim.Kernel()
+    event_queue = kwargs.get('event_queue', settings.event_queue)
+    if isinstance(event_queue, str):
+        event_queue = sim.create_event_queue(event_queue)
+    kernel = sim.Kernel(event_queue, settings.ticks_per_second)
 
     kernel.max_simulation_time = kwargs.get('sim_time_limit', None)
     kernel.max_real_time = kwargs.get('real_time_limit', None)
     kernel.context = model
     kernel.logger.level = kwargs.get('log_level', sim.Logger.Level.WARNING)
+    trace_file = kwargs.get('trace_file', settings.trace_file)
+    if trace_file is not None:
+        kernel.tracer = TraceRecorder(trace_file, inspect=handlers.trace_fields)
 
     if verbose:
         print("# MODEL SETTINGS:")
         print_model_settings(model, kernel)
 
-    kernel.run(handlers.start_simulation)
+    kernel.profile = verbose
+    try:
+        kernel.run(handlers.start_simulation)
+    finally:
+        if kernel.tracer is not None:
+            kernel.tracer.close()
+
+    if verbose:
+        print("# EVENT QUEUE:")
+        print(tabulate(kernel.queue_stats.items(), tablefmt='pretty'))
+        print("# HANDLERS:")
+        print_handler_profiles(kernel)
 
     return {
         'rounds_per_tag': model.statistics.average_rounds_per_tag(),
@@ -333,8 +422,13 @@ def print_model_settings(model: Model, kernel: sim.Kernel):
 
     rows = [
         # --- Model ----
+        ("model", "seed", model.seed),
         ("model", "max_tags_num", model.max_tags_num),
         ("model", "update_interval", model.update_interval),
+        ("model", "power_update_mode", model.power_update_mode),
+        ("model", "idle_fast_forward", model.idle_fast_forward),
+        ("model", "round_at_once", model.round_at_once),
+        ("model", "tags", type(model.tags).__name__),
         ("model", "statistics.use_power_statistics",
          model.statistics.use_power_statistics),
         # --- Reader ---
@@ -374,6 +468,8 @@ def print_model_settings(model: Model, kernel: sim.Kernel):
         ("medium", "conductivity", medium.conductivity),
         ("medium", "polarization_loss", medium.polarization_loss),
         ("medium", "use_doppler", medium.use_doppler),
+        ("medium", "use_pathloss_tables", medium.use_pathloss_tables),
+        ("medium", "pathloss_table_step", medium.pathloss_table_step),
         # --- Generator and tag ---
         ("tag", "pos0", generator.pos0),
         ("tag", "velocity", generator.velocity),
@@ -390,5 +486,24 @@ def print_model_settings(model: Model, kernel: sim.Kernel):
         ("kernel", "max_simulation_time", kernel.max_simulation_time),
         ("kernel", "max_real_time", kernel.max_real_time),
         ("kernel", "logger_level", kernel.logger.level),
+        ("kernel", "queue", type(kernel.queue).__name__),
+        ("kernel", "ticks_per_second", kernel.ticks_per_second),
+        ("kernel", "trace_file",
+         kernel.tracer.path if kernel.tracer is not None else None),
     ]
     print(tabulate(rows))
+
+
+def print_handler_profiles(kernel: sim.Kernel):
+    """Вывод на печать статистики вызовов обработчиков событий, собранной
+       ядром в режиме профилирования (kernel.profile = True).
+    """
+    us = lambda sec: f"{sec * 1e6:.2f} us"
+    rows = [(name, p['num_calls'], f"{p['total_time']:.3f} s",
+             us(p['mean_time']), us(p['max_time']),
+             f"{p['mean_spacing']:.6f} s" if p['mean_spacing'] is not None
+             else "-")
+            for name, p in kernel.handler_profiles().items()]
+    print(tabulate(rows, headers=("handler", "calls", "total", "mean", "max",
+                                  "mean spacing (model)"),
+                   tablefmt='pretty'))
@@ -5,34 +5,47 @@ import itertools
 
 import pysim.epcstd as std
 import pysim.channel as chan
+import pysim.simulator as sim
+from pysim.random_buffer import RandomBuffer
 
 
 #############################################################################
 # HELPERS
 #############################################################################
 class Listeners:
+    """
+    Listeners registry. Listeners are called in the order they were added,
+    and any listener can be removed in O(1), even while they are called.
+    """
     def __init__(self):
-        self._items = []
+        self._items = {}    # index -> (fn, kwargs)
         self._id = itertools.count()
 
     def add(self, fn, **kwargs):
         index = next(self._id)
-        self._items.append((index, fn, kwargs))
+        self._items[index] = (fn, kwargs)
         return index
 
     def remove(self, index):
-        new_items = [item for item in self._items if item[0] != index]
-        self._items = new_items
+        self._items.pop(index, None)
 
     def clear(self):
-        self._items = []
+        self._items = {}
+
+    def __len__(self):
+        return len(self._items)
 
     def call(self, *args, **kwargs):
-        for item in self._items:
-            fn = item[1]
-            _kwargs = dict(kwargs)
-            _kwargs.update(item[2])
-            fn(*args, **_kwargs)
+        if not self._items:
+            return
+        # Iterate over a copy, since a listener may remove itself
+        for fn, fn_kwargs in tuple(self._items.values()):
+            if kwargs:
+                _kwargs = dict(kwargs)
+                _kwargs.update(fn_kwargs)
+                fn(*args, **_kwargs)
+            else:
+                fn(*args, **fn_kwargs)
 
 
 def cached_method(key, cache_attr_name='__cache__'):
@@ -47,15 +60,15 @@ def cached_method(key, cache_attr_name='__cache__'):
     return decorator
 
 
-def inc_hex_string(s):
-    pos = len(s) - 1
-    while pos >= 0:
-        x = int(s[pos], 16)
-        if x < 15:
-            return s[:pos] + "{:1X}".format(x + 1) + ("0" * (len(s) - 1 - pos))
-        else:
-            pos -= 1
-    return "0" * len(s)
+def make_tag_memory(prefix, bitlen, serial):
+    """
+    Build the memory bank of `bitlen` bits (EPC or TID) as bytes: the hex
+    string `prefix` followed by the `serial` number in the rest bits.
+    """
+    suffix_bitlen = bitlen - len(prefix) * 4
+    value = (int(prefix, 16) if prefix else 0) << suffix_bitlen
+    value |= serial & ((1 << suffix_bitlen) - 1)
+    return value.to_bytes((bitlen + 7) // 8, 'big')
 
 
 #############################################################################
@@ -68,12 +81,26 @@ class Model:
     medium = None
     statistics = None
     update_interval = 0.001
-    next_tag_id = itertools.count()
+    power_update_mode = 'polling'  # or 'events'
+    idle_fast_forward = False
+    round_at_once = False
     max_tags_num = None
 
-    def __init__(self):
+    def __init__(self, seed=None):
+        # Random streams are spawned from the seed, so that tags protocol
+        # and reception errors draws do not depend on each other. If seed is
+        # None, fresh entropy is used.
+        self.seed = seed
+        tags_seed, channel_seed = np.random.SeedSequence(seed).spawn(2)
+        self.rng = np.random.default_rng(tags_seed)
+        self.channel_rng = np.random.default_rng(channel_seed)
+        # Numbers drawn on every slot are buffered (see RandomBuffer)
+        self.random = RandomBuffer(self.rng)
+        self.channel_random = RandomBuffer(self.channel_rng)
+        self.next_tag_id = itertools.count()
+
         self.reader = Reader()
-        self.tags = []
+        self.tags = TagRegistry()
         self.statistics = Statistics()
         self.generators = []
         self.medium = Medium()
@@ -86,13 +113,19 @@ class Model:
 # ANTENNAS
 #############################################################################
 class Antenna:
-    index = None
-    pos = None          # 3D np.ndarray
-    direction_theta = None    # 3D np.ndarray
-    direction_phi = np.array([1, 0, 0])
-    rp_type = 'dipole'
-    cable_loss = -1.0  # dB
-    gain = 8.0  # dB
+    __slots__ = ('index', 'pos', 'direction_theta', 'direction_phi',
+                 'rp_type', 'cable_loss', 'gain')
+
+    DEFAULT_DIRECTION_PHI = np.array([1, 0, 0])
+
+    def __init__(self):
+        self.index = None
+        self.pos = None             # 3D np.ndarray
+        self.direction_theta = None     # 3D np.ndarray
+        self.direction_phi = Antenna.DEFAULT_DIRECTION_PHI
+        self.rp_type = 'dipole'
+        self.cable_loss = -1.0  # dB
+        self.gain = 8.0  # dB
 
     @property
     def radiation_pattern(self):
@@ -101,6 +134,20 @@ class Antenna:
         else:
             raise ValueError("unsupported rp_type='{}'".format(self.rp_type))
 
+    @property
+    def radiation_pattern_array(self):
+        if self.rp_type == 'dipole':
+            return chan.rp_dipole_array
+        else:
+            raise ValueError("unsupported rp_type='{}'".format(self.rp_type))
+
+    @property
+    def radiation_pattern_scalar(self):
+        if self.rp_type == 'dipole':
+            return chan.rp_dipole_scalar
+        else:
+            raise ValueError("unsupported rp_type='{}'".format(self.rp_type))
+
     @property
     def normalized_direction_theta(self):
         return self.direction_theta / np.linalg.norm(self.direction_theta)
@@ -172,12 +219,12 @@ class _ReaderOFF(_ReaderState):
         # On turning on a new round is started, reader is powered up and
         # the FSM moves to the first state as defined by the first slot
         reader.set_power(reader.max_power)
-        slot = reader.next_slot()
+        first_state = reader.next_slot()
         if reader.target_strategy == "switch":
             reader.target = std.InventoryFlag.A
             reader.num_rounds_before_target_switch = reader.rounds_per_target
 
-        return reader.set_state(slot.first_state)
+        return reader.set_state(first_state)
 
     def handle_turn_off(self, reader):
         return None  # Already off
@@ -206,13 +253,13 @@ class _ReaderQUERY(_ReaderState):
         super().__init__('QUERY')
 
     def get_timeout(self, reader):
-        t_cmd = std.query_duration(reader.tari, reader.rtcal, reader.trcal,
-                                   reader.delim, reader.dr, reader.tag_encoding,
-                                   reader.trext, reader.sel, reader.session,
-                                   reader.target, reader.q)
-        t1 = std.link_t1_max(reader.rtcal, reader.trcal, reader.dr, reader.temp)
-        t3 = std.link_t3()
-        return t_cmd + t1 + t3
+        return self.get_target_timeout(reader, reader.target)
+
+    @staticmethod
+    def get_target_timeout(reader, target):
+        # Query duration depends on the target flag value, so it is needed
+        # to estimate the timeouts of the next rounds with switched target.
+        return reader.timing.query_timeouts[target]
 
     def enter(self, reader):
         if reader.target_strategy == "switch":
@@ -224,9 +271,7 @@ class _ReaderQUERY(_ReaderState):
                 reader.num_rounds_before_target_switch -= 1
 
         reader.last_rn = None
-        cmd = std.Query(reader.dr, reader.tag_encoding, reader.trext,
-                        reader.sel, reader.session, reader.target, reader.q)
-        return std.ReaderFrame(reader.preamble, cmd)
+        return reader.frames.queries[reader.target]
 
     def handle_turn_on(self, reader):
         return None  # Reader is already ON
@@ -236,8 +281,7 @@ class _ReaderQUERY(_ReaderState):
         return reader.set_state(Reader.State.OFF)
 
     def handle_timeout(self, reader):
-        slot = reader.next_slot()
-        return reader.set_state(slot.first_state)
+        return reader.set_state(reader.next_slot())
 
     def handle_query_reply(self, reader, frame):
         reader.last_rn = frame.reply.rn
@@ -260,17 +304,11 @@ class _ReaderQREP(_ReaderState):
     def __init__(self): super().__init__('QREP')
 
     def get_timeout(self, reader):
-        t_cmd = std.query_rep_duration(reader.tari, reader.rtcal, reader.trcal,
-                                       reader.delim, reader.session)
-        t1 = std.link_t1_max(reader.rtcal, reader.trcal, reader.dr,
-                             reader.temp)
-        t3 = std.link_t3()
-        return t_cmd + t1 + t3
+        return reader.timing.qrep_timeout
 
     def enter(self, reader):
         reader.last_rn = None
-        cmd = std.QueryRep(reader.session)
-        return std.ReaderFrame(reader.preamble, cmd)
+        return reader.frames.query_rep
 
     def handle_turn_on(self, reader): return None
 
@@ -278,8 +316,7 @@ class _ReaderQREP(_ReaderState):
         return reader.set_state(Reader.State.OFF)
 
     def handle_timeout(self, reader):
-        slot = reader.next_slot()
-        return reader.set_state(slot.first_state)
+        return reader.set_state(reader.next_slot())
 
     def handle_query_reply(self, reader, frame):
         reader.last_rn = frame.reply.rn
@@ -302,16 +339,10 @@ class _ReaderACK(_ReaderState):
     def __init__(self): super().__init__('ACK')
 
     def get_timeout(self, reader):
-        t_cmd = std.ack_duration(reader.tari, reader.rtcal, reader.trcal,
-                                 reader.delim, reader.last_rn)
-        t1 = std.link_t1_max(reader.rtcal, reader.trcal, reader.dr,
-                             reader.temp)
-        t3 = std.link_t3()
-        return t_cmd + t1 + t3
+        return reader.timing.ack_timeout(reader.last_rn)
 
     def enter(self, reader):
-        cmd = std.Ack(reader.last_rn)
-        return std.ReaderFrame(reader.preamble, cmd)
+        return reader.frames.ack(reader.last_rn)
 
     def handle_turn_on(self, reader): return None
 
@@ -319,8 +350,7 @@ class _ReaderACK(_ReaderState):
         return reader.set_state(Reader.State.OFF)
 
     def handle_timeout(self, reader):
-        slot = reader.next_slot()
-        return reader.set_state(slot.first_state)
+        return reader.set_state(reader.next_slot())
 
     def handle_query_reply(self, reader, frame):
         raise RuntimeError("unexpected RN16 in ACK state")
@@ -329,8 +359,7 @@ class _ReaderACK(_ReaderState):
         if reader.read_tid_bank:
             return reader.set_state(Reader.State.REQRN)
         else:
-            slot = reader.next_slot()
-            return reader.set_state(slot.first_state)
+            return reader.set_state(reader.next_slot())
 
     def handle_reqrn_reply(self, reader, frame):
         raise RuntimeError("unexpected ReqRNReply in ACK state")
@@ -347,16 +376,10 @@ class _ReaderREQRN(_ReaderState):
         super().__init__('REQRN')
 
     def get_timeout(self, reader):
-        t_cmd = std.reqrn_duration(reader.tari, reader.rtcal, reader.trcal,
-                                   reader.delim, reader.last_rn)
-        t1 = std.link_t1_max(reader.rtcal, reader.trcal, reader.dr,
-                             reader.temp)
-        t3 = std.link_t3()
-        return t_cmd + t1 + t3
+        return reader.timing.reqrn_timeout(reader.last_rn)
 
     def enter(self, reader):
-        cmd = std.ReqRN(reader.last_rn)
-        return std.ReaderFrame(reader.preamble, cmd)
+        return reader.frames.reqrn(reader.last_rn)
 
     def handle_turn_on(self, reader): return None
 
@@ -364,8 +387,7 @@ class _ReaderREQRN(_ReaderState):
         return reader.set_state(Reader.State.OFF)
 
     def handle_timeout(self, reader):
-        slot = reader.next_slot()
-        return reader.set_state(slot.first_state)
+        return reader.set_state(reader.next_slot())
 
     def handle_query_reply(self, reader, frame):
         raise RuntimeError("unexpected RN16 in REQRN state")
@@ -389,18 +411,10 @@ class _ReaderREAD(_ReaderState):
         super().__init__('READ')
 
     def get_timeout(self, reader):
-        t_cmd = std.read_duration(reader.tari, reader.rtcal, reader.trcal,
-                                  reader.delim, std.MemoryBank.TID, 0x00,
-                                  reader.read_tid_words_num, reader.last_rn)
-        t1 = std.link_t1_max(reader.rtcal, reader.trcal, reader.dr,
-                             reader.temp)
-        t3 = std.link_t3()
-        return t_cmd + t1 + t3
+        return reader.timing.read_timeout(reader.last_rn)
 
     def enter(self, reader):
-        cmd = std.Read(std.MemoryBank.TID, 0x00, reader.read_tid_words_num,
-                       reader.last_rn)
-        return std.ReaderFrame(reader.preamble, cmd)
+        return reader.frames.read(reader.last_rn)
 
     def handle_turn_on(self, reader): return None
 
@@ -408,8 +422,7 @@ class _ReaderREAD(_ReaderState):
         return reader.set_state(Reader.State.OFF)
 
     def handle_timeout(self, reader):
-        slot = reader.next_slot()
-        return reader.set_state(slot.first_state)
+        return reader.set_state(reader.next_slot())
 
     def handle_query_reply(self, reader, frame):
         raise RuntimeError("unexpected RN16 in READ state")
@@ -422,10 +435,10 @@ class _ReaderREAD(_ReaderState):
 
     def handle_read_reply(self, reader, frame):
         assert isinstance(frame.reply, std.ReadReply)
-        reader.kernel.logger.info("received TID={}".format(
-            "".join("{:02X}".format(b) for b in frame.reply.memory)))
-        slot = reader.next_slot()
-        return reader.set_state(slot.first_state)
+        logger = reader.kernel.logger
+        if logger.is_enabled_for(sim.Logger.Level.INFO):
+            logger.info("received TID=%s", frame.reply.get_memory_string())
+        return reader.set_state(reader.next_slot())
 
 
 # ===========================================================================
@@ -468,71 +481,133 @@ class _PeriodicPowerOn(_PowerControlMode):
 
 
 # ===========================================================================
-# Rounds and slots
+# Reader link timings and frames
 # ===========================================================================
-class _ReaderSlot:
-    def __init__(self, owner, index, first_state):
-        self._owner, self._index, self._first_state = owner, index, first_state
-
-    @property
-    def first_state(self):
-        return self._first_state
-
-    @property
-    def index(self):
-        return self._index
-
-    @property
-    def owner(self):
-        return self._owner
-
-    def on_start(self, reader):
-        reader.kernel.logger.debug(".. SLOT #{} STARTED".format(self.index))
-        reader.slot_start_listeners.call(self.owner.index, self.index)
+class ReaderTimingProfile:
+    """
+    Link timings and state timeouts for a given reader configuration.
+
+    All these values depend only on the reader settings which are fixed for
+    the whole simulation, so they are computed once instead of every command.
+    Timeouts of ACK, REQRN and READ states depend on RN16 as well. Commands
+    are PIE-encoded, so their durations depend only on the numbers of bits
+    and ones; these are precomputed for the fields other than RN16, and the
+    ones of RN16 are counted for each command.
+    """
+    def __init__(self, reader):
+        self.key = ReaderTimingProfile.config_key(reader)
+        self.tari = reader.tari
+        self.rtcal = reader.rtcal
+        self.trcal = reader.trcal
+        self.delim = reader.delim
+        self.read_tid_words_num = reader.read_tid_words_num
+
+        self.t1_min = std.link_t1_min(reader.rtcal, reader.trcal, reader.dr,
+                                      reader.temp)
+        self.t1_max = std.link_t1_max(reader.rtcal, reader.trcal, reader.dr,
+                                      reader.temp)
+        self.t2_max = std.link_t2_max(reader.trcal, reader.dr)
+        self.t3 = std.link_t3()
+        self.t4 = std.link_t4(reader.rtcal)
+
+        # Query duration depends on the target flag value, so timeouts are
+        # computed for both targets (target may be switched between rounds)
+        self.query_timeouts = {
+            target: (std.query_duration(
+                reader.tari, reader.rtcal, reader.trcal, reader.delim,
+                reader.dr, reader.tag_encoding, reader.trext, reader.sel,
+                reader.session, target, reader.q) + self.t1_max + self.t3)
+            for target in std.InventoryFlag}
+        self.qrep_timeout = std.query_rep_duration(
+            reader.tari, reader.rtcal, reader.trcal, reader.delim,
+            reader.session) + self.t1_max + self.t3
+
+        # Commands with RN16 are sent after ReaderSync, see
+        # std.reader_frame_duration()
+        sync = std.ReaderSync(reader.tari, reader.rtcal, reader.delim)
+        self._sync_duration = sync.duration
+        self._data0 = sync.data0
+        self._data1 = sync.data1
+        self._ack_bits = self._count_bits(std.Ack(0))
+        self._reqrn_bits = self._count_bits(std.ReqRN(0))
+        self._read_bits = self._count_bits(std.Read(
+            std.MemoryBank.TID, 0x00, reader.read_tid_words_num, 0))
 
-    def on_finish(self, reader):
-        reader.slot_finish_listeners.call(self.owner.index, self.index)
-
-
-class _ReaderRound:
-    def __init__(self, reader, index):
-        self._index = index
-
-        def slots_gen():
-            yield _ReaderSlot(self, 0, Reader.State.QUERY)
-            for i in range(1, round(pow(2, reader.q))):
-                yield _ReaderSlot(self, i, Reader.State.QREP)
-
-        self._reader = reader
-        self._slots = slots_gen()
-        self._slot = None
-
-    @property
-    def index(self):
-        return self._index
-
-    @property
-    def slot(self):
-        return self._slot
-
-    def next_slot(self):
-        if self._slot is not None:
-            self._slot.on_finish(self._reader)
-        self._slot = next(self._slots)
-        self._slot.on_start(self._reader)
-        return self._slot
-
-    def on_start(self, reader):
-        reader.kernel.logger.debug("ROUND #{} STARTED".format(self.index))
-        reader.round_start_listeners.call(self.index)
+    @staticmethod
+    def config_key(reader):
+        return (reader.tari, reader.rtcal, reader.trcal, reader.delim,
+                reader.temp, reader.dr, reader.tag_encoding, reader.trext,
+                reader.sel, reader.session, reader.q,
+                reader.read_tid_words_num)
 
-    def on_finish(self, reader):
-        reader.round_finish_listeners.call(self.index)
+    @staticmethod
+    def _count_bits(command):
+        # Numbers of bits and ones of the command with zero RN16
+        value, n_bits = command.pack()
+        return n_bits, bin(value).count('1')
+
+    def _rn_command_timeout(self, bits, rn):
+        # Same as ReaderFrame.duration of the command with the given RN16
+        n_bits, n_ones = bits
+        n_ones += bin(rn).count('1')
+        body = (n_bits - n_ones) * self._data0 + n_ones * self._data1
+        return body + self._sync_duration + self.t1_max + self.t3
+
+    def ack_timeout(self, rn):
+        return self._rn_command_timeout(self._ack_bits, rn)
+
+    def reqrn_timeout(self, rn):
+        return self._rn_command_timeout(self._reqrn_bits, rn)
+
+    def read_timeout(self, rn):
+        return self._rn_command_timeout(self._read_bits, rn)
+
+
+class ReaderFramePool:
+    """
+    Frames sent by the reader with a given configuration.
+
+    Frames are immutable, so Query (for each target) and QueryRep frames
+    are built once and sent again and again. Commands with RN16 are built
+    for each exchange, but share the preamble.
+    """
+    def __init__(self, reader):
+        self.key = ReaderTimingProfile.config_key(reader)
+        self.read_tid_words_num = reader.read_tid_words_num
+        self.preamble = std.ReaderPreamble(
+            reader.tari, reader.rtcal, reader.trcal, reader.delim)
+        self.sync = std.ReaderSync(reader.tari, reader.rtcal, reader.delim)
+        self.queries = {
+            target: std.ReaderFrame(self.preamble, std.Query(
+                reader.dr, reader.tag_encoding, reader.trext, reader.sel,
+                reader.session, target, reader.q))
+            for target in std.InventoryFlag}
+        self.query_rep = std.ReaderFrame(
+            self.preamble, std.QueryRep(reader.session))
+
+    def ack(self, rn):
+        return std.ReaderFrame(self.preamble, std.Ack(rn))
+
+    def reqrn(self, rn):
+        return std.ReaderFrame(self.preamble, std.ReqRN(rn))
+
+    def read(self, rn):
+        return std.ReaderFrame(self.preamble, std.Read(
+            std.MemoryBank.TID, 0x00, self.read_tid_words_num, rn))
 
 
 # ===========================================================================
 # Reader class
 # ===========================================================================
+# Methods of the state objects available directly from Reader.State and
+# Reader.PowerControlMode members (they are bound when the enums are built)
+_READER_STATE_METHODS = (
+    'enter', 'handle_turn_on', 'handle_turn_off', 'handle_query_reply',
+    'handle_ack_reply', 'handle_timeout', 'handle_reqrn_reply',
+    'handle_read_reply', 'get_timeout')
+_POWER_CONTROL_METHODS = ('min_powered_on_interval', 'powered_off_interval')
+
+
 class Reader:
 
     class State(enum.Enum):
@@ -545,37 +620,31 @@ class Reader:
 
         def __init__(self, obj):
             self.__obj__ = obj
+            for name in _READER_STATE_METHODS:
+                setattr(self, name, getattr(obj, name))
+            # Reply handlers by the reply type, see Reader.receive()
+            self.reply_handlers = {
+                std.QueryReply: obj.handle_query_reply,
+                std.AckReply: obj.handle_ack_reply,
+                std.ReqRnReply: obj.handle_reqrn_reply,
+                std.ReadReply: obj.handle_read_reply,
+            }
 
         def __str__(self):
             return self.__obj__.__str__()
 
-        def __getattr__(self, item):
-            children = {'enter', 'handle_turn_on', 'handle_turn_off',
-                        'handle_query_reply', 'handle_ack_reply',
-                        'handle_timeout', 'handle_reqrn_reply',
-                        'handle_read_reply', 'get_timeout'}
-            if item in children:
-                return getattr(self.__obj__, item)
-            else:
-                raise AttributeError
-
     class PowerControlMode(enum.Enum):
         ALWAYS_ON = _AlwaysPoweredOn()
         PERIODIC = _PeriodicPowerOn()
 
         def __init__(self, obj):
             self.__obj__ = obj
+            for name in _POWER_CONTROL_METHODS:
+                setattr(self, name, getattr(obj, name))
 
         def __str__(self):
             return self.__obj__.__str__()
 
-        def __getattr__(self, item):
-            children = {'min_powered_on_interval', 'powered_off_interval'}
-            if item in children:
-                return getattr(self.__obj__, item)
-            else:
-                raise AttributeError
-
     # PIE time settings
     tari = 6.25e-6
     rtcal = 6.25e-6 * 3
@@ -612,10 +681,17 @@ class Reader:
     antenna_switch_event_id = None
     antenna_switch_interval = None
 
+    # Time of the next antenna switch (None if antennas are not switched),
+    # set by the handlers while the reader is on
+    antenna_switch_time = None
+
+    # Time when the reader will be turned off (None if it is always on),
+    # set by the handlers when the reader is turned on
+    turn_off_time = None
+
     def __init__(self, kernel=None):
         self.kernel = kernel
         self._state = Reader.State.OFF
-        self._slot_index = 0
 
         # Antennas
         self._antennas = []
@@ -624,9 +700,17 @@ class Reader:
         # Temporary data, e.g. received from the tag
         self.last_rn = None
 
-        # Rounds managers
-        self._round = None
-        self._round_index = itertools.count()
+        # Inventory round and slot (round index is None if no round is
+        # running), and the number of slots in the current round
+        self._round_index = None
+        self._slot_index = 0
+        self._num_round_slots = 0
+        self._next_round_index = 0
+
+        # Link timings and frames, built on first use for the current
+        # configuration
+        self._timing = None
+        self._frames = None
 
         # Power-related fields
         self._power = None
@@ -649,8 +733,8 @@ class Reader:
         return self._state
 
     def set_state(self, new_state):
-        self.kernel.logger.debug("reader state changed: {} --> {}".format(
-            self.state, new_state))
+        self.kernel.logger.debug("reader state changed: %s --> %s",
+                                 self.state, new_state)
         self._state_change_listeners.call(self.state, new_state)
         self._state = new_state
         return new_state.enter(self)
@@ -678,27 +762,54 @@ class Reader:
     def set_power(self, power):
         self._power = power
 
+    @property
+    def timing(self):
+        """
+        Link timings profile (`ReaderTimingProfile`) of the current reader
+        configuration. It is built on first access and rebuilt only if any
+        setting it depends on is changed.
+        """
+        timing = self._timing
+        if timing is None or \
+                timing.key != ReaderTimingProfile.config_key(self):
+            timing = self._timing = ReaderTimingProfile(self)
+        return timing
+
+    @property
+    def frames(self):
+        """
+        Frames pool (`ReaderFramePool`) of the current reader configuration,
+        rebuilt only if any setting it depends on is changed.
+        """
+        frames = self._frames
+        if frames is None or \
+                frames.key != ReaderTimingProfile.config_key(self):
+            frames = self._frames = ReaderFramePool(self)
+        return frames
+
     @property
     def preamble(self):
-        return std.ReaderPreamble(self.tari, self.rtcal, self.trcal, self.delim)
+        return self.frames.preamble
 
     @property
     def sync(self):
-        return std.ReaderSync(self.tari, self.rtcal, self.delim)
+        return self.frames.sync
 
     def receive(self, tag_frame):
         assert isinstance(tag_frame, std.TagFrame)
         reply = tag_frame.reply
-        if isinstance(reply, std.QueryReply):
-            return self._state.handle_query_reply(self, tag_frame)
-        elif isinstance(reply, std.AckReply):
-            return self._state.handle_ack_reply(self, tag_frame)
-        elif isinstance(reply, std.ReqRnReply):
-            return self._state.handle_reqrn_reply(self, tag_frame)
-        elif isinstance(reply, std.ReadReply):
-            return self._state.handle_read_reply(self, tag_frame)
-        else:
-            raise ValueError('unexpected tag reply {}'.format(str(reply)))
+        handlers = self._state.reply_handlers
+        try:
+            handler = handlers[type(reply)]
+        except KeyError:
+            # Reply subclasses are handled as their base reply types
+            for reply_type in type(reply).__mro__[1:]:
+                if reply_type in handlers:
+                    handler = handlers[reply_type]
+                    break
+            else:
+                raise ValueError('unexpected tag reply {}'.format(str(reply)))
+        return handler(self, tag_frame)
 
     def timeout(self):
         return self._state.handle_timeout(self)
@@ -751,29 +862,138 @@ class Reader:
     # Round management
 
     @property
-    def inventory_round(self):
-        return self._round
+    def round_index(self):
+        """Index of the current inventory round, None if no round is run."""
+        return self._round_index
+
+    @property
+    def slot_index(self):
+        """Index of the current slot in the inventory round."""
+        return self._slot_index
+
+    def _start_round(self, round_index):
+        self._round_index = round_index
+        self._next_round_index = round_index + 1
+        self._slot_index = 0
+        self._num_round_slots = round(pow(2, self.q))
+        self.kernel.logger.debug("ROUND #%s STARTED", round_index)
+        self._round_start_listeners.call(round_index)
+
+    def _start_slot(self):
+        self.kernel.logger.debug(".. SLOT #%s STARTED", self._slot_index)
+        self._slot_start_listeners.call(self._round_index, self._slot_index)
+
+    def _finish_slot(self):
+        self._slot_finish_listeners.call(self._round_index, self._slot_index)
 
     def stop_round(self):
-        if self._round:
-            self._round.slot.on_finish(self)
-            self._round.on_finish(self)
-        self._round = None
+        if self._round_index is not None:
+            self._finish_slot()
+            self._round_finish_listeners.call(self._round_index)
+        self._round_index = None
 
     def next_slot(self):
-        if self._round is None:
-            self._round = _ReaderRound(self, next(self._round_index))
-            self._round.on_start(self)
-            slot = self._round.next_slot()
+        """
+        Move to the next slot, starting a new round if there is no current
+        round or all its slots are passed.
+
+        :return: the state of the slot first command (QUERY or QREP)
+        """
+        if self._round_index is None:
+            self._start_round(self._next_round_index)
         else:
-            try:
-                slot = self._round.next_slot()
-            except StopIteration:
-                self._round.on_finish(self)
-                self._round = _ReaderRound(self, next(self._round_index))
-                self._round.on_start(self)
-                slot = self._round.next_slot()
-        return slot
+            self._finish_slot()
+            if self._slot_index + 1 < self._num_round_slots:
+                self._slot_index += 1
+            else:
+                self._round_finish_listeners.call(self._round_index)
+                self._start_round(self._next_round_index)
+        self._start_slot()
+        return Reader.State.QUERY if self._slot_index == 0 else \
+            Reader.State.QREP
+
+    def skip_idle_slots(self, max_duration):
+        """
+        Skip idle slots (QUERY and QREP slots without any replies) which
+        finish earlier than `max_duration` seconds from now. This is the same
+        as calling `timeout()` for each slot, but no commands are built and
+        no listeners are called, so nothing is skipped if any round, slot or
+        state change listeners are registered.
+
+        Reader is left in the state of the last skipped slot, so the next
+        `timeout()` call moves it to the following slot.
+
+        :return: tuple (number of skipped slots, their total duration)
+        """
+        if (self._round_index is None or self._state is Reader.State.OFF or
+                self._has_slot_listeners()):
+            return 0, 0.0
+
+        num_round_slots = round(pow(2, self.q))
+        qrep_timeout = Reader.State.QREP.get_timeout(self)
+        round_index, slot_index = self._round_index, self._slot_index
+        target = self.target
+        num_rounds_before_target_switch = self.num_rounds_before_target_switch
+        num_slots, duration = 0, 0.0
+        while True:
+            if slot_index + 1 < num_round_slots:
+                if duration + qrep_timeout >= max_duration:
+                    break
+                slot_index += 1
+                duration += qrep_timeout
+            else:
+                # The same target switching as in QUERY.enter()
+                next_target = target
+                next_num_rounds = num_rounds_before_target_switch
+                if self.target_strategy == "switch":
+                    if next_num_rounds <= 0:
+                        next_target = next_target.invert()
+                        next_num_rounds = self.rounds_per_target
+                    else:
+                        next_num_rounds -= 1
+                query_timeout = _ReaderQUERY.get_target_timeout(
+                    self, next_target)
+                if duration + query_timeout >= max_duration:
+                    break
+                round_index, slot_index = round_index + 1, 0
+                target = next_target
+                num_rounds_before_target_switch = next_num_rounds
+                duration += query_timeout
+            num_slots += 1
+
+        if num_slots > 0:
+            if round_index != self._round_index:
+                self._round_index = round_index
+                self._next_round_index = round_index + 1
+                self._num_round_slots = num_round_slots
+            self._slot_index = slot_index
+            self._state = (Reader.State.QUERY if slot_index == 0 else
+                           Reader.State.QREP)
+            self.target = target
+            self.num_rounds_before_target_switch = \
+                num_rounds_before_target_switch
+            self.last_rn = None
+        return num_slots, duration
+
+    def skip_round_slots(self, num_slots):
+        """
+        Move `num_slots` slots forward within the current round without
+        building commands and calling listeners (see `skip_idle_slots()`).
+
+        :return: False if the slots can not be skipped (not enough slots
+            left in the round or some listeners are registered)
+        """
+        if (self._round_index is None or self._has_slot_listeners() or
+                self._slot_index + num_slots >= self._num_round_slots):
+            return False
+        self._slot_index += num_slots
+        return True
+
+    def _has_slot_listeners(self):
+        listeners = (self._state_change_listeners, self._round_start_listeners,
+                     self._round_finish_listeners, self._slot_start_listeners,
+                     self._slot_finish_listeners)
+        return any(len(item) > 0 for item in listeners)
 
     @property
     def round_start_listeners(self):
@@ -804,25 +1024,56 @@ class Tag:
         ACKNOWLEDGED = 4
         SECURED = 5
 
-    # Geometric settings
-    velocity = None     # set by the generator
-    direction = None    # should be a 3-dim np.ndarray
-    last_pos_update = None  # sec.
+    __slots__ = (
+        'kernel', 'random', '_tag_id', 'velocity', 'direction', 'last_pos_update',
+        'generator', 'death_time', 'registry', 'power_crossings',
+        'power_event_id', 'epc', 'tid', 'user_mem', 's1_persistence',
+        's2_persistence', 's3_persistence', 'modulation_loss', 'antenna',
+        'sensitivity', '_state', '_slot_counter', '_rn', '_powered_on_time',
+        '_powered_off_time', '_power_update_time', '_power', '_sl',
+        '_active_session', '_preamble', 'sessions', '_encoding', '_blf',
+        '_trext')
+
+    # Names of the attributes used by persistence(session) and
+    # bank_data(bank), None if there is no such attribute
+    _PERSISTENCE_ATTRS = {std.Session.S0: None,
+                          std.Session.S1: 's1_persistence',
+                          std.Session.S2: 's2_persistence',
+                          std.Session.S3: 's3_persistence'}
+    _BANK_ATTRS = {std.MemoryBank.EPC: 'epc',
+                   std.MemoryBank.TID: 'tid',
+                   std.MemoryBank.USER: 'user_mem',
+                   std.MemoryBank.RESERVED: None}
+
+    def __init__(self, tag_id, kernel=None, random=None):
+        self.kernel = kernel
+        self.random = (random if random is not None else
+                       RandomBuffer(np.random.default_rng()))
+        self._tag_id = tag_id
+
+        # Geometric settings
+        self.velocity = None        # set by the generator
+        self.direction = None       # should be a 3-dim np.ndarray
+        self.last_pos_update = None     # sec.
+        self.generator = None   # generator which created the tag (if any)
+        self.death_time = None  # sec., set when the tag is added to the model
 
-    # EPC Std. settings
-    epc = ""            # should be a hex-string
-    tid = None          # should be either None or hex-string
-    user_mem = None     # should be either None or hex-string
-    s1_persistence = 2.0    # sec.
-    s2_persistence = 2.0    # sec.
-    s3_persistence = 2.0    # sec.
+        self.registry = None    # TagRegistry the tag is added to (if any)
 
-    # Power and antenna settings
-    modulation_loss = -18.0     # dB
+        # Predicted sensitivity crossings (used in 'events' power update mode)
+        self.power_crossings = ()
+        self.power_event_id = None
 
-    def __init__(self, tag_id, kernel=None):
-        self.kernel = kernel
-        self._tag_id = tag_id
+        # EPC Std. settings
+        self.epc = b""          # should be bytes
+        self.tid = None         # should be either None or bytes
+        self.user_mem = None    # should be either None or bytes
+        self.s1_persistence = 2.0   # sec.
+        self.s2_persistence = 2.0   # sec.
+        self.s3_persistence = 2.0   # sec.
+
+        # Power and antenna settings
+        self.modulation_loss = -18.0    # dB
 
         # Antennas and geometry
         self.antenna = Antenna()
@@ -845,32 +1096,18 @@ class Tag:
                         std.Session.S3}:
             self.sessions[session] = None
 
-        # Persistence dictionary is used to access sX_persistence via
-        # method persistence(session)
-        self._persistence = {std.Session.S0: lambda tag: None,
-                             std.Session.S1: lambda tag: tag.s1_persistence,
-                             std.Session.S2: lambda tag: tag.s2_persistence,
-                             std.Session.S3: lambda tag: tag.s3_persistence}
-
-        self._banks = {std.MemoryBank.EPC: lambda tag: tag.epc,
-                       std.MemoryBank.TID: lambda tag: tag.tid,
-                       std.MemoryBank.USER: lambda tag: tag.user_mem,
-                       std.MemoryBank.RESERVED: lambda tag: None}
-
         # Parameters received from the reader
         self._encoding = std.TagEncoding.FM0
         self._blf = std.get_blf(std.DivideRatio.DR_8, 12.5e-6*6)
         self._trext = False
 
     def persistence(self, session):
-        fn = self._persistence[session]
-        assert callable(fn)
-        return fn(self)
+        name = self._PERSISTENCE_ATTRS[session]
+        return getattr(self, name) if name is not None else None
 
     def bank_data(self, bank):
-        fn = self._banks[bank]
-        assert callable(fn)
-        return fn(self)
+        name = self._BANK_ATTRS[bank]
+        return getattr(self, name) if name is not None else None
 
     @property
     def pos(self):
@@ -921,6 +1158,10 @@ class Tag:
     def slot_counter(self):
         return self._slot_counter
 
+    @property
+    def active_session(self):
+        return self._active_session
+
     @property
     def rn(self):
         return self._rn
@@ -977,8 +1218,9 @@ class Tag:
             self._powered_off_time = None
             self._power_update_time = time
             self._power = power
-            self.logger.debug("tag {} powered on: {}".format(
-                self._tag_id, self.describe()))
+            if self.logger.is_enabled_for(sim.Logger.Level.DEBUG):
+                self.logger.debug("tag %s powered on: %s", self._tag_id,
+                                  self.describe())
             self._set_state(Tag.State.READY)
 
     def _power_off(self, time):
@@ -989,8 +1231,9 @@ class Tag:
             self._power = None
             self._active_session = None
             self._preamble = None
-            self.logger.debug("tag {} powered off: {}".format(
-                self._tag_id, self.describe()))
+            if self.logger.is_enabled_for(sim.Logger.Level.DEBUG):
+                self.logger.debug("tag %s powered off: %s", self._tag_id,
+                                  self.describe())
             self._set_state(Tag.State.OFF)
 
     def set_power(self, time, power):
@@ -1006,12 +1249,14 @@ class Tag:
                 self._power_update_time = time
 
     def _set_state(self, new_state):
-        if self._state != new_state:
+        if (self._state != new_state and
+                self.kernel.logger.is_enabled_for(sim.Logger.Level.TRACE)):
             self.kernel.logger.trace(
-                "tag {} state changed: {} --> {}, {}".format(
-                    self.tag_id, self.state.name, new_state.name,
-                    self.describe()))
+                "tag %s state changed: %s --> %s, %s", self.tag_id,
+                self.state.name, new_state.name, self.describe())
         self._state = new_state
+        if self.registry is not None:
+            self.registry.update(self)
 
     def process_query(self, query):
         assert isinstance(query, std.ReaderFrame)
@@ -1038,11 +1283,11 @@ class Tag:
         self._trext = command.trext
         self._encoding = command.m
         self._blf = std.get_blf(command.dr, preamble.trcal)
-        self._slot_counter = np.random.randint(0, pow(2, command.q))
+        self._slot_counter = self.random.randbits(command.q)
         self._preamble = std.create_tag_preamble(self.encoding, self.trext)
         if self._slot_counter == 0:
             self._set_state(Tag.State.REPLY)
-            self._rn = np.random.randint(0, 0x10000)
+            self._rn = self.random.randbits(16)
             return std.TagFrame(self._preamble, std.QueryReply(self._rn))
         else:
             self._set_state(Tag.State.ARBITRATE)
@@ -1061,7 +1306,7 @@ class Tag:
         self._slot_counter -= 1
         if self._slot_counter == 0 and self.state is Tag.State.ARBITRATE:
             self._set_state(Tag.State.REPLY)
-            self._rn = np.random.randint(0, 0x10000)
+            self._rn = self.random.randbits(16)
             return std.TagFrame(self._preamble, std.QueryReply(self._rn))
         else:
             if self.state in {Tag.State.ARBITRATE, Tag.State.REPLY}:
@@ -1073,6 +1318,34 @@ class Tag:
 
             return None
 
+    def skip_query_reps(self, session, num_slots, rn=None):
+        """
+        Process `num_slots` QueryRep commands at once, as if they were
+        received one by one by `process_query_rep()`. None of these slots
+        should be a singleton (handled by the reader), so the replies sent
+        in them are lost.
+
+        If the tag replies in one of the slots, RN16 drawn for that reply
+        should be passed in `rn`: random numbers are drawn by the caller in
+        the order of slots, as if the replies were sent slot by slot.
+        """
+        if (num_slots <= 0 or self.state is Tag.State.OFF or
+                session is not self._active_session):
+            return
+        if rn is not None:
+            self._rn = rn
+        if self.state in {Tag.State.ACKNOWLEDGED, Tag.State.SECURED}:
+            flag = self.sessions[self._active_session]
+            self.sessions[self._active_session] = flag.invert()
+            self._set_state(Tag.State.READY)
+        replies_in_last_slot = (self.state is Tag.State.ARBITRATE and
+                                self._slot_counter == num_slots)
+        self._slot_counter -= num_slots
+        if replies_in_last_slot:
+            self._set_state(Tag.State.REPLY)
+        elif self.state is Tag.State.REPLY:
+            self._set_state(Tag.State.ARBITRATE)
+
     def process_ack(self, frame):
         assert isinstance(frame, std.ReaderFrame)
         assert isinstance(frame.command, std.Ack)
@@ -1094,7 +1367,7 @@ class Tag:
             return None
         if reqrn.rn == self.rn:
             self._set_state(Tag.State.SECURED)
-            self._rn = np.random.randint(0, 0x10000)
+            self._rn = self.random.randbits(16)
             return std.TagFrame(self._preamble, std.ReqRnReply(self._rn))
         else:
             return None
@@ -1106,15 +1379,14 @@ class Tag:
         if self.state is not Tag.State.SECURED:
             return None
         if read.rn == self.rn:
-            content = self.bank_data(read.bank)
             # Извлекаем из банка ровно столько данных, сколько запрошено.
-            # В команде указывается число слов (по два байта), а в content
-            # лежит hex-строка, в которой каждый байт кодируется двумя
-            # символами. Поэтому надо извлечь (word_count * 4) 16-ричных
-            # цифр из строки content.
-            if (frame.command.word_count * 4) < len(content):
-                content = content[:frame.command.word_count * 4]
-            # print(f"Content ({len(content) // 4} words): {content}")
+            # В команде указывается адрес и число слов (по два байта), а
+            # банк хранится в bytes, поэтому берем срез байтов
+            # [2 * word_ptr, 2 * (word_ptr + word_count)). Срез memoryview
+            # не копирует данные банка.
+            content = memoryview(self.bank_data(read.bank))
+            start = read.word_ptr * 2
+            content = content[start:start + read.word_count * 2]
             return std.TagFrame(
                 self._preamble, std.ReadReply(content, rn=self.rn))
 
@@ -1147,8 +1419,11 @@ class Tag:
                 "state={self.state.name}, power={self.power}, "
                 "S0={s0}, S1={s1}, "
                 "S2={s2}, S3={s3}, SL={self.sl}, M={self.encoding}, "
-                "TRext={self.trext}, EPC={self.epc}, TID={self.tid} }}".format(
-                    self=self, s0=self.sessions[std.Session.S0],
+                "TRext={self.trext}, EPC={epc}, TID={tid} }}".format(
+                    self=self, epc=std.to_hex(self.epc),
+                    tid=(std.to_hex(self.tid) if self.tid is not None
+                         else None),
+                    s0=self.sessions[std.Session.S0],
                     s1=self.sessions[std.Session.S1],
                     s2=self.sessions[std.Session.S2],
                     s3=self.sessions[std.Session.S3]))
@@ -1167,6 +1442,138 @@ class Tag:
                     return Tag.State.ARBITRATE
 
 
+class TagRegistry:
+    """
+    Container of the tags in the model. Besides the tags themselves (in
+    the order of insertion) it keeps the tags indexed by their states and
+    active sessions, so reader commands are delivered only to the tags which
+    may process them, e.g. Ack only to the tag in REPLY state. Indices are
+    updated by `Tag._set_state()`.
+
+    Tags selected from indices are ordered by tag ID (that is, in the order
+    of creation), so tags receive commands (and draw random numbers) in the
+    same order as if all tags in the model were visited. Sorted selections
+    are cached as tuples until the indices they are taken from change.
+    """
+    POWERED_STATES = (Tag.State.READY, Tag.State.ARBITRATE, Tag.State.REPLY,
+                      Tag.State.ACKNOWLEDGED, Tag.State.SECURED)
+    tag_class = Tag     # class of the tags created by generators
+
+    def __init__(self):
+        self._keys = {}  # tag -> (state, active session) it is indexed with
+        self._by_state = {state: {} for state in Tag.State}
+        self._by_session = {}
+        # Sorted selections: states tuple -> tags, session -> tags
+        self._sorted_by_states = {}
+        self._sorted_by_session = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        return iter(list(self._keys))
+
+    def __contains__(self, tag):
+        return tag in self._keys
+
+    def append(self, tag):
+        if tag in self._keys:
+            raise ValueError("tag {} already added".format(tag.tag_id))
+        tag.registry = self
+        self._keys[tag] = None
+        self.update(tag)
+
+    def remove(self, tag):
+        state, session = self._keys.pop(tag)
+        del self._by_state[state][tag]
+        self._invalidate_state(state)
+        if session is not None:
+            del self._by_session[session][tag]
+            self._sorted_by_session.pop(session, None)
+        tag.registry = None
+
+    def update(self, tag):
+        old_key = self._keys[tag]
+        new_key = (tag.state, tag.active_session)
+        if old_key == new_key:
+            return
+        old_state, old_session = old_key if old_key is not None else \
+            (None, None)
+        new_state, new_session = new_key
+        if old_state is not new_state:
+            if old_state is not None:
+                del self._by_state[old_state][tag]
+                self._invalidate_state(old_state)
+            self._by_state[new_state][tag] = None
+            self._invalidate_state(new_state)
+        if old_session is not new_session:
+            if old_session is not None:
+                del self._by_session[old_session][tag]
+                self._sorted_by_session.pop(old_session, None)
+            if new_session is not None:
+                self._by_session.setdefault(new_session, {})[tag] = None
+                self._sorted_by_session.pop(new_session, None)
+        self._keys[tag] = new_key
+
+    def _invalidate_state(self, state):
+        cache = self._sorted_by_states
+        if cache:
+            for states in [key for key in cache if state in key]:
+                del cache[states]
+
+    def count(self, *states):
+        return sum(len(self._by_state[state]) for state in states)
+
+    def with_states(self, *states):
+        try:
+            return self._sorted_by_states[states]
+        except KeyError:
+            pass
+        tags = tuple(sorted(
+            (tag for state in states for tag in self._by_state[state]),
+            key=lambda tag: tag.tag_id))
+        self._sorted_by_states[states] = tags
+        return tags
+
+    def in_session(self, session):
+        # Powered off tags have no active session, so they are never here
+        try:
+            return self._sorted_by_session[session]
+        except KeyError:
+            pass
+        tags = tuple(sorted(self._by_session.get(session, ()),
+                            key=lambda tag: tag.tag_id))
+        self._sorted_by_session[session] = tags
+        return tags
+
+    def receivers(self, command):
+        """
+        Get tags which may process the reader command. Other tags would
+        ignore it without any changes of their state.
+        """
+        if isinstance(command, std.QueryRep):
+            return self.in_session(command.session)
+        elif isinstance(command, std.Ack):
+            return self.with_states(Tag.State.REPLY)
+        elif isinstance(command, std.ReqRN):
+            return self.with_states(Tag.State.ACKNOWLEDGED,
+                                    Tag.State.SECURED)
+        elif isinstance(command, std.Read):
+            return self.with_states(Tag.State.SECURED)
+        else:
+            return self.with_states(*self.POWERED_STATES)
+
+    def deliver(self, frame):
+        """
+        Deliver the reader frame to the tags and get the list of
+        `(tag, tag_frame)` pairs for the tags which replied.
+        """
+        all_responses = ((tag, tag.receive(frame))
+                         for tag in self.receivers(frame.command))
+        return [(tag, tag_frame) for (tag, tag_frame) in all_responses
+                if tag_frame is not None]
+
+
 #############################################################################
 # Generators
 #############################################################################
@@ -1191,6 +1598,7 @@ class Generator:
 
     def __init__(self):
         self._next_interval = (lambda: 1.0, )
+        self._serials = itertools.count()   # EPC and TID serial numbers
 
     def set_interval(self, fn, *args):
         self._next_interval = (fn, ) + args
@@ -1205,22 +1613,19 @@ class Generator:
     def lifetime(self):
         return self.travel_distance / self.velocity
 
+    @property
+    def normalized_direction(self):
+        return self.direction / np.linalg.norm(self.direction)
+
     def create_tag(self, model):
         # print("GENERATOR: create new tag")
-        def hex_string_bitlen(s):
-            return len(s.strip()) * 4
-
-        epc_suffix_bitlen = self.epc_bitlen - hex_string_bitlen(self.epc_prefix)
-        tid_suffix_bitlen = self.tid_bitlen - hex_string_bitlen(self.tid_prefix)
-        self._epc_suffix = '0' * int(np.ceil(epc_suffix_bitlen / 4))
-        self._tid_suffix = '0' * int(np.ceil(tid_suffix_bitlen / 4))
-
         tag_id = next(model.next_tag_id)
-        tag = Tag(tag_id)
-        tag.epc = self.epc_prefix + self._epc_suffix
-        tag.tid = self.tid_prefix + self._tid_suffix
-        self._epc_suffix = inc_hex_string(self._epc_suffix)
-        self._tid_suffix = inc_hex_string(self._tid_suffix)
+        tag = model.tags.tag_class(tag_id, random=model.random)
+        serial = next(self._serials)
+        tag.epc = make_tag_memory(self.epc_prefix.strip(), self.epc_bitlen,
+                                  serial)
+        tag.tid = make_tag_memory(self.tid_prefix.strip(), self.tid_bitlen,
+                                  serial)
         tag.pos = np.array(self.pos0, copy=True)
         tag.velocity = self.velocity
         tag.direction = np.array(self.direction, copy=True)
@@ -1229,12 +1634,39 @@ class Generator:
         tag.antenna.cable_loss = self.cable_loss
         tag.sensitivity = self.sensitivity
         tag.modulation_loss = self.modulation_loss
+        tag.generator = self
         return tag
 
 
 #############################################################################
 # Medium
 #############################################################################
+class _PathLossTable:
+    """
+    Geometry of the two-ray channel between a reader antenna and the tags
+    moving along a generator trajectory, tabulated by the tag age.
+
+    Forward (reader to tag) and backward (tag to reader) geometries are
+    stored as dicts of arrays, see `chan.two_ray_geometry_array()`. Values
+    between the table nodes are linearly interpolated, values for ages
+    slightly out of the table bounds are linearly extrapolated.
+    """
+    def __init__(self, key, age_step, forward, backward):
+        self.key = key
+        self.age_step = age_step
+        self.forward = forward
+        self.backward = backward
+        self.size = len(forward['d0'])
+
+    def interpolate(self, ages, forward=True):
+        x = np.asarray(ages, dtype=float) / self.age_step
+        i = np.clip(np.floor(x).astype(int), 0, self.size - 2)
+        w = x - i
+        geometry = self.forward if forward else self.backward
+        return {name: values[i] * (1 - w) + values[i + 1] * w
+                for name, values in geometry.items()}
+
+
 class Medium:
     SPEED_OF_LIGHT = 2.99792458 * 1e8
 
@@ -1246,9 +1678,11 @@ class Medium:
     conductivity = 0.03
     polarization_loss = -3.0
     use_doppler = True
+    use_pathloss_tables = False
+    pathloss_table_step = 1e-3  # meters of the tag trajectory
 
     def __init__(self):
-        pass
+        self._pathloss_tables = {}
 
     @property
     def ground_reflection(self):
@@ -1260,6 +1694,26 @@ class Medium:
             raise ValueError("unsupported reflection type = '{}'".format(
                 self.ground_reflection_type))
 
+    @property
+    def ground_reflection_array(self):
+        if self.ground_reflection_type == 'reflection':
+            return chan.reflection_array
+        elif self.ground_reflection_type == 'const':
+            return chan.reflection_constant
+        else:
+            raise ValueError("unsupported reflection type = '{}'".format(
+                self.ground_reflection_type))
+
+    @property
+    def ground_reflection_scalar(self):
+        if self.ground_reflection_type == 'reflection':
+            return chan.reflection_scalar
+        elif self.ground_reflection_type == 'const':
+            return chan.reflection_constant
+        else:
+            raise ValueError("unsupported reflection type = '{}'".format(
+                self.ground_reflection_type))
+
     @property
     def wavelen(self):
         return self.SPEED_OF_LIGHT / self.frequency
@@ -1272,15 +1726,17 @@ class Medium:
         if not self.use_doppler:
             on_interval = 0.0
 
-        pl = chan.two_ray_pathloss(
-            time=on_interval, ground_reflection=self.ground_reflection,
+        # Single TX-RX pair, so the scalar implementation is used: it is
+        # much faster than NumPy on 3-element vectors.
+        pl = chan.two_ray_pathloss_scalar(
+            time=on_interval, ground_reflection=self.ground_reflection_scalar,
             wavelen=self.wavelen, tx_pos=tx_ant.pos,
             tx_dir_theta=tx_ant.normalized_direction_theta,
             tx_dir_phi=tx_ant.direction_phi,
-            tx_velocity=tx_vel, tx_rp=tx_ant.radiation_pattern,
+            tx_velocity=tx_vel, tx_rp=tx_ant.radiation_pattern_scalar,
             rx_pos=rx_ant.pos, rx_dir_theta=rx_ant.normalized_direction_theta,
             rx_dir_phi=rx_ant.direction_phi, rx_velocity=rx_vel,
-            rx_rp=rx_ant.radiation_pattern, log=True,
+            rx_rp=rx_ant.radiation_pattern_scalar, log=True,
             polarization=polarization, conductivity=self.conductivity,
             permittivity=self.permittivity) + self.polarization_loss
 
@@ -1325,6 +1781,260 @@ class Medium:
         return (tag.tx_power + pl + reader.antenna.gain + tag.antenna.gain
                 + reader.antenna.cable_loss + tag.antenna.cable_loss)
 
+    def _get_pathloss_table_key(self, reader_antenna, tag_antenna,
+                                generator):
+        # Everything the path loss geometry depends on. If any of these
+        # settings change, the table is rebuilt.
+        return (tuple(reader_antenna.pos),
+                tuple(reader_antenna.normalized_direction_theta),
+                reader_antenna.rp_type, tag_antenna.rp_type,
+                tuple(generator.pos0), tuple(generator.direction),
+                tuple(generator.tag_antenna_direction), generator.velocity,
+                generator.travel_distance, self.frequency, self.permittivity,
+                self.conductivity, self.ground_reflection_type,
+                self.pathloss_table_step)
+
+    def get_pathloss_table(self, reader_antenna, tag_antenna, generator):
+        """
+        Get path loss geometry table for the tags created by the generator.
+        The table is built on the first call and rebuilt automatically when
+        the reader antenna, generator or medium geometry settings change.
+        """
+        key = self._get_pathloss_table_key(
+            reader_antenna, tag_antenna, generator)
+        table_id = (generator, reader_antenna.index)
+        table = self._pathloss_tables.get(table_id)
+        if table is None or table.key != key:
+            table = self._build_pathloss_table(
+                key, reader_antenna, tag_antenna, generator)
+            self._pathloss_tables[table_id] = table
+        return table
+
+    def _build_pathloss_table(self, key, reader_antenna, tag_antenna,
+                              generator):
+        direction = generator.normalized_direction
+        age_step = self.pathloss_table_step / generator.velocity
+        num_nodes = int(np.ceil(generator.lifetime / age_step)) + 2
+        ages = np.arange(num_nodes) * age_step
+
+        tag_pos = (generator.pos0 +
+                   ages[:, np.newaxis] * generator.velocity * direction)
+        tag_vel = generator.velocity * direction
+        tag_dir = tag_antenna.normalized_direction_theta
+        reader_dir = reader_antenna.normalized_direction_theta
+        kwargs = dict(ground_reflection=self.ground_reflection_array,
+                      wavelen=self.wavelen, conductivity=self.conductivity,
+                      permittivity=self.permittivity)
+
+        forward = chan.two_ray_geometry_array(
+            tx_pos=reader_antenna.pos, tx_dir_theta=reader_dir,
+            tx_velocity=np.zeros(3),
+            tx_rp=reader_antenna.radiation_pattern_array,
+            rx_pos=tag_pos, rx_dir_theta=tag_dir, rx_velocity=tag_vel,
+            rx_rp=tag_antenna.radiation_pattern_array, polarization=0.5,
+            **kwargs)
+        backward = chan.two_ray_geometry_array(
+            tx_pos=tag_pos, tx_dir_theta=tag_dir, tx_velocity=tag_vel,
+            tx_rp=tag_antenna.radiation_pattern_array,
+            rx_pos=reader_antenna.pos, rx_dir_theta=reader_dir,
+            rx_velocity=np.zeros(3),
+            rx_rp=reader_antenna.radiation_pattern_array, polarization=1.0,
+            **kwargs)
+        return _PathLossTable(key, age_step, forward, backward)
+
+    def _get_table_path_loss_array(self, reader, tags, time, tag_pos,
+                                   forward):
+        # Tags from different generators (or created without a generator)
+        # don't share a trajectory, so None is returned for them and the
+        # path loss is computed directly.
+        generator = tags[0].generator
+        if generator is None or any(tag.generator is not generator
+                                    for tag in tags):
+            return None
+        table = self.get_pathloss_table(
+            reader.antenna, tags[0].antenna, generator)
+        if tag_pos is None:
+            tag_pos = np.array([tag.pos for tag in tags], dtype=float)
+
+        # Tag age is restored from its position on the trajectory:
+        direction = generator.normalized_direction
+        ages = (tag_pos - generator.pos0) @ direction / generator.velocity
+
+        on_interval = time - reader.time_last_turned_on
+        if not self.use_doppler:
+            on_interval = 0.0
+        return chan.two_ray_pathloss_from_geometry(
+            time=on_interval, wavelen=self.wavelen, log=True,
+            **table.interpolate(ages, forward)) + self.polarization_loss
+
+    # Vectorized estimations for a whole population of tags. Tag positions
+    # and velocities are given as (N, 3) arrays (if omitted, they are taken
+    # from the tags), and the results are arrays of N values.
+
+    def _get_path_loss_array(self, on_interval, tx_pos, tx_dir_theta,
+                             tx_vel, tx_rp, rx_pos, rx_dir_theta, rx_vel,
+                             rx_rp, polarization):
+        if not self.use_doppler:
+            on_interval = 0.0
+
+        return chan.two_ray_pathloss_array(
+            time=on_interval, ground_reflection=self.ground_reflection_array,
+            wavelen=self.wavelen, tx_pos=tx_pos, tx_dir_theta=tx_dir_theta,
+            tx_velocity=tx_vel, tx_rp=tx_rp, rx_pos=rx_pos,
+            rx_dir_theta=rx_dir_theta, rx_velocity=rx_vel, rx_rp=rx_rp,
+            log=True, polarization=polarization,
+            conductivity=self.conductivity,
+            permittivity=self.permittivity) + self.polarization_loss
+
+    @staticmethod
+    def _get_tags_arrays(tags, tag_pos=None, tag_vel=None):
+        if tag_pos is None:
+            tag_pos = np.array([tag.pos for tag in tags], dtype=float)
+        if tag_vel is None:
+            tag_vel = np.array([tag.velocity * tag.normalized_direction
+                                for tag in tags], dtype=float)
+        tag_dir = np.array([tag.antenna.normalized_direction_theta
+                            for tag in tags], dtype=float)
+        return tag_pos, tag_vel, tag_dir
+
+    @staticmethod
+    def _get_link_gains_array(reader, tags):
+        return np.array([reader.antenna.gain + tag.antenna.gain +
+                         reader.antenna.cable_loss + tag.antenna.cable_loss
+                         for tag in tags], dtype=float)
+
+    def _get_forward_path_loss_array(self, reader, tags, time, tag_pos=None,
+                                     tag_vel=None):
+        if self.use_pathloss_tables:
+            pl = self._get_table_path_loss_array(
+                reader, tags, time, tag_pos, forward=True)
+            if pl is not None:
+                return pl
+        tag_pos, tag_vel, tag_dir = self._get_tags_arrays(
+            tags, tag_pos, tag_vel)
+        return self._get_path_loss_array(
+            time - reader.time_last_turned_on, reader.antenna.pos,
+            reader.antenna.normalized_direction_theta, np.zeros(3),
+            reader.antenna.radiation_pattern_array, tag_pos, tag_dir,
+            tag_vel, tags[0].antenna.radiation_pattern_array, 0.5)
+
+    def _get_backward_path_loss_array(self, reader, tags, time, tag_pos=None,
+                                      tag_vel=None):
+        if self.use_pathloss_tables:
+            pl = self._get_table_path_loss_array(
+                reader, tags, time, tag_pos, forward=False)
+            if pl is not None:
+                return pl
+        tag_pos, tag_vel, tag_dir = self._get_tags_arrays(
+            tags, tag_pos, tag_vel)
+        return self._get_path_loss_array(
+            time - reader.time_last_turned_on, tag_pos, tag_dir, tag_vel,
+            tags[0].antenna.radiation_pattern_array, reader.antenna.pos,
+            reader.antenna.normalized_direction_theta, np.zeros(3),
+            reader.antenna.radiation_pattern_array, 1.0)
+
+    def get_forward_path_loss_array(self, reader, tags, time, tag_pos=None,
+                                    tag_vel=None):
+        if reader.power is None or not tags:
+            return np.full(len(tags), MIN_POWER_DBM, dtype=float)
+        return self._get_forward_path_loss_array(
+            reader, tags, time, tag_pos, tag_vel)
+
+    def get_backward_path_loss_array(self, reader, tags, time, tag_pos=None,
+                                     tag_vel=None):
+        powered = np.array([tag.power is not None for tag in tags], bool)
+        if not powered.any():
+            return np.full(len(tags), MIN_POWER_DBM, dtype=float)
+        pl = self._get_backward_path_loss_array(
+            reader, tags, time, tag_pos, tag_vel)
+        return np.where(powered, pl, MIN_POWER_DBM)
+
+    def estimate_tag_rx_power_array(self, reader, tags, time, tag_pos=None,
+                                    tag_vel=None):
+        """
+        Vectorized `estimate_tag_rx_power()`. Returns None if the reader is
+        turned off, otherwise an array of tags RX powers.
+        """
+        if reader.power is None:
+            return None
+        if not tags:
+            return np.zeros(0)
+        pl = self._get_forward_path_loss_array(
+            reader, tags, time, tag_pos, tag_vel)
+        return reader.tx_power + pl + self._get_link_gains_array(reader, tags)
+
+    def estimate_reader_rx_power_array(self, reader, tags, time,
+                                       tag_pos=None, tag_vel=None):
+        """
+        Vectorized `estimate_reader_rx_power()`. Returns an array of reader
+        RX powers with NaN values for the tags which are not powered.
+        """
+        tag_tx_power = np.array(
+            [tag.tx_power if tag.power is not None else np.nan
+             for tag in tags], dtype=float)
+        if np.isnan(tag_tx_power).all():
+            return tag_tx_power
+        pl = self._get_backward_path_loss_array(
+            reader, tags, time, tag_pos, tag_vel)
+        return tag_tx_power + pl + self._get_link_gains_array(reader, tags)
+
+    def predict_tag_power_crossings(self, reader, tags, time, end_times,
+                                    step, tol=1e-7):
+        """
+        Predict when tags RX powers cross their sensitivities while the
+        reader stays turned on.
+
+        Powers are evaluated on a grid with the given step from `time` up to
+        the tag end time (e.g. tag death or reader turning off; the last grid
+        node of each tag is its end time), and each sign change of
+        `power - sensitivity` is refined by bisection down to `tol` seconds.
+        Like the polling with the same interval, a pair of crossings within
+        one grid step is not detected.
+
+        :return: list of arrays (one per tag) with sorted crossing times,
+            each time is not earlier than the crossing itself
+        """
+        tags = list(tags)
+        if reader.power is None or not tags:
+            return [np.zeros(0) for _ in tags]
+        # Tag positions at any time are restored from the last known ones:
+        pos0 = np.array([tag.pos for tag in tags], dtype=float)
+        pos_time = np.array([tag.last_pos_update for tag in tags], dtype=float)
+        tag_vel = np.array([tag.velocity * tag.normalized_direction
+                            for tag in tags], dtype=float)
+        sensitivity = np.array([tag.sensitivity for tag in tags], dtype=float)
+        end_times = np.asarray(end_times, dtype=float)
+
+        num_steps = int(np.ceil((end_times.max() - time) / step))
+        if num_steps <= 0:
+            return [np.zeros(0) for _ in tags]
+        # Grid nodes after the tag end time are moved to it, so the last
+        # (partial) step ends exactly at the end time, and the nodes after it
+        # don't add sign changes:
+        grid = np.minimum(time + step * np.arange(num_steps + 1)[:, np.newaxis],
+                          end_times)                              # (K, N)
+        tag_pos = pos0 + tag_vel * (grid - pos_time)[..., np.newaxis]
+        above = self.estimate_tag_rx_power_array(
+            reader, tags, grid, tag_pos, tag_vel) > sensitivity
+
+        # Crossings are located between grid nodes k and k + 1 of tag n:
+        k, n = np.nonzero(above[1:] != above[:-1])
+        lo, hi = grid[k, n], grid[k + 1, n]
+        lo_above = above[k, n]
+        pair_tags = [tags[i] for i in n]
+        for _ in range(max(int(np.ceil(np.log2(step / tol))), 0)):
+            mid = (lo + hi) / 2
+            mid_pos = pos0[n] + tag_vel[n] * (mid - pos_time[n])[:, np.newaxis]
+            mid_above = self.estimate_tag_rx_power_array(
+                reader, pair_tags, mid, mid_pos, tag_vel[n]) > sensitivity[n]
+            same = mid_above == lo_above
+            lo = np.where(same, mid, lo)
+            hi = np.where(same, hi, mid)
+
+        order = np.lexsort((hi, n))
+        return np.split(hi[order], np.searchsorted(
+            n[order], np.arange(1, len(tags))))
+
     def estimate_reader_rx_snr(self, reader, tag, tags, time):
         power = self.estimate_reader_rx_power(reader, tag, time)
         if power is None:
@@ -1367,10 +2077,15 @@ class _TagPowerMinMap(object):
 
 
 class Transaction(object):
-    timeout_event_id = None
-    response_start_event_id = None
+    __slots__ = ('_command', '_reader', '_replies', '_start_time',
+                 '_command_duration', '_command_end_time', '_reply_duration',
+                 '_reply_start_time', '_reply_end_time', '_duration',
+                 '_finish_time', '_reader_rx_powers', 'timeout_event_id',
+                 'response_start_event_id')
 
     def __init__(self, medium, reader, command, replies, time):
+        self.timeout_event_id = None
+        self.response_start_event_id = None
         self._command = command
         self._reader = reader
         self._replies = tuple(replies)
@@ -1387,15 +2102,10 @@ class Transaction(object):
         if replies:
             reply_durations = [f.get_duration(tag.blf) for tag, f in replies]
             self._reply_duration = np.max(reply_durations)
-            t1 = std.link_t1_min(
-                reader.rtcal, reader.trcal, reader.dr, reader.temp)
-            t2 = std.link_t2_max(reader.trcal, reader.dr)   # NOTE: may be min?
-            t4 = std.link_t4(reader.rtcal)
-            exchange_duration = (self._command_duration + t1 +
-                                 self._reply_duration + t2)
-            self._reply_start_time = time + t1
+            self._reply_start_time = time + reader.timing.t1_min
             self._reply_end_time = self._reply_start_time + self._reply_duration
-            self._duration = max(exchange_duration, self._command_duration + t4)
+            self._duration = self.get_exchange_duration(
+                reader, self._command_duration, self._reply_duration)
         else:
             self._reply_start_time = None
             self._reply_end_time = None
@@ -1409,6 +2119,14 @@ class Transaction(object):
              for (tag, f) in self.replies]
         self._reader_rx_powers = _TagPowerMinMap(reader_rx_powers)
 
+    @staticmethod
+    def get_exchange_duration(reader, command_duration, reply_duration):
+        timing = reader.timing
+        t2 = timing.t2_max   # NOTE: may be min?
+        exchange_duration = \
+            command_duration + timing.t1_min + reply_duration + t2
+        return max(exchange_duration, command_duration + timing.t4)
+
     @property
     def command(self):
         return self._command
@@ -1461,7 +2179,7 @@ class Transaction(object):
     def reader_rx_power_map(self):
         return self._reader_rx_powers
 
-    def received_tag_frame(self, medium, time):
+    def received_tag_frame(self, medium, time, random):
         # NOTE: if two or more tags reply, their reply is treated as collision
         #       no matter of SNR. Try to implement this.
         if len(self.replies) != 1:
@@ -1470,7 +2188,7 @@ class Transaction(object):
         snr = medium.estimate_reader_rx_snr(self.reader, tag, self.tags, time)
         ber = medium.estimate_reader_rx_ber(self.reader, tag, self.tags, snr)
         receive_probability = pow(1.0 - ber, frame.reply.bitlen)
-        p = np.random.uniform(0.0, 1.0)
+        p = random.uniform()
         return (tag, frame, snr, ber) if p <= receive_probability else \
             (None, None, None, None)
 
@@ -1488,13 +2206,17 @@ MIN_POWER_DBM = -120  # dBm - use this value to replace None where needed
 
 
 class _TagReadRecord:
-    round_index = None
-    antenna_index = None
-    tag_pos = None
-    reader_antenna_pos = None
-    ber = None
-    snr = None
-    read_tid = False
+    __slots__ = ('round_index', 'antenna_index', 'tag_pos',
+                 'reader_antenna_pos', 'ber', 'snr', 'read_tid')
+
+    def __init__(self):
+        self.round_index = None
+        self.antenna_index = None
+        self.tag_pos = None
+        self.reader_antenna_pos = None
+        self.ber = None
+        self.snr = None
+        self.read_tid = False
 
     def __str__(self):
         return ("(round={}, ant={}, tag_pos={}, ant_pos={}, BER={}, SNR={},"
@@ -1505,6 +2227,11 @@ class _TagReadRecord:
 
 
 class _TagPowerRecord:
+    __slots__ = ('time', 'field_lifetime', 'tag_pos', 'reader_antenna_index',
+                 'reader_antenna_pos', '_tag_rx_power', '_tag_tx_power',
+                 '_reader_rx_power', '_reader_tx_power', 'reader_tag_pl',
+                 'tag_reader_pl', 'snr', 'ber')
+
     def __init__(self):
         self.time = None
         self.field_lifetime = None
@@ -1577,6 +2304,9 @@ class _TagPowerRecord:
 
 
 class _TagRecord:
+    __slots__ = ('_tag', 'inventory_history', 'num_rounds_attained',
+                 'power_mapping', '_tag_read_record')
+
     def __init__(self, tag):
         self._tag = tag
         # list of _TagReadRecord's
@@ -0,0 +1,428 @@
+"""
+Struct-of-arrays tags backend.
+
+`TagPopulation` is a drop-in replacement of `TagRegistry` (see
+`Model.tags`) which stores the protocol state of all tags in the model
+(state, slot counter, RN16, session flags, SL, power, position and the link
+parameters received in Query) in NumPy arrays, one row per tag. Query,
+QueryRep and Ack are processed by array operations over all receiving tags
+at once, other commands are delivered to the tags one by one.
+
+Tags themselves are `PopulationTag` objects: while a tag is in the
+population, its protocol fields are read from and written to its row, so the
+rest of the model (handlers, medium, statistics) works with them as with
+ordinary `Tag` objects.
+
+Random numbers are drawn in the same order as `Tag` draws them when the
+tags receive commands one by one, so both backends give exactly the same
+results with the same random seed.
+"""
+import numpy as np
+
+import pysim.epcstd as std
+from pysim.objects import Tag, TagRegistry
+from pysim.random_buffer import RandomBuffer
+
+
+_STATES = tuple(Tag.State)      # indexed by Tag.State.value
+_SESSIONS = tuple(sorted(std.Session, key=lambda session: session.index))
+_FLAGS = (std.InventoryFlag.A, std.InventoryFlag.B)
+_FLAG_CODES = {flag: code for code, flag in enumerate(_FLAGS)}
+
+_NO_ROW = -1    # state and session code of rows without tags
+
+_READY = Tag.State.READY.value
+_ARBITRATE = Tag.State.ARBITRATE.value
+_REPLY = Tag.State.REPLY.value
+_ACKNOWLEDGED = Tag.State.ACKNOWLEDGED.value
+_SECURED = Tag.State.SECURED.value
+
+
+class _RowField:
+    """
+    Descriptor of a `PopulationTag` field. When the tag is not in a
+    population, the field value is stored in the `Tag` slot of the same name,
+    otherwise it is stored in the population arrays.
+    """
+    name = None
+    slot = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.slot = getattr(Tag, name)
+
+    def __get__(self, tag, owner=None):
+        if tag is None:
+            return self
+        if tag.row is None:
+            return self.slot.__get__(tag, owner)
+        return tag.registry.get_field(self.name, tag.row)
+
+    def __set__(self, tag, value):
+        if tag.row is None:
+            self.slot.__set__(tag, value)
+        else:
+            tag.registry.set_field(self.name, tag.row, value)
+
+
+class _RowSessions:
+    """
+    Session flags of a tag stored in a population row. Implements the part
+    of dict interface used by `Tag` for its `sessions` dictionary.
+    """
+    def __init__(self, flags):
+        self._flags = flags     # view of the population flags row
+
+    def keys(self):
+        return _SESSIONS
+
+    def __iter__(self):
+        return iter(_SESSIONS)
+
+    def items(self):
+        return [(session, self[session]) for session in _SESSIONS]
+
+    def __getitem__(self, session):
+        code = self._flags[session.index]
+        return _FLAGS[code] if code >= 0 else None
+
+    def __setitem__(self, session, flag):
+        self._flags[session.index] = (_FLAG_CODES[flag] if flag is not None
+                                      else _NO_ROW)
+
+
+class PopulationTag(Tag):
+    """
+    Tag which keeps its protocol state in a `TagPopulation` row while it is
+    added to the population.
+    """
+    __slots__ = ('row', )
+
+    _state = _RowField()
+    _slot_counter = _RowField()
+    _rn = _RowField()
+    _sl = _RowField()
+    _active_session = _RowField()
+    _power = _RowField()
+    _trext = _RowField()
+    _encoding = _RowField()
+    _blf = _RowField()
+    _preamble = _RowField()
+    sessions = _RowField()
+
+    def __init__(self, tag_id, kernel=None, random=None):
+        self.row = None     # row index in the population (if added)
+        super().__init__(tag_id, kernel, random)
+
+    @property
+    def pos(self):
+        return self.antenna.pos
+
+    @pos.setter
+    def pos(self, value):
+        if self.row is None:
+            self.antenna.pos = np.asarray(value)
+        else:
+            # Antenna position is a view of the population positions row
+            self.antenna.pos[:] = value
+
+
+class TagPopulation:
+    """
+    Container of the tags in the model, storing their protocol state in
+    NumPy arrays. It has the same interface as `TagRegistry`, and the tags
+    selected from it are ordered by tag ID as well.
+
+    Rows of removed tags are not reused until the arrays are full, then the
+    arrays are compacted (or grown, if most rows are occupied).
+    """
+    POWERED_STATES = TagRegistry.POWERED_STATES
+    tag_class = PopulationTag
+
+    # Fields stored in object arrays as is:
+    _OBJECT_FIELDS = ('_trext', '_encoding', '_blf', '_preamble')
+
+    def __init__(self, capacity=64, random=None):
+        # Random buffer should be the one the tags use (Model.random), then
+        # the draws are the same as if the tags processed commands one by one
+        self.random = (random if random is not None else
+                       RandomBuffer(np.random.default_rng()))
+        self._num_rows = 0
+        self._num_tags = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self._tags = np.full(capacity, None, dtype=object)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._state = np.full(capacity, _NO_ROW, dtype=np.int8)
+        self._slot_counter = np.zeros(capacity, dtype=np.int64)
+        self._rn = np.zeros(capacity, dtype=np.int64)
+        self._sl = np.zeros(capacity, dtype=bool)
+        self._active_session = np.full(capacity, _NO_ROW, dtype=np.int8)
+        self._flags = np.full((capacity, len(_SESSIONS)), _NO_ROW,
+                              dtype=np.int8)
+        self._power = np.full(capacity, np.nan, dtype=float)
+        self._pos = np.zeros((capacity, 3), dtype=float)
+        for name in self._OBJECT_FIELDS:
+            setattr(self, name, np.full(capacity, None, dtype=object))
+
+    @property
+    def capacity(self):
+        return len(self._tags)
+
+    def __len__(self):
+        return self._num_tags
+
+    def __iter__(self):
+        return iter(self._tags_at(np.flatnonzero(self._state != _NO_ROW)))
+
+    def __contains__(self, tag):
+        return tag.registry is self
+
+    # --- Tags fields access (used by PopulationTag) ---
+
+    def get_field(self, name, row):
+        if name == '_state':
+            return _STATES[self._state[row]]
+        elif name in ('_slot_counter', '_rn'):
+            return int(getattr(self, name)[row])
+        elif name == '_sl':
+            return bool(self._sl[row])
+        elif name == '_active_session':
+            code = self._active_session[row]
+            return _SESSIONS[code] if code >= 0 else None
+        elif name == '_power':
+            power = self._power[row]
+            return None if np.isnan(power) else float(power)
+        elif name == 'sessions':
+            return _RowSessions(self._flags[row])
+        else:
+            return getattr(self, name)[row]
+
+    def set_field(self, name, row, value):
+        if name == '_state':
+            self._state[row] = value.value
+        elif name == '_active_session':
+            self._active_session[row] = (value.index if value is not None
+                                         else _NO_ROW)
+        elif name == '_power':
+            self._power[row] = value if value is not None else np.nan
+        elif name == 'sessions':
+            sessions = _RowSessions(self._flags[row])
+            for session in _SESSIONS:
+                sessions[session] = value.get(session)
+        else:
+            getattr(self, name)[row] = value
+
+    # --- Adding and removing tags ---
+
+    def append(self, tag):
+        if not isinstance(tag, PopulationTag):
+            raise TypeError("tag {} is not a PopulationTag".format(tag))
+        if tag.registry is not None:
+            raise ValueError("tag {} already added".format(tag.tag_id))
+        if self._num_rows == self.capacity:
+            self._reallocate()
+        row = self._num_rows
+        self._num_rows += 1
+        self._num_tags += 1
+
+        # Moving tag fields from its __dict__ to the row:
+        self._tags[row] = tag
+        self._ids[row] = tag.tag_id
+        self._pos[row] = tag.pos
+        tag.antenna.pos = self._pos[row]
+        fields = {name: getattr(tag, name) for name in self._field_names()}
+        tag.registry, tag.row = self, row
+        for name, value in fields.items():
+            self.set_field(name, row, value)
+
+    def remove(self, tag):
+        if tag.registry is not self:
+            raise KeyError(tag)
+        row = tag.row
+        fields = {name: self.get_field(name, row)
+                  for name in self._field_names()}
+        fields['sessions'] = dict(fields['sessions'].items())
+        tag.registry, tag.row = None, None
+        for name, value in fields.items():
+            setattr(tag, name, value)
+        tag.antenna.pos = np.array(self._pos[row], copy=True)
+
+        self._tags[row] = None
+        self._state[row] = _NO_ROW
+        self._active_session[row] = _NO_ROW
+        self._num_tags -= 1
+
+    def update(self, tag):
+        # States are stored in the arrays, so there are no indices to update
+        pass
+
+    def _field_names(self):
+        return [name for name, value in vars(PopulationTag).items()
+                if isinstance(value, _RowField)]
+
+    def _reallocate(self):
+        rows = np.flatnonzero(self._state[:self._num_rows] != _NO_ROW)
+        capacity = self.capacity
+        if len(rows) > capacity // 2:
+            capacity *= 2
+        columns = {name: getattr(self, name)[rows] for name in (
+            ('_tags', '_ids', '_state', '_slot_counter', '_rn', '_sl',
+             '_active_session', '_flags', '_power', '_pos') +
+            self._OBJECT_FIELDS)}
+        self._allocate(capacity)
+        for name, values in columns.items():
+            getattr(self, name)[:len(rows)] = values
+        self._num_rows = len(rows)
+        for row, tag in enumerate(self._tags[:len(rows)]):
+            tag.row = row
+            tag.antenna.pos = self._pos[row]
+
+    # --- Tags selection ---
+
+    def _tags_at(self, rows):
+        return self._tags[rows].tolist()
+
+    def _sorted(self, rows):
+        return rows[np.argsort(self._ids[rows], kind='stable')]
+
+    def _rows_with_states(self, *states):
+        codes = [state.value for state in states]
+        return self._sorted(np.flatnonzero(
+            np.isin(self._state[:self._num_rows], codes)))
+
+    def _rows_in_session(self, session):
+        # Powered off tags have no active session, so they are never here
+        return self._sorted(np.flatnonzero(
+            self._active_session[:self._num_rows] == session.index))
+
+    def _receivers_rows(self, command):
+        if isinstance(command, std.QueryRep):
+            return self._rows_in_session(command.session)
+        elif isinstance(command, std.Ack):
+            return self._rows_with_states(Tag.State.REPLY)
+        elif isinstance(command, std.ReqRN):
+            return self._rows_with_states(Tag.State.ACKNOWLEDGED,
+                                          Tag.State.SECURED)
+        elif isinstance(command, std.Read):
+            return self._rows_with_states(Tag.State.SECURED)
+        else:
+            return self._rows_with_states(*self.POWERED_STATES)
+
+    def count(self, *states):
+        return int(np.count_nonzero(np.isin(
+            self._state[:self._num_rows], [state.value for state in states])))
+
+    def with_states(self, *states):
+        return self._tags_at(self._rows_with_states(*states))
+
+    def in_session(self, session):
+        return self._tags_at(self._rows_in_session(session))
+
+    def receivers(self, command):
+        """
+        Get tags which may process the reader command. Other tags would
+        ignore it without any changes of their state.
+        """
+        return self._tags_at(self._receivers_rows(command))
+
+    # --- Commands processing ---
+
+    def deliver(self, frame):
+        """
+        Deliver the reader frame to the tags and get the list of
+        `(tag, tag_frame)` pairs for the tags which replied.
+        """
+        command = frame.command
+        rows = self._receivers_rows(command)
+        if isinstance(command, std.Query):
+            rows, replies = self._process_query(frame, rows)
+        elif isinstance(command, std.QueryRep):
+            rows, replies = self._process_query_rep(command, rows)
+        elif isinstance(command, std.Ack):
+            rows, replies = self._process_ack(command, rows)
+        else:
+            all_responses = ((tag, tag.receive(frame))
+                             for tag in self._tags_at(rows))
+            return [(tag, tag_frame) for (tag, tag_frame) in all_responses
+                    if tag_frame is not None]
+        return [(tag, std.TagFrame(preamble, reply)) for tag, preamble, reply
+                in zip(self._tags_at(rows), self._preamble[rows], replies)]
+
+    def _invert_active_flags(self, rows):
+        sessions = self._active_session[rows]
+        self._flags[rows, sessions] = 1 - self._flags[rows, sessions]
+
+    def _process_query(self, frame, rows):
+        # Same as Tag.process_query() applied to the tags one by one.
+        command, preamble = frame.command, frame.preamble
+        states = self._state[rows]
+        self._invert_active_flags(
+            rows[(states == _ACKNOWLEDGED) | (states == _SECURED)])
+
+        sel_match = np.array([command.sel.match(False),
+                              command.sel.match(True)], dtype=bool)
+        matched = ((self._flags[rows, command.session.index] ==
+                    _FLAG_CODES[command.target]) &
+                   sel_match[self._sl[rows].astype(int)])
+        self._state[rows[~matched]] = _READY
+        rows = rows[matched]
+
+        self._active_session[rows] = command.session.index
+        self._trext[rows] = command.trext
+        self._encoding[rows] = command.m
+        self._blf[rows] = std.get_blf(command.dr, preamble.trcal)
+        self._preamble[rows] = std.create_tag_preamble(command.m,
+                                                       command.trext)
+
+        # Each tag draws its slot counter, and the tags with zero counters
+        # draw RN16 right after it. Counters of all the rest tags are peeked
+        # from the random buffer at once, then the counters up to the first
+        # zero one are consumed and RN16 is drawn.
+        counters = np.zeros(len(rows), dtype=np.int64)
+        replying, rns = [], []
+        start = 0
+        while start < len(rows):
+            drawn = self.random.peek_bits(command.q, len(rows) - start)
+            zeros = np.flatnonzero(drawn == 0)
+            if len(zeros) == 0:
+                counters[start:] = drawn
+                self.random.skip(len(drawn))
+                break
+            end = start + zeros[0] + 1
+            counters[start:end] = drawn[:end - start]
+            self.random.skip(end - start)
+            replying.append(end - 1)
+            rns.append(self.random.randbits(16))
+            start = end
+
+        self._slot_counter[rows] = counters
+        self._state[rows] = np.where(counters == 0, _REPLY, _ARBITRATE)
+        self._rn[rows[replying]] = rns
+        return rows[replying], [std.QueryReply(rn) for rn in rns]
+
+    def _process_query_rep(self, command, rows):
+        # Same as Tag.process_query_rep() applied to the tags one by one.
+        self._slot_counter[rows] -= 1
+        states = self._state[rows]
+        arbitrating = (states == _ARBITRATE) | (states == _REPLY)
+        acknowledged = (states == _ACKNOWLEDGED) | (states == _SECURED)
+        replying = (self._slot_counter[rows] == 0) & (states == _ARBITRATE)
+
+        self._state[rows[arbitrating]] = _ARBITRATE
+        self._invert_active_flags(rows[acknowledged])
+        self._state[rows[acknowledged]] = _READY
+        rows = rows[replying]
+        self._state[rows] = _REPLY
+        rns = self.random.randbits_array(16, len(rows))
+        self._rn[rows] = rns
+        return rows, [std.QueryReply(int(rn)) for rn in rns]
+
+    def _process_ack(self, command, rows):
+        # Same as Tag.process_ack() applied to the tags one by one.
+        matched = self._rn[rows] == command.rn
+        self._state[rows[~matched]] = _ARBITRATE
+        rows = rows[matched]
+        self._state[rows] = _ACKNOWLEDGED
+        return rows, [std.AckReply(tag.epc) for tag in self._tags_at(rows)]
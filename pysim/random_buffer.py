@@ -0,0 +1,90 @@
+"""
+Buffered random numbers.
+
+Each call of a `np.random.Generator` method costs about a microsecond of
+overhead no matter how many numbers are drawn, while the protocol draws
+numbers one at a time (a slot counter per tag per Query, RN16 per reply,
+a reception check per singleton slot). `RandomBuffer` draws blocks of
+uniformly distributed 32-bit words and floats from the generator and hands
+them out one by one.
+
+All integer ranges used by the protocol are powers of two (slot counter is
+in [0, 2^Q), RN16 is in [0, 2^16)), so an integer of `k` bits is taken as the
+lower `k` bits of the next word, which is uniformly distributed as well.
+Each integer consumes exactly one word, so the sequence of integers depends
+only on the generator seed and the sequence of calls, not on the block size
+(as long as floats are not drawn from the same buffer).
+"""
+import numpy as np
+
+
+class RandomBuffer:
+    """
+    Random numbers drawn from `rng` (np.random.Generator) in blocks of
+    `block_size` values. Blocks are drawn on demand.
+    """
+    MAX_BITS = 32
+
+    def __init__(self, rng, block_size=4096):
+        self.rng = rng
+        self.block_size = block_size
+        self._words = np.empty(0, dtype=np.uint32)
+        self._word_list = []    # the same words as Python ints
+        self._pos = 0
+        self._uniforms = []
+        self._uniform_pos = 0
+
+    def _draw_words(self, size):
+        # Keep the words not consumed yet, and append a new block after them
+        rest = self._words[self._pos:]
+        block = self.rng.integers(0, 1 << self.MAX_BITS, dtype=np.uint32,
+                                  size=max(self.block_size, size))
+        self._words = np.concatenate((rest, block))
+        self._word_list = self._words.tolist()
+        self._pos = 0
+
+    def randbits(self, k):
+        """
+        Get a random integer in range [0, 2^k), k <= 32.
+        """
+        if self._pos == len(self._word_list):
+            self._draw_words(1)
+        word = self._word_list[self._pos]
+        self._pos += 1
+        return word & ((1 << k) - 1)
+
+    def peek_bits(self, k, size):
+        """
+        Get an array of `size` random integers in range [0, 2^k) which will
+        be returned by the next `size` calls of `randbits(k)`, without
+        consuming them (see `skip()`).
+        """
+        if len(self._word_list) - self._pos < size:
+            self._draw_words(size)
+        return self._words[self._pos:self._pos + size] & np.uint32(
+            (1 << k) - 1)
+
+    def skip(self, size):
+        """
+        Consume `size` values previously returned by `peek_bits()`.
+        """
+        self._pos += size
+
+    def randbits_array(self, k, size):
+        """
+        Same as `[randbits(k) for _ in range(size)]`, but as an array.
+        """
+        values = self.peek_bits(k, size)
+        self.skip(size)
+        return values
+
+    def uniform(self):
+        """
+        Get a random float in range [0.0, 1.0).
+        """
+        if self._uniform_pos == len(self._uniforms):
+            self._uniforms = self.rng.random(self.block_size).tolist()
+            self._uniform_pos = 0
+        value = self._uniforms[self._uniform_pos]
+        self._uniform_pos += 1
+        return value
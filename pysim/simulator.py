@@ -1,3 +1,4 @@
+import bisect
 import itertools
 import heapq
 import enum
@@ -17,47 +18,141 @@ class Singleton(type):
         return cls.instance
 
 
+class EventHandle(list):
+    """
+    Event record `[t, event_id, item]` stored in the `EventQueue` heap. It
+    is returned by `EventQueue.push()` and may be used to cancel the event
+    without searching for it. When the event is cancelled or popped from
+    the queue, its item is set to None.
+    """
+    __slots__ = ()
+
+    @property
+    def time(self):
+        return self[0]
+
+    @property
+    def event_id(self):
+        return self[1]
+
+    @property
+    def active(self):
+        return self[2] is not None
+
+
 class EventQueue:
     """
     Simple event queue
+
+    Cancelled events are not removed from the heap, but their records are
+    marked as dead (tombstones) and skipped when they reach the top. When
+    tombstones exceed `compaction_fraction` of the heap, the heap is rebuilt
+    without them (if `compaction_fraction` is None, it is never rebuilt).
     """
-    def __init__(self):
+    MIN_COMPACTION_SIZE = 64    # smaller heaps are never compacted
+
+    def __init__(self, compaction_fraction=0.5):
+        self.compaction_fraction = compaction_fraction
         self._next_id = itertools.count()
         self._heap = []
-        self._dict = {}
+        self._num_alive = 0
+        self._num_dead = 0
+
+        # Statistics:
+        self.peak_size = 0          # max heap size, including tombstones
+        self.num_popped = 0
+        self.num_cancelled = 0
+        self.num_compactions = 0
 
     def push(self, t, item):
-        event_id = next(self._next_id)
-        record = [t, event_id, item]
+        record = EventHandle((t, next(self._next_id), item))
         heapq.heappush(self._heap, record)
-        self._dict[event_id] = record
-        return event_id
+        self._num_alive += 1
+        if len(self._heap) > self.peak_size:
+            self.peak_size = len(self._heap)
+        return record
+
+    def rearm(self, handle, t, item):
+        """
+        Push the event again reusing the record of the popped event `handle`,
+        so the handle stays valid (used by periodic events).
+        """
+        handle[0] = t
+        handle[1] = next(self._next_id)
+        handle[2] = item
+        heapq.heappush(self._heap, handle)
+        self._num_alive += 1
+        if len(self._heap) > self.peak_size:
+            self.peak_size = len(self._heap)
+        return handle
 
     def pop(self):
         if self.empty:
             raise IndexError("pop from empty queue")
-        t_fire, event_id, item = heapq.heappop(self._heap)
-        while item is None:
-            t_fire, event_id, item = heapq.heappop(self._heap)
-        self._dict.pop(event_id)  # remove the record from the dictionary
+        record = heapq.heappop(self._heap)
+        while record[-1] is None:
+            self._num_dead -= 1
+            record = heapq.heappop(self._heap)
+        self._num_alive -= 1
+        self.num_popped += 1
+        t_fire, event_id, item = record
+        record[-1] = None   # the event can not be cancelled any more
         return t_fire, event_id, item
 
+    def peek_time(self):
+        """
+        Get the time of the next event without removing it from the queue,
+        or None if the queue is empty.
+        """
+        while self._heap and self._heap[0][-1] is None:
+            heapq.heappop(self._heap)  # drop cancelled records
+            self._num_dead -= 1
+        return self._heap[0][0] if self._heap else None
+
     @property
     def empty(self):
-        return len(self._dict) == 0
+        return self._num_alive == 0
+
+    def cancel(self, handle):
+        if handle is not None and handle[-1] is not None:
+            handle[-1] = None  # setting record.item = None
+            self._num_alive -= 1
+            self._num_dead += 1
+            self.num_cancelled += 1
+            if (self.compaction_fraction is not None and
+                    len(self._heap) >= self.MIN_COMPACTION_SIZE and
+                    self._num_dead > self.compaction_fraction *
+                    len(self._heap)):
+                self.compact()
+
+    def compact(self):
+        """
+        Rebuild the heap without cancelled records.
+        """
+        self._heap = [record for record in self._heap
+                      if record[-1] is not None]
+        heapq.heapify(self._heap)
+        self._num_dead = 0
+        self.num_compactions += 1
 
-    def cancel(self, event_id):
-        if event_id is not None and event_id in self._dict:
-            # record is [t, event_id, item]
-            record = self._dict.pop(event_id)
-            record[-1] = None  # setting record.item = None
+    @property
+    def stats(self):
+        return {
+            'peak_size': self.peak_size,
+            'num_popped': self.num_popped,
+            'num_cancelled': self.num_cancelled,
+            'num_compactions': self.num_compactions,
+        }
 
     def __len__(self):
-        return len(self._dict)
+        return self._num_alive
 
     def clear(self):
-        self._dict.clear()
+        for record in self._heap:
+            record[-1] = None
         self._heap.clear()
+        self._num_alive = 0
+        self._num_dead = 0
 
     def as_list(self):
         l = list(self._heap)
@@ -65,11 +160,320 @@ class EventQueue:
         return l
 
     def ids(self):
-        return [event_id for t, event_id, msg in self.as_list() if event_id
-                in self._dict]
+        return [event_id for t, event_id, msg in self.as_list()
+                if msg is not None]
+
+
+class CalendarQueue:
+    """
+    Calendar queue (R. Brown, 1988) with the same interface as `EventQueue`.
+
+    Events are kept in `num_buckets` buckets (sorted lists) of width
+    `bucket_width`: an event at time t is stored in the bucket
+    `int(t / bucket_width) % num_buckets`, so the buckets form a "year" of
+    `num_buckets * bucket_width`, and events from the later years share the
+    buckets with the current year events. Events are popped by scanning the
+    buckets from the current one. Each bucket has a head index: popped
+    records are skipped by moving the head, and the bucket prefix before it
+    is dropped when it grows larger than the rest of the bucket. When the
+    queue is twice as large (or twice as small) as the number of buckets,
+    the calendar is rebuilt with the bucket width estimated from the
+    separations of the earliest events (sampled from the current year
+    buckets). For events scheduled shortly ahead, as in the model, both push
+    and pop take O(1) time on average. However, the model queue holds only
+    about ten events, and `EventQueue` (`heapq` is implemented in C) is
+    about two times faster there.
+
+    Bucket width is given in the queue time units, that is in seconds for
+    the default `Kernel` clock and in ticks if `Kernel` is created with
+    `ticks_per_second` (the initial width is soon replaced by the estimated
+    one anyway).
+
+    Cancelled events are handled the same way as in `EventQueue`.
+    """
+    MIN_BUCKETS = 2
+    MIN_COMPACTION_SIZE = 64
+    NUM_WIDTH_SAMPLES = 25
+
+    def __init__(self, compaction_fraction=0.5, num_buckets=2,
+                 bucket_width=1e-3):
+        self.compaction_fraction = compaction_fraction
+        self._next_id = itertools.count()
+        self._num_alive = 0
+        self._num_dead = 0
+        self._buckets = [[] for _ in range(num_buckets)]
+        self._heads = [0] * num_buckets     # index of each bucket head
+        self._width = bucket_width
+        self._slot = 0  # index of the current bucket since time 0
+
+        # Statistics:
+        self.peak_size = 0
+        self.num_popped = 0
+        self.num_cancelled = 0
+        self.num_compactions = 0
+        self.num_resizes = 0
+
+    @property
+    def num_buckets(self):
+        return len(self._buckets)
+
+    @property
+    def bucket_width(self):
+        return self._width
+
+    def push(self, t, item):
+        return self._insert(EventHandle((t, next(self._next_id), item)))
+
+    def rearm(self, handle, t, item):
+        """
+        Push the event again reusing the record of the popped event `handle`,
+        so the handle stays valid (used by periodic events).
+        """
+        handle[0] = t
+        handle[1] = next(self._next_id)
+        handle[2] = item
+        return self._insert(handle)
+
+    def _insert(self, record):
+        t = record[0]
+        slot = int(t / self._width)
+        index = slot % len(self._buckets)
+        bucket = self._buckets[index]
+        if not bucket or record > bucket[-1]:
+            bucket.append(record)
+        else:
+            bisect.insort(bucket, record, self._heads[index])
+        if slot < self._slot:
+            self._slot = slot
+        self._num_alive += 1
+        size = self._num_alive + self._num_dead
+        if size > self.peak_size:
+            self.peak_size = size
+        if size > 2 * len(self._buckets):
+            self._resize(2 * len(self._buckets))
+        return record
+
+    def _live_records(self):
+        # Records not popped yet (including cancelled ones)
+        for bucket, head in zip(self._buckets, self._heads):
+            yield from itertools.islice(bucket, head, None)
+
+    def _find_head(self):
+        # Find the bucket with the earliest live event, move the current
+        # slot to it and return the bucket index (or None, if the queue is
+        # empty).
+        if self._num_alive == 0:
+            return None
+        buckets, width = self._buckets, self._width
+        num_buckets = len(buckets)
+        slot = self._slot
+        for _ in range(num_buckets):
+            index = slot % num_buckets
+            bucket = buckets[index]
+            head = self._heads[index]
+            if head < len(bucket) and bucket[head][-1] is not None:
+                head = bucket[head]     # fast path: no cancelled records
+            else:
+                head = self._skip_dead(index)
+            if head is not None and int(head[0] / width) <= slot:
+                self._slot = slot
+                return index
+            slot += 1
+
+        # Whole year is empty: searching for the earliest event directly.
+        heads = []
+        for index in range(num_buckets):
+            head = self._skip_dead(index)
+            if head is not None:
+                heads.append((head, index))
+        head, index = min(heads)
+        self._slot = int(head[0] / width)
+        return index
+
+    def _skip_dead(self, index):
+        # Move the bucket head over cancelled records and return the head
+        # record (None if the bucket is empty).
+        bucket = self._buckets[index]
+        head = self._heads[index]
+        while head < len(bucket) and bucket[head][-1] is None:
+            head += 1
+            self._num_dead -= 1
+        self._heads[index] = head
+        return bucket[head] if head < len(bucket) else None
+
+    def pop(self):
+        index = self._find_head()
+        if index is None:
+            raise IndexError("pop from empty queue")
+        # Skip the popped record by moving the bucket head. The prefix of
+        # the popped records is dropped when it is longer than the rest of
+        # the bucket, so it costs O(1) per record on average.
+        bucket = self._buckets[index]
+        head = self._heads[index]
+        record = bucket[head]
+        head += 1
+        if head == len(bucket):
+            bucket.clear()
+            head = 0
+        elif head > len(bucket) - head:
+            del bucket[:head]
+            head = 0
+        self._heads[index] = head
+        self._num_alive -= 1
+        self.num_popped += 1
+        t_fire, event_id, item = record
+        record[-1] = None   # the event can not be cancelled any more
+        size = self._num_alive + self._num_dead
+        if (len(self._buckets) > self.MIN_BUCKETS and
+                size < len(self._buckets) // 2):
+            self._resize(len(self._buckets) // 2)
+        return t_fire, event_id, item
+
+    def peek_time(self):
+        """
+        Get the time of the next event without removing it from the queue,
+        or None if the queue is empty.
+        """
+        index = self._find_head()
+        if index is None:
+            return None
+        return self._buckets[index][self._heads[index]][0]
+
+    @property
+    def empty(self):
+        return self._num_alive == 0
+
+    def cancel(self, handle):
+        if handle is not None and handle[-1] is not None:
+            handle[-1] = None
+            self._num_alive -= 1
+            self._num_dead += 1
+            self.num_cancelled += 1
+            size = self._num_alive + self._num_dead
+            if (self.compaction_fraction is not None and
+                    size >= self.MIN_COMPACTION_SIZE and
+                    self._num_dead > self.compaction_fraction * size):
+                self.compact()
+
+    def compact(self):
+        """
+        Rebuild the calendar without cancelled records.
+        """
+        self._rebuild(len(self._buckets), self._width)
+        self.num_compactions += 1
+
+    def _resize(self, num_buckets):
+        self._rebuild(num_buckets, self._estimate_width())
+        self.num_resizes += 1
+
+    def _estimate_width(self):
+        # Bucket width is three average separations of the earliest events,
+        # ignoring separations larger than twice the average.
+        times = self._sample_times()
+        separations = [t1 - t0 for t0, t1 in zip(
+            times[:self.NUM_WIDTH_SAMPLES], times[1:self.NUM_WIDTH_SAMPLES])]
+        if not separations:
+            return self._width
+        average = sum(separations) / len(separations)
+        separations = [sep for sep in separations if sep <= 2 * average]
+        width = 3 * sum(separations) / len(separations)
+        return width if width > 0 else self._width
+
+    def _sample_times(self):
+        # Times of up to NUM_WIDTH_SAMPLES earliest events. They are taken
+        # from the bucket heads of the current year (buckets are sorted, so
+        # the times come in order), and all events are searched only if the
+        # current year has less than two events.
+        times = []
+        buckets, width = self._buckets, self._width
+        num_buckets = len(buckets)
+        slot = self._slot
+        for _ in range(num_buckets):
+            index = slot % num_buckets
+            for record in itertools.islice(
+                    buckets[index], self._heads[index], None):
+                if record[-1] is None:
+                    continue
+                if int(record[0] / width) > slot:
+                    break   # later years events
+                times.append(record[0])
+                if len(times) == self.NUM_WIDTH_SAMPLES:
+                    return times
+            slot += 1
+        if len(times) < 2:
+            times = heapq.nsmallest(
+                self.NUM_WIDTH_SAMPLES, (record[0] for record in
+                                         self._live_records()
+                                         if record[-1] is not None))
+        return times
+
+    def _rebuild(self, num_buckets, width):
+        records = sorted(record for record in self._live_records()
+                         if record[-1] is not None)
+        self._buckets = [[] for _ in range(num_buckets)]
+        self._heads = [0] * num_buckets
+        self._width = width
+        for record in records:
+            self._buckets[int(record[0] / width) % num_buckets].append(record)
+        if records:
+            self._slot = int(records[0][0] / width)
+        self._num_dead = 0
+
+    @property
+    def stats(self):
+        return {
+            'peak_size': self.peak_size,
+            'num_popped': self.num_popped,
+            'num_cancelled': self.num_cancelled,
+            'num_compactions': self.num_compactions,
+            'num_resizes': self.num_resizes,
+            'num_buckets': self.num_buckets,
+            'bucket_width': self.bucket_width,
+        }
+
+    def __len__(self):
+        return self._num_alive
+
+    def clear(self):
+        for record in self._live_records():
+            record[-1] = None
+        for bucket in self._buckets:
+            bucket.clear()
+        self._heads = [0] * len(self._buckets)
+        self._num_alive = 0
+        self._num_dead = 0
+
+    def as_list(self):
+        return sorted(self._live_records())
+
+    def ids(self):
+        return [event_id for t, event_id, msg in self.as_list()
+                if msg is not None]
+
+
+# Event queue implementations available by name (see create_event_queue()):
+EVENT_QUEUES = {
+    'heap': EventQueue,
+    'calendar': CalendarQueue,
+}
+
+
+def create_event_queue(name, **kwargs):
+    if name not in EVENT_QUEUES:
+        raise ValueError("unsupported event queue = '{}'".format(name))
+    return EVENT_QUEUES[name](**kwargs)
 
 
 class Logger:
+    """
+    Simple logger writing messages to stdout with the model time.
+
+    Messages are formatted %-style only if their level is enabled, e.g.
+    `logger.debug("tag %s powered on", tag_id)`, so arguments are not
+    converted to strings when the message is discarded. If computing
+    arguments is itself expensive, check `logger.is_enabled_for(level)`
+    first.
+    """
     class Level(enum.Enum):
         TRACE = 0
         DEBUG = 1
@@ -79,32 +483,114 @@ class Logger:
 
     def __init__(self, kernel, level=None):
         self._kernel = kernel
+        self._level = None
+        self._min_value = None
         self.level = level if level is not None else Logger.Level.DEBUG
 
     @property
     def kernel(self):
         return self._kernel
 
-    def write(self, level, *args):
-        if level.value >= self.level.value:
+    @property
+    def level(self):
+        return self._level
+
+    @level.setter
+    def level(self, level):
+        self._level = level
+        self._min_value = level.value
+
+    def is_enabled_for(self, level):
+        return level.value >= self._min_value
+
+    def write(self, level, msg, *args):
+        if level.value >= self._min_value:
             print("{:016.9f} [{:7s}] {}".format(
                 self.kernel.time, level.name,
-                " ".join(str(arg) for arg in args)))
+                (msg % args) if args else msg))
+
+    def trace(self, msg, *args):
+        if self._min_value <= 0:
+            self.write(Logger.Level.TRACE, msg, *args)
+
+    def debug(self, msg, *args):
+        if self._min_value <= 1:
+            self.write(Logger.Level.DEBUG, msg, *args)
+
+    def info(self, msg, *args):
+        if self._min_value <= 2:
+            self.write(Logger.Level.INFO, msg, *args)
+
+    def warning(self, msg, *args):
+        if self._min_value <= 3:
+            self.write(Logger.Level.WARNING, msg, *args)
+
+    def error(self, msg, *args):
+        self.write(Logger.Level.ERROR, msg, *args)
+
+
+class HandlerProfile:
+    """
+    Statistics of the handler calls collected by `Kernel` in profiling
+    mode: number of calls, cumulative and max wall time of the handler
+    execution (in seconds), and the model time spacing between successive
+    calls.
+    """
+    __slots__ = ('name', 'num_calls', 'total_time', 'max_time',
+                 'last_call_time', 'total_spacing', 'min_spacing',
+                 'max_spacing')
+
+    def __init__(self, name):
+        self.name = name
+        self.num_calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.last_call_time = None
+        self.total_spacing = 0.0
+        self.min_spacing = None
+        self.max_spacing = None
+
+    def add_call(self, sim_time, elapsed):
+        self.num_calls += 1
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+        if self.last_call_time is not None:
+            spacing = sim_time - self.last_call_time
+            self.total_spacing += spacing
+            if self.min_spacing is None or spacing < self.min_spacing:
+                self.min_spacing = spacing
+            if self.max_spacing is None or spacing > self.max_spacing:
+                self.max_spacing = spacing
+        self.last_call_time = sim_time
 
-    def trace(self, *args):
-        self.write(Logger.Level.TRACE, *args)
+    @property
+    def mean_time(self):
+        return self.total_time / self.num_calls
+
+    @property
+    def mean_spacing(self):
+        return (self.total_spacing / (self.num_calls - 1)
+                if self.num_calls > 1 else None)
 
-    def debug(self, *args):
-        self.write(Logger.Level.DEBUG, *args)
+    def as_dict(self):
+        return {
+            'num_calls': self.num_calls,
+            'total_time': self.total_time,
+            'mean_time': self.mean_time,
+            'max_time': self.max_time,
+            'mean_spacing': self.mean_spacing,
+            'min_spacing': self.min_spacing,
+            'max_spacing': self.max_spacing,
+        }
 
-    def info(self, *args):
-        self.write(Logger.Level.INFO, *args)
 
-    def warning(self, *args):
-        self.write(Logger.Level.WARNING, *args)
+class _PeriodicTimer:
+    __slots__ = ('interval', 'handle')
 
-    def error(self, *args):
-        self.write(Logger.Level.ERROR, *args)
+    def __init__(self, interval):
+        self.interval = interval    # in the queue time units
+        self.handle = None
 
 
 class Kernel:
@@ -115,6 +601,18 @@ class Kernel:
 
         `kernel = Kernel()`
 
+    By default events are stored in `EventQueue` (binary heap), another
+    queue implementation may be passed to the constructor, e.g.
+    `Kernel(CalendarQueue())`.
+
+    By default simulation time is a float number of seconds. If
+    `ticks_per_second` is given (e.g. `Kernel(ticks_per_second=10**12)` for
+    picoseconds), the kernel keeps time as an integer number of ticks: delays
+    passed to `schedule()` are rounded to ticks and the queue is ordered by
+    integer times, so rounding errors do not accumulate and events which are
+    simultaneous in theory have exactly the same time. `kernel.time` and
+    `kernel.next_event_time` are still float seconds.
+
     2) set the simulation context (an object used by the model parts to store
     and synchronize data), say `ModelContext` or anything user-provided:
 
@@ -126,6 +624,8 @@ class Kernel:
         `kernel.max_simulation_time = 100.0`
         `kernel.max_real_time = 10.0`
 
+    (real time is checked every `kernel.real_time_check_interval` events).
+
     4) start the execution:
 
         `kernel.run(user_provided_function, x, y, arg='value')`
@@ -136,29 +636,48 @@ class Kernel:
 
     To stop the simulation any handler can call `kernel.stop()`.
 
+    If `kernel.profile` is set to True before `run()`, the kernel measures
+    each handler execution time, and the statistics are available after the
+    run from `kernel.handler_profiles()`.
+
+    If `kernel.tracer` is set (e.g. to `pysim.trace.TraceRecorder`), its
+    `record(kernel, f, args)` method is called before each handler
+    `f(kernel, *args)` is executed.
+
     Methods `schedule()` and `call()` are used to transfer control to another
     handler. The control will be transferred when current handler execution
      finishes and the target handler will be in the head of the event queue.
+
+    Method `schedule_periodic()` is used for handlers called with a fixed
+    interval: the event is pushed back to the queue right before each call,
+    reusing the same record, so the handle returned by `schedule_periodic()`
+    cancels all the further calls.
     """
     class State(enum.Enum):
         READY = 0
         STOPPED = 1
         RUNNING = 2
 
-    def __init__(self):
+    def __init__(self, queue=None, ticks_per_second=None):
         self.context = None
         self.max_simulation_time = None
         self.max_real_time = None
+        self.real_time_check_interval = 1000  # events
+        self.profile = False
+        self.tracer = None
 
         self._state = self.State.READY
-        self._queue = EventQueue()
-        self._sim_time = 0.0
+        self._queue = queue if queue is not None else EventQueue()
+        self._ticks_per_second = ticks_per_second
+        # Time of the current event as stored in the queue: seconds or ticks
+        self._sim_time = 0.0 if ticks_per_second is None else 0
         self._user_stop = False
 
         self._t_start = None
         self._t_stop = None
         self._num_events_served = 0
         self._logger = Logger(self)
+        self._profiles = {}     # handler -> HandlerProfile
 
     @property
     def state(self):
@@ -166,7 +685,19 @@ class Kernel:
 
     @property
     def time(self):
-        return self._sim_time
+        if self._ticks_per_second is None:
+            return self._sim_time
+        return self._sim_time / self._ticks_per_second
+
+    @property
+    def ticks_per_second(self):
+        return self._ticks_per_second
+
+    def _to_queue_time(self, t):
+        # Convert time in seconds to the queue time (seconds or ticks)
+        if t is None or self._ticks_per_second is None:
+            return t
+        return int(round(t * self._ticks_per_second))
 
     @property
     def logger(self):
@@ -178,26 +709,116 @@ class Kernel:
         self._state = self.State.RUNNING
         self._num_events_served = 0
         self._t_start = time.time()
-        self._queue.push(0.0, (f, args, kwargs))
-
-        while not self._queue.empty and not self._test_stop_conditions():
-            t, event_id, item = self._queue.pop()
-            self._sim_time = t
-            f, args, kwargs = item
-            f(self, *args, **kwargs)
-            self._num_events_served += 1
-
+        self._queue.push(self._sim_time,
+                         (f, args, kwargs) if kwargs else (f, args))
+
+        # Attributes are looked up once before the loop. Real time limit is
+        # checked only every `real_time_check_interval` events, since
+        # time.time() call is much longer than the check itself.
+        queue = self._queue
+        pop = queue.pop
+        rearm = queue.rearm
+        max_simulation_time = self._to_queue_time(self.max_simulation_time)
+        max_real_time = self.max_real_time
+        check_interval = self.real_time_check_interval
+        t_start = self._t_start
+        profile = self.profile
+        tracer = self.tracer
+        num_events = 0
+
+        while not queue.empty:
+            if self._user_stop or (max_simulation_time is not None and
+                                   self._sim_time > max_simulation_time):
+                break
+            if (max_real_time is not None and
+                    num_events % check_interval == 0 and
+                    time.time() - t_start > max_real_time):
+                break
+            self._sim_time, _, item = pop()
+            if tracer is not None:
+                tracer.record(self, item[0], item[1])
+            if profile:
+                self._call_profiled(item)
+            elif len(item) == 2:
+                item[0](self, *item[1])
+            else:
+                if len(item) == 4:
+                    # Periodic event: pushing it back before the call, see
+                    # schedule_periodic()
+                    timer = item[3]
+                    rearm(timer.handle, self._sim_time + timer.interval, item)
+                item[0](self, *item[1], **item[2])
+            num_events += 1
+
+        self._num_events_served = num_events
         self._state = self.State.STOPPED
         self._t_stop = time.time()
 
+    def _call_profiled(self, item):
+        f = item[0]
+        t_start = time.perf_counter()
+        if len(item) == 2:
+            f(self, *item[1])
+        else:
+            if len(item) == 4:
+                self._rearm(item)
+            f(self, *item[1], **item[2])
+        elapsed = time.perf_counter() - t_start
+        profile = self._profiles.get(f)
+        if profile is None:
+            profile = HandlerProfile(getattr(f, '__qualname__', repr(f)))
+            self._profiles[f] = profile
+        profile.add_call(self.time, elapsed)
+
+    def handler_profiles(self):
+        """
+        Get handlers statistics collected in profiling mode as a dictionary
+        `{handler name: HandlerProfile.as_dict()}`, sorted by cumulative time
+        in descending order. It can be converted to a pandas DataFrame with
+        `DataFrame.from_dict(profiles, orient='index')`.
+        """
+        profiles = sorted(self._profiles.values(),
+                          key=lambda profile: profile.total_time, reverse=True)
+        return {profile.name: profile.as_dict() for profile in profiles}
+
+    # Events are stored as (f, args) records, or (f, args, kwargs) if any
+    # keyword arguments are given. Periodic events are stored as
+    # (f, args, kwargs, timer), see schedule_periodic().
+
     def schedule(self, dt, f, *args, **kwargs):
         if dt is not None:
-            return self._queue.push(self._sim_time + dt, (f, args, kwargs))
+            if self._ticks_per_second is not None:
+                # round() keeps NumPy floats, so converting explicitly
+                dt = int(round(dt * self._ticks_per_second))
+                assert isinstance(self._sim_time + dt, int)
+            return self._queue.push(
+                self._sim_time + dt, (f, args, kwargs) if kwargs else (f, args))
         else:
             return None
 
+    def schedule_periodic(self, interval, f, *args, **kwargs):
+        """
+        Call `f(kernel, *args, **kwargs)` every `interval` seconds, starting
+        `interval` seconds from now. Returns the event handle, which may be
+        passed to `cancel()` to stop the calls.
+        """
+        if self._ticks_per_second is not None:
+            interval = int(round(interval * self._ticks_per_second))
+        timer = _PeriodicTimer(interval)
+        timer.handle = self._queue.push(
+            self._sim_time + interval, (f, args, kwargs, timer))
+        return timer.handle
+
+    def _rearm(self, item):
+        # Push the periodic event back before it is served, so its position
+        # among the events scheduled at the same time is the same as if the
+        # handler scheduled itself first.
+        timer = item[3]
+        self._queue.rearm(timer.handle, self._sim_time + timer.interval, item)
+
     def call(self, f, *args, **kwargs):
-        return self._queue.push(self._sim_time, (f, args, kwargs))
+        return self._queue.push(
+            self._sim_time, (f, args, kwargs) if kwargs else (f, args))
 
     def cancel(self, event_id):
         self._queue.cancel(event_id)
@@ -222,13 +843,25 @@ class Kernel:
     def queue_size(self):
         return len(self._queue)
 
+    @property
+    def queue(self):
+        return self._queue
+
+    @property
+    def queue_stats(self):
+        return self._queue.stats
+
+    @property
+    def next_event_time(self):
+        t = self._queue.peek_time()
+        if t is None or self._ticks_per_second is None:
+            return t
+        return t / self._ticks_per_second
+
     @property
     def num_events_served(self):
-        return self.num_events_served
-
-    def _test_stop_conditions(self):
-        return ((self.max_simulation_time is not None and
-                 self.time > self.max_simulation_time) or
-                (self.max_real_time is not None and
-                 self.real_time_elapsed > self.max_real_time) or
-                self._user_stop)
+        """
+        Number of events served by the last `run()` call (updated when the
+        run finishes).
+        """
+        return self._num_events_served
@@ -0,0 +1,188 @@
+"""
+Binary event traces.
+
+`TraceRecorder` is plugged into the kernel (`kernel.tracer = recorder`) and
+stores one fixed-size record per fired event: simulation time, handler id,
+reader state, tag id and reply type (see `TRACE_DTYPE`). Records are
+collected in a preallocated NumPy structured array and flushed in chunks to
+a raw binary file through a memory map, so recording costs about one array
+assignment per event instead of formatting and printing a text line.
+
+Handler names are stored in a text file next to the trace (`<path>.handlers`,
+one name per line, line number is the handler id). New names are appended on
+each flush, so a trace of an interrupted run can still be read.
+
+`TraceReader` maps the trace file into memory and selects records by time
+window, tag or handler, reading only the pages it touches. Since records are
+written in the order events are fired, time column is sorted and time window
+is found by binary search.
+"""
+import numpy as np
+
+
+TRACE_DTYPE = np.dtype([
+    ('time', '<f8'),            # simulation time, sec.
+    ('handler', '<u2'),         # handler id, see TraceReader.handlers
+    ('reader_state', 'i1'),     # reader state code or -1
+    ('reply_type', 'i1'),       # reply type code or -1
+    ('tag_id', '<i4'),          # tag id or -1
+])
+
+NO_VALUE = -1
+
+
+def _no_fields(kernel, f, args):
+    return NO_VALUE, NO_VALUE, NO_VALUE
+
+
+class TraceRecorder:
+    """
+    Event trace writer.
+
+    Fields other than time and handler are model-specific, so they are
+    obtained from `inspect(kernel, f, args)` function, which is called before
+    the handler `f(kernel, *args)` is executed and returns a tuple
+    `(reader_state, tag_id, reply_type)` of integer codes (`NO_VALUE` if not
+    applicable). If `inspect` is not given, these fields are always
+    `NO_VALUE`.
+
+    The files are (re)created when the recorder is created. Call `close()`
+    after the simulation to flush the last chunk.
+    """
+    def __init__(self, path, chunk_size=65536, inspect=None):
+        self._path = path
+        self._chunk_size = chunk_size
+        self._inspect = inspect if inspect is not None else _no_fields
+        self._buffer = np.empty(chunk_size, dtype=TRACE_DTYPE)
+        self._size = 0              # number of records in the buffer
+        self._num_flushed = 0       # number of records in the file
+        self._handler_ids = {}      # handler -> id
+        self._handler_names = []
+        self._num_names_flushed = 0  # number of names in the names file
+        open(path, 'wb').close()
+        open(handlers_path(path), 'w').close()
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def num_records(self):
+        return self._num_flushed + self._size
+
+    def record(self, kernel, f, args):
+        handler_id = self._handler_ids.get(f)
+        if handler_id is None:
+            handler_id = len(self._handler_names)
+            self._handler_ids[f] = handler_id
+            self._handler_names.append(getattr(f, '__qualname__', repr(f)))
+        reader_state, tag_id, reply_type = self._inspect(kernel, f, args)
+        self._buffer[self._size] = (
+            kernel.time, handler_id, reader_state, reply_type, tag_id)
+        self._size += 1
+        if self._size == self._chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self._num_names_flushed < len(self._handler_names):
+            with open(handlers_path(self._path), 'a') as f:
+                f.writelines(name + '\n' for name in
+                             self._handler_names[self._num_names_flushed:])
+            self._num_names_flushed = len(self._handler_names)
+        if self._size == 0:
+            return
+        offset = self._num_flushed * TRACE_DTYPE.itemsize
+        with open(self._path, 'r+b') as f:
+            f.truncate(offset + self._size * TRACE_DTYPE.itemsize)
+        chunk = np.memmap(self._path, dtype=TRACE_DTYPE, mode='r+',
+                          offset=offset, shape=(self._size,))
+        chunk[:] = self._buffer[:self._size]
+        chunk.flush()
+        del chunk
+        self._num_flushed += self._size
+        self._size = 0
+
+    def close(self):
+        self.flush()
+
+
+class TraceReader:
+    """
+    Event trace reader.
+
+    Records are available as a read-only memory-mapped structured array
+    `records` (with `TRACE_DTYPE` fields), `select()` returns a copy of the
+    records matching given filters.
+
+    If the handler names file is missing (or misses some names), handlers
+    without names are shown as `#<id>`.
+    """
+    def __init__(self, path):
+        self._path = path
+        try:
+            with open(handlers_path(path)) as f:
+                self._handlers = [line.rstrip('\n') for line in f]
+        except FileNotFoundError:
+            self._handlers = []
+        # np.memmap can not map an empty file
+        if self._file_size() > 0:
+            self._records = np.memmap(path, dtype=TRACE_DTYPE, mode='r')
+        else:
+            self._records = np.empty(0, dtype=TRACE_DTYPE)
+
+    def _file_size(self):
+        with open(self._path, 'rb') as f:
+            return f.seek(0, 2)
+
+    @property
+    def records(self):
+        return self._records
+
+    @property
+    def handlers(self):
+        return self._handlers
+
+    def __len__(self):
+        return len(self._records)
+
+    def handler_id(self, name):
+        return self._handlers.index(name)
+
+    def time_window(self, t0=None, t1=None):
+        """
+        Get a view of records with `t0 <= time <= t1`. Only pages around the
+        window borders are read to find it.
+        """
+        times = self._records['time']
+        i0 = 0 if t0 is None else np.searchsorted(times, t0, side='left')
+        i1 = (len(times) if t1 is None else
+              np.searchsorted(times, t1, side='right'))
+        return self._records[i0:i1]
+
+    def select(self, t0=None, t1=None, tag_id=None, handler=None):
+        """
+        Get records with `t0 <= time <= t1`, given tag id and handler (name
+        or id). Filters with `None` value are not applied.
+        """
+        records = self.time_window(t0, t1)
+        mask = np.ones(len(records), dtype=bool)
+        if tag_id is not None:
+            mask &= records['tag_id'] == tag_id
+        if handler is not None:
+            if isinstance(handler, str):
+                handler = self.handler_id(handler)
+            mask &= records['handler'] == handler
+        return np.array(records[mask])
+
+    def handler_name(self, handler_id):
+        if handler_id < len(self._handlers):
+            return self._handlers[handler_id]
+        return '#{}'.format(handler_id)
+
+    def handler_names(self, records):
+        return [self.handler_name(handler_id)
+                for handler_id in records['handler']]
+
+
+def handlers_path(path):
+    return '{}.handlers'.format(path)